@@ -10,6 +10,21 @@ from pathlib import Path
 import glob
 from datetime import datetime
 
+# Zdieľané moduly (index priečinkov) sú v priečinku v2.0
+V2_DIR = Path(__file__).resolve().parent.parent / "v2.0"
+if str(V2_DIR) not in sys.path:
+    sys.path.append(str(V2_DIR))
+
+# OCR enginy (C API / pytesseract) a spracovanie slov sú spoločné s v2.0
+from ocr_engine import DEFAULT_CONFIG, ENGINE_CHOICES, engine_id, ocr_image_data, probe_engine
+from ocr_cache import OCRCache
+
+# Parametre predspracovania (sú súčasťou kľúča OCR cache, pri zmene sa výsledky prepočítajú)
+PREPROCESS_SCALE = 2
+PREPROCESS_BLUR = 1
+PREPROCESS_BLOCK_SIZE = 11
+PREPROCESS_C = 2
+
 def check_tesseract():
     """Kontrola či je Tesseract nainštalovaný"""
     import subprocess
@@ -55,70 +70,221 @@ def preprocess_image(image_path, enhance=True):
         
         # Zväčšenie rozlíšenia (2x)
         height, width = gray.shape
-        gray = cv2.resize(gray, (width * 2, height * 2), interpolation=cv2.INTER_CUBIC)
+        gray = cv2.resize(gray, (width * PREPROCESS_SCALE, height * PREPROCESS_SCALE),
+                          interpolation=cv2.INTER_CUBIC)
         
         # Odstránenie šumu pomocou Gaussian blur
-        gray = cv2.GaussianBlur(gray, (1, 1), 0)
+        gray = cv2.GaussianBlur(gray, (PREPROCESS_BLUR, PREPROCESS_BLUR), 0)
         
         # Zlepšenie kontrastu pomocou adaptive threshold
         gray = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
-                                   cv2.THRESH_BINARY, 11, 2)
+                                   cv2.THRESH_BINARY, PREPROCESS_BLOCK_SIZE, PREPROCESS_C)
         
         return gray
     else:
         return img
 
-def ocr_single_image(image_path, language='eng', enhance=True, config=''):
-    """OCR rozpoznávanie jedného obrázka"""
-    import pytesseract
+def preprocess_params(enhance=True):
+    """Nastavenia predspracovania, od ktorých závisí výsledok OCR (pre kľúč cache)"""
+    if not enhance:
+        return {'enhance': False}
+    return {'enhance': True, 'scale': PREPROCESS_SCALE, 'blur': PREPROCESS_BLUR,
+            'block_size': PREPROCESS_BLOCK_SIZE, 'c': PREPROCESS_C}
+
+def _cache_key(cache, image_path, language, enhance, config, engine_name):
+    """Kľúč cache; `engine_name` = názov a verzia enginu (engine_id), nový Tesseract = nové výsledky"""
+    return cache.key(image_path, language, config or DEFAULT_CONFIG, preprocess_params(enhance), engine_name)
+
+def recognize_image(image_path, language='eng', enhance=True, config='', engine='auto', cache=None, key=None):
+    """OCR jedného obrázka bez výpisov; chyby sa nezachytávajú
+
+    `engine` = 'auto', 'capi' alebo 'pytesseract' (pozri ocr_engine). Engine
+    sa v procese inicializuje raz pre jazyk a config a potom sa opakovane
+    používa. S `cache` (OCRCache) sa rovnaký obrázok s rovnakými
+    nastaveniami rozpoznáva len raz; `key` je kľúč, ktorý už vypočítal
+    volajúci (súbor sa potom znova nehashuje).
+    """
     from PIL import Image
-    import cv2
     
+    if cache is None:
+        key = None
+    else:
+        if key is None:
+            key = _cache_key(cache, image_path, language, enhance, config,
+                             engine_id(engine, language, config or DEFAULT_CONFIG))
+        cached = cache.get(key)
+        if cached is not None:
+            text, avg_confidence, _ = cached
+            return text.strip(), avg_confidence
+    
+    # Predspracovanie obrázka
+    if enhance:
+        processed_img = preprocess_image(image_path, enhance=True)
+        # Konverzia OpenCV → PIL
+        pil_img = Image.fromarray(processed_img)
+    else:
+        pil_img = Image.open(image_path)
+    
+    # OCR konfigurácia
+    if not config:
+        config = DEFAULT_CONFIG
+    
+    # Text aj spoľahlivosť z jedného behu Tesseractu
+    text, avg_confidence, words = ocr_image_data(pil_img, language, config, engine)
+    if key is not None:
+        cache.put(key, text, avg_confidence, words)
+    
+    return text.strip(), avg_confidence
+
+def ocr_single_image(image_path, language='eng', enhance=True, config='', engine='auto', cache=None):
+    """OCR rozpoznávanie jedného obrázka"""
     print(f"  → Spracúvam: {image_path.name}")
     
     try:
-        # Predspracovanie obrázka
-        if enhance:
-            processed_img = preprocess_image(image_path, enhance=True)
-            # Konverzia OpenCV → PIL
-            pil_img = Image.fromarray(processed_img)
-        else:
-            pil_img = Image.open(image_path)
-        
-        # OCR konfigurácia
-        if not config:
-            config = '--oem 3 --psm 6'  # Default config
-        
-        # Rozpoznávanie textu
-        text = pytesseract.image_to_string(pil_img, lang=language, config=config)
-        
-        # Získanie confidence score
-        data = pytesseract.image_to_data(pil_img, lang=language, config=config, output_type=pytesseract.Output.DICT)
-        confidences = [int(conf) for conf in data['conf'] if int(conf) > 0]
-        avg_confidence = sum(confidences) / len(confidences) if confidences else 0
-        
-        return text.strip(), avg_confidence
-        
+        return recognize_image(image_path, language, enhance, config, engine, cache)
     except Exception as e:
         print(f"  ❌ Chyba pri OCR: {e}")
         return "", 0
 
-def ocr_multiple_images(image_paths, language='eng', enhance=True):
-    """OCR rozpoznávanie viacerých obrázkov"""
+def _init_ocr_worker(threads):
+    """Inicializácia OCR procesu: obmedzenie vlákien Tesseractu (OpenMP) a OpenCV
+
+    Bez obmedzenia by každý proces spúšťal toľko vlákien, koľko má stroj
+    jadier, a procesy by si jadrá navzájom preberali.
+    """
+    os.environ['OMP_THREAD_LIMIT'] = str(threads)  # dedia ho aj spúšťané procesy tesseract
+    try:
+        import cv2
+        cv2.setNumThreads(threads)
+    except ImportError:
+        pass
+
+def _ocr_page(index, image_path, language, enhance, config, engine='auto', cache=None, key=None):
+    """Úloha pre proces: (poradie, text, spoľahlivosť, chyba); chyba strany nezastaví dávku"""
+    try:
+        text, confidence = recognize_image(image_path, language, enhance, config, engine, cache, key)
+        return index, text, confidence, None
+    except Exception as e:
+        return index, "", 0, str(e) or type(e).__name__
+
+def ocr_pages_parallel(image_paths, language='eng', enhance=True, config='', workers=0, engine='auto',
+                       cache=None):
+    """OCR viacerých obrázkov v skupine procesov; výsledky vracia v poradí strán
+
+    Generuje (index, text, spoľahlivosť, chyba). `workers` <= 0 = počet
+    jadier. Ak proces spadne (napr. nedostatok pamäte), nedokončené strany
+    sa zopakujú v novej skupine procesov, každá samostatne; strana, pri
+    ktorej proces spadne aj vtedy, sa označí ako chybná a dávka pokračuje.
+    S `cache` sa strany z cache vrátia hneď a procesy dostanú len ostatné.
+    """
+    from collections import deque
+    from concurrent.futures import ProcessPoolExecutor
+    from concurrent.futures.process import BrokenProcessPool
+
+    image_paths = list(image_paths)
+    done = {}
+    keys = {}   # kľúče cache vypočítané tu, procesy súbory znova nehashujú
+    if cache is not None:
+        try:
+            # Názov a verzia enginu z krátkodobého procesu (OpenMP sa v tomto procese nespustí)
+            engine_name = probe_engine(engine, language, config or DEFAULT_CONFIG)
+        except Exception:
+            engine_name = None  # engine nie je k dispozícii: chybu ohlási OCR každej strany
+        for index, image_path in enumerate(image_paths if engine_name is not None else ()):
+            try:
+                keys[index] = _cache_key(cache, image_path, language, enhance, config, engine_name)
+            except OSError:
+                continue  # nečitateľný súbor: chybu ohlási samotné OCR
+            cached = cache.get(keys[index])
+            if cached is not None:
+                done[index] = (index, cached[0].strip(), cached[1], None)
+    missing = [index for index in range(len(image_paths)) if index not in done]
+
+    cpus = os.cpu_count() or 1
+    workers = min(workers if workers > 0 else cpus, max(1, len(missing)))
+    threads = max(1, cpus // workers)
+    if workers == 1:
+        if missing:
+            _init_ocr_worker(threads)
+        for index, image_path in enumerate(image_paths):
+            if index in done:
+                yield done.pop(index)
+            else:
+                yield _ocr_page(index, image_path, language, enhance, config, engine, cache, keys.get(index))
+        return
+
+    max_in_flight = workers * 2
+    todo = deque(missing)
+    retried = set()
+    pending = deque()   # (index, future) v poradí strán
+    next_index = 0
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_ocr_worker, initargs=(threads,))
+    try:
+        while next_index < len(image_paths):
+            if next_index in done:
+                yield done.pop(next_index)
+                next_index += 1
+                continue
+            while todo and len(pending) < max_in_flight:
+                if todo[0] in retried and pending:
+                    break  # opakovaná strana beží sama, aby bolo jasné, či pád spôsobila ona
+                index = todo.popleft()
+                pending.append((index, pool.submit(_ocr_page, index, image_paths[index],
+                                                   language, enhance, config, engine, cache,
+                                                   keys.get(index))))
+                if index in retried:
+                    break
+            index, future = pending.popleft()
+            try:
+                done[index] = future.result()
+            except BrokenProcessPool:
+                # Spadnutý proces zhodí celú skupinu: nedokončené strany znova v novej
+                lost = [index]
+                for i, f in pending:
+                    if f.done() and not f.cancelled() and f.exception() is None:
+                        done[i] = f.result()
+                    else:
+                        lost.append(i)
+                pending.clear()
+                pool.shutdown(wait=False, cancel_futures=True)
+                pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_ocr_worker,
+                                           initargs=(threads,))
+                for i in reversed(lost):
+                    if i in retried:
+                        done[i] = (i, "", 0, "OCR proces spadol")
+                    else:
+                        retried.add(i)
+                        todo.appendleft(i)
+            while next_index in done:
+                yield done.pop(next_index)
+                next_index += 1
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+def ocr_multiple_images(image_paths, language='eng', enhance=True, workers=0, engine='auto', cache=None):
+    """OCR rozpoznávanie viacerých obrázkov (paralelne, výsledky v poradí strán)"""
     results = []
     total_confidence = 0
+    failed = 0
     
     print(f"\n🔍 Spracúvam {len(image_paths)} obrázkov...")
     print(f"📝 Jazyk: {language}")
     print(f"🎯 Vylepšenie: {'Zapnuté' if enhance else 'Vypnuté'}")
+    print(f"⚙️  Procesy: {workers if workers > 0 else os.cpu_count() or 1}")
+    print(f"🧠 OCR engine: {engine}")
+    if cache is not None:
+        print(f"💾 Cache: {cache.root}")
     print("-" * 50)
     
-    for i, image_path in enumerate(image_paths, 1):
-        print(f"[{i}/{len(image_paths)}]", end=" ")
-        
-        text, confidence = ocr_single_image(image_path, language, enhance)
-        
-        if text:
+    for index, text, confidence, error in ocr_pages_parallel(image_paths, language, enhance, workers=workers,
+                                                             engine=engine, cache=cache):
+        image_path = image_paths[index]
+        print(f"[{index + 1}/{len(image_paths)}]  → {image_path.name}")
+        
+        if error:
+            failed += 1
+            print(f"  ❌ Chyba pri OCR: {error}")
+        elif text:
             results.append({
                 'file': image_path.name,
                 'text': text,
@@ -133,6 +299,10 @@ def ocr_multiple_images(image_paths, language='eng', enhance=True):
     
     print("-" * 50)
     print(f"📊 Celkový výsledok: {len(results)}/{len(image_paths)} úspešne spracovaných")
+    if failed:
+        print(f"❌ Chybné strany: {failed}")
+    if cache is not None and cache.hits:
+        print(f"💾 Z cache: {cache.hits} strán")
     print(f"📈 Priemerná spoľahlivosť: {avg_confidence:.1f}%")
     
     return results
@@ -172,6 +342,8 @@ def save_results(results, output_path, format_type='txt'):
         print(f"📁 Separátne súbory uložené v: {output_dir}")
 
 def main():
+    from folder_index import count_images, scan_folder
+    
     print("=" * 60)
     print("           OCR TEXT RECOGNITION TOOL")
     print("=" * 60)
@@ -198,8 +370,8 @@ def main():
         folders = [f for f in desktop_path.iterdir() if f.is_dir() and not f.name.startswith('.')]
         
         for i, folder in enumerate(folders, 1):
-            # Počet obrázkov v priečinku
-            img_count = len(list(folder.glob("*.png"))) + len(list(folder.glob("*.jpg"))) + len(list(folder.glob("*.jpeg")))
+            # Počet obrázkov v priečinku (jeden prechod, len hlavičky súborov)
+            img_count = count_images(folder)
             print(f"{i}. {folder.name} ({img_count} obrázkov)")
         
         print(f"{len(folders) + 1}. Zadať vlastnú cestu")
@@ -223,14 +395,8 @@ def main():
             except ValueError:
                 print("Zadaj platné číslo!")
         
-        # Nájdenie obrázkov
-        image_extensions = ['*.png', '*.jpg', '*.jpeg', '*.PNG', '*.JPG', '*.JPEG']
-        image_paths = []
-        
-        for ext in image_extensions:
-            image_paths.extend(source_folder.glob(ext))
-        
-        image_paths = sorted(image_paths)
+        # Nájdenie obrázkov (PNG/JPG bez ohľadu na veľkosť písmen, číselné poradie)
+        image_paths = [info.path for info in scan_folder(source_folder)]
         
         if not image_paths:
             print(f"❌ V priečinku {source_folder.name} sa nenašli žiadne obrázky!")
@@ -248,8 +414,23 @@ def main():
         enhance_choice = input("Zapnúť vylepšenie obrázkov? (y/n) [y]: ").strip().lower()
         enhance = enhance_choice not in ['n', 'no', 'nie']
         
+        # Počet paralelných OCR procesov (predvolene všetky jadrá)
+        cpus = os.cpu_count() or 1
+        workers_choice = input(f"Počet OCR procesov [{cpus}]: ").strip()
+        workers = int(workers_choice) if workers_choice.isdigit() and int(workers_choice) > 0 else cpus
+        
+        # OCR engine: auto = libtesseract v procese (ak je dostupná), inak pytesseract
+        engine = input(f"OCR engine ({'/'.join(ENGINE_CHOICES)}) [auto]: ").strip().lower()
+        if engine not in ENGINE_CHOICES:
+            engine = 'auto'
+        
+        # Výsledky sa ukladajú do cache, opakované spracovanie rovnakých strán je okamžité
+        cache_choice = input("Použiť OCR cache? (y/n) [y]: ").strip().lower()
+        cache = None if cache_choice in ['n', 'no', 'nie'] else OCRCache()
+        
         # Spustenie OCR
-        results = ocr_multiple_images(image_paths, language, enhance)
+        results = ocr_multiple_images(image_paths, language, enhance, workers=workers, engine=engine,
+                                      cache=cache)
         
         if not results:
             print("❌ Nepodarilo sa rozpoznať žiadny text!")
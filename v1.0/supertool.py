@@ -7,10 +7,16 @@ Kompletný PDF Screenshot Nástroj
 """
 
 import os
+import sys
 import time
 from pathlib import Path
 import glob
 
+# Zdieľané moduly (streamovaný zápis PDF) sú v priečinku v2.0
+V2_DIR = Path(__file__).resolve().parent.parent / "v2.0"
+if str(V2_DIR) not in sys.path:
+    sys.path.append(str(V2_DIR))
+
 def menu():
     """Hlavné menu s možnosťami"""
     print("=" * 50)
@@ -53,6 +59,7 @@ def screenshot_pdf():
     
     # Bezpečnostné nastavenie
     import pyautogui
+    from manifest import CaptureManifest
     pyautogui.FAILSAFE = True
     pyautogui.PAUSE = 0.1
     
@@ -87,6 +94,10 @@ def screenshot_pdf():
         time.sleep(1)
     print("ŠTART!")
     
+    # Index strán (poradie, súbor, rozmery, hash) pre neskoršiu konverziu
+    manifest = CaptureManifest(priecinok_path)
+    manifest.start_run(SCREENSHOT_OBLAST, num_pages=pocet_stran, backend="pyautogui")
+    
     # Hlavný cyklus screenshotov
     for strana in range(1, pocet_stran + 1):
         print(f"Spracúvam stranu {strana}/{pocet_stran}")
@@ -100,7 +111,9 @@ def screenshot_pdf():
         try:
             x, y, sirka, vyska = SCREENSHOT_OBLAST
             screenshot = pyautogui.screenshot(region=(x, y, sirka, vyska))
+            manifest.page_captured(strana, screenshot_cesta)
             screenshot.save(str(screenshot_cesta))
+            manifest.page_saved(screenshot, screenshot_cesta)
             print(f"  ✓ Screenshot uložený: {screenshot_cesta}")
         except Exception as e:
             print(f"  ❌ Chyba pri screenshote: {e}")
@@ -110,13 +123,16 @@ def screenshot_pdf():
         time.sleep(0.5)
         print(f"  ✓ Strana {strana} spracovaná")
     
+    manifest.close()
     print(f"\n✅ Hotovo! Vytvorených {pocet_stran} screenshotov v priečinku: {nazov_suboru}")
     
     return priecinok_path, nazov_suboru
 
 def png_to_pdf(priecinok_path=None, navrhnuty_nazov=None):
     """Funkcia na konverziu PNG do PDF"""
-    from PIL import Image
+    from pdf_stream import StreamingPDFWriter
+    from manifest import ordered_pages
+    from folder_index import PNG_EXTENSIONS, count_images
     
     print("\n" + "="*30)
     print("📄 KONVERZIA PNG → PDF")
@@ -131,8 +147,8 @@ def png_to_pdf(priecinok_path=None, navrhnuty_nazov=None):
         
         print("Dostupné priečinky na Desktop:")
         for i, priecinok in enumerate(priecinky, 1):
-            # Počet PNG súborov v priečinku
-            png_count = len(list(priecinok.glob("*.png")))
+            # Počet PNG súborov v priečinku (len hlavičky, s cache)
+            png_count = count_images(priecinok, PNG_EXTENSIONS)
             print(f"{i}. {priecinok.name} ({png_count} PNG súborov)")
         
         print(f"{len(priecinky) + 1}. Zadať vlastnú cestu")
@@ -157,8 +173,8 @@ def png_to_pdf(priecinok_path=None, navrhnuty_nazov=None):
             except ValueError:
                 print("Zadaj platné číslo!")
     
-    # Nájdenie všetkých PNG súborov
-    png_subory = sorted(priecinok_path.glob("*.png"))
+    # Nájdenie všetkých PNG súborov (poradie z manifestu, inak číselné zoradenie)
+    png_subory = ordered_pages(priecinok_path)
     
     if not png_subory:
         print(f"❌ V priečinku {priecinok_path.name} sa nenašli žiadne PNG súbory!")
@@ -189,53 +205,26 @@ def png_to_pdf(priecinok_path=None, navrhnuty_nazov=None):
     # Umiestnenie výstupného PDF
     pdf_cesta = priecinok_path / pdf_nazov
     
-    print(f"\n🔄 Spracúvam {len(png_subory)} obrázkov...")
-    
-    # Načítanie a konverzia obrázkov
-    obrazky = []
-    
-    for i, png_subor in enumerate(png_subory, 1):
-        print(f"  → Načítavam {png_subor.name} ({i}/{len(png_subory)})")
-        
-        try:
-            # Otvorenie obrázka
-            img = Image.open(png_subor)
-            
-            # Konverzia na RGB (potrebné pre PDF)
-            if img.mode != 'RGB':
-                img = img.convert('RGB')
-            
-            obrazky.append(img)
-            
-        except Exception as e:
-            print(f"  ❌ Chyba pri načítavaní {png_subor.name}: {e}")
-    
-    if not obrazky:
-        print("❌ Nepodarilo sa načítať žiadne obrázky!")
-        return None
+    # Bezstratové vloženie PNG dát bez prekódovania
+    odpoved = input("Vložiť PNG bez prekódovania (bezstratovo, rýchlejšie)? (y/n) [n]: ").lower()
+    bez_prekodovania = odpoved in ['y', 'yes', 'ano']
     
-    # Vytvorenie PDF súboru
-    print(f"\n📄 Vytváram PDF súbor: {pdf_nazov}")
+    print(f"\n🔄 Spracúvam {len(png_subory)} obrázkov...")
+    print(f"📄 Vytváram PDF súbor: {pdf_nazov}")
     
     try:
-        # Prvý obrázok ako základ PDF
-        prvy_obrazok = obrazky[0]
-        
-        # Ostatné obrázky ako ďalšie strany
-        ostatne_obrazky = obrazky[1:] if len(obrazky) > 1 else None
-        
-        # Uloženie ako PDF
-        if ostatne_obrazky:
-            prvy_obrazok.save(
-                pdf_cesta,
-                format='PDF',
-                append_images=ostatne_obrazky,
-                save_all=True,
-                quality=95,
-                optimize=False
-            )
-        else:
-            prvy_obrazok.save(pdf_cesta, format='PDF', quality=95)
+        # Strany sa zapisujú do PDF postupne, v pamäti je vždy len jeden obrázok
+        with StreamingPDFWriter(pdf_cesta, passthrough=bez_prekodovania) as writer:
+            for i, png_subor in enumerate(png_subory, 1):
+                print(f"  → Pridávam {png_subor.name} ({i}/{len(png_subory)})")
+                
+                try:
+                    writer.add_file(png_subor)
+                except Exception as e:
+                    print(f"  ❌ Chyba pri načítavaní {png_subor.name}: {e}")
+            
+            if writer.page_count == 0:
+                raise ValueError("Nepodarilo sa načítať žiadne obrázky!")
         
         print(f"✅ PDF úspešne vytvorený!")
         print(f"📁 Umiestnenie: {pdf_cesta}")
@@ -243,11 +232,9 @@ def png_to_pdf(priecinok_path=None, navrhnuty_nazov=None):
         # Informácie o súbore
         velkost_mb = pdf_cesta.stat().st_size / (1024 * 1024)
         print(f"📊 Veľkosť súboru: {velkost_mb:.1f} MB")
-        print(f"📋 Počet strán: {len(obrazky)}")
-        
-        # Zatvorenie obrázkov (uvoľnenie pamäte)
-        for img in obrazky:
-            img.close()
+        print(f"📋 Počet strán: {writer.page_count}")
+        if writer.shared_pages:
+            print(f"♻️  Rovnaké strany uložené raz: {writer.shared_pages}")
             
         return pdf_cesta
         
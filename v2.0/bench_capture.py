@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Capture backend benchmark
+
+Grabs the same screen region repeatedly with every available backend and
+prints frames per second, both for raw BGRA grabs and for full PIL frames.
+
+Usage:
+    python3 bench_capture.py [--region X Y W H] [--seconds N] [--backends a,b]
+"""
+
+import argparse
+import time
+
+from capture_backends import BACKENDS, get_backend
+
+
+# Same region as the GUI defaults (X1, Y1, X2, Y2 = 880, 180, 1720, 1330)
+DEFAULT_REGION = [880, 180, 840, 1150]
+
+
+def _measure(fn, seconds: float) -> float:
+    fn()  # warm-up (shared memory setup, first-call overhead)
+    frames = 0
+    start = time.perf_counter()
+    while True:
+        fn()
+        frames += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= seconds:
+            return frames / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare capture backends by frames per second")
+    parser.add_argument("--region", type=int, nargs=4, metavar=("X", "Y", "W", "H"),
+                        default=DEFAULT_REGION)
+    parser.add_argument("--seconds", type=float, default=3.0, help="measuring time per backend")
+    parser.add_argument("--backends", default=",".join(BACKENDS), help="comma-separated backend names")
+    args = parser.parse_args()
+    region = tuple(args.region)
+
+    print(f"Region: {region[2]}×{region[3]} at ({region[0]}, {region[1]})")
+    print(f"{'backend':<12}{'raw fps':>10}{'PIL fps':>10}")
+    for name in args.backends.split(","):
+        name = name.strip()
+        if name not in BACKENDS:
+            print(f"{name:<12}  unknown backend")
+            continue
+        try:
+            backend = BACKENDS[name]()
+        except Exception as e:
+            print(f"{name:<12}  unavailable: {e}")
+            continue
+        with backend:
+            try:
+                raw_fps = _measure(lambda: backend.grab_raw(region), args.seconds)
+                pil_fps = _measure(lambda: backend.grab(region).close(), args.seconds)
+            except Exception as e:
+                print(f"{backend.name:<12}  failed: {e}")
+                continue
+        print(f"{backend.name:<12}{raw_fps:>10.1f}{pil_fps:>10.1f}")
+    try:
+        with get_backend() as backend:
+            print(f"auto -> {backend.name}")
+    except OSError as e:
+        print(f"auto -> none ({e})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+OCR engine benchmark
+
+Runs the same pages through every available OCR engine (ocr_engine.ENGINES)
+and reports engine start-up and per-page latency. Images are decoded up
+front, so only recognition is timed. "capi" keeps one libtesseract
+instance for the whole run; "pytesseract" starts a tesseract process for
+every page.
+
+Usage:
+    python3 bench_ocr.py [--pages-dir DIR | --synthetic N] [--lang eng]
+                         [--config "--oem 3 --psm 6"] [--engines capi,pytesseract]
+"""
+
+import argparse
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from PIL import Image, ImageDraw, ImageFont
+
+from ocr_engine import DEFAULT_CONFIG, ENGINES, words_from_data
+
+SAMPLE_WORDS = ("the quick brown fox jumps over lazy dog page screen capture document "
+                "streaming writer engine process language layout paragraph line word").split()
+
+
+def make_text_pages(folder: Path, count: int, size=(1240, 1754)) -> list:
+    """Write `count` pages of printed text lines and return their paths."""
+    width, height = size
+    try:
+        font = ImageFont.load_default(size=24)
+    except TypeError:  # Pillow < 10.1: bitmap font only
+        font = ImageFont.load_default()
+    paths = []
+    for i in range(count):
+        page = Image.new("L", size, 255)
+        draw = ImageDraw.Draw(page)
+        for line, top in enumerate(range(80, height - 80, 36)):
+            words = [SAMPLE_WORDS[(i * 7 + line * 3 + k) % len(SAMPLE_WORDS)] for k in range(9)]
+            draw.text((80, top), " ".join(words), fill=0, font=font)
+        path = folder / f"page_{i + 1:05d}.png"
+        page.save(path)
+        paths.append(path)
+    return paths
+
+
+def percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def run_engine(name: str, images: list, language: str, config: str) -> dict:
+    start = time.perf_counter()
+    engine = ENGINES[name](language, config)
+    init = time.perf_counter() - start
+    latencies = []
+    words = 0
+    try:
+        for img in images:
+            start = time.perf_counter()
+            page_words = words_from_data(engine.image_to_data(img))
+            latencies.append(time.perf_counter() - start)
+            words += len(page_words)
+    finally:
+        engine.close()
+    return {"init": init, "latencies": latencies, "words": words}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark OCR engines (per-page latency)")
+    parser.add_argument("--pages-dir", type=Path, help="folder with page images (PNG)")
+    parser.add_argument("--synthetic", type=int, default=10, help="number of generated pages without --pages-dir")
+    parser.add_argument("--lang", default="eng", help="tesseract language(s), e.g. slk+eng")
+    parser.add_argument("--config", default=DEFAULT_CONFIG, help="tesseract options")
+    parser.add_argument("--engines", default=",".join(ENGINES), help="comma-separated engines to compare")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.pages_dir:
+            pages = sorted(args.pages_dir.glob("*.png"))
+        else:
+            pages = make_text_pages(Path(tmp), args.synthetic)
+        if not pages:
+            parser.error("no pages to benchmark")
+        images = []
+        for path in pages:
+            with Image.open(path) as img:
+                img.load()
+                images.append(img.convert("L") if img.mode not in ("L", "RGB") else img.copy())
+
+    print(f"{len(images)} pages, lang={args.lang}, config={args.config!r}")
+    print(f"{'engine':<12} {'init ms':>8} {'mean ms':>8} {'p50 ms':>8} {'p95 ms':>8} {'pages/s':>8} {'words':>7}")
+    for name in [n.strip() for n in args.engines.split(",") if n.strip()]:
+        if name not in ENGINES:
+            parser.error(f"unknown engine {name!r} (choices: {', '.join(ENGINES)})")
+        try:
+            result = run_engine(name, images, args.lang, args.config)
+        except Exception as e:
+            print(f"{name:<12} unavailable: {e}")
+            continue
+        latencies = result["latencies"]
+        total = sum(latencies)
+        print(f"{name:<12} {result['init'] * 1000:8.1f} {statistics.mean(latencies) * 1000:8.1f} "
+              f"{statistics.median(latencies) * 1000:8.1f} {percentile(latencies, 0.95) * 1000:8.1f} "
+              f"{len(latencies) / total if total else 0:8.2f} {result['words']:7d}")
+
+
+if __name__ == "__main__":
+    main()
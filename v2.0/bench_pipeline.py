@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Headless end-to-end capture benchmark
+
+Runs the real capture loop (capture.run_capture + FrameWriter) against a
+VirtualViewer instead of the screen, so pages/min, settle behaviour and
+encoder throughput can be measured on a headless machine (CI, no display,
+no PDF viewer). Every saved frame is checked against the clean page
+render to count torn (half-rendered) captures.
+
+Usage:
+    python3 bench_pipeline.py [--pages-dir DIR | --synthetic N] [--latency S]
+                              [--jitter S] [--no-tearing] [--fixed-delay S]
+                              [--chrome PX] [--auto-crop]
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from capture import DEFAULT_SETTLE_TIMEOUT, AutoCropper, FrameWriter, frame_hash, run_capture
+from virtual_viewer import VirtualViewer
+
+
+def make_synthetic_pages(folder: Path, count: int, size=(840, 1150), seed: int = 0) -> list:
+    """Write `count` text-like pages (dark line blocks on white) and return their paths."""
+    rng = np.random.default_rng(seed)
+    width, height = size
+    paths = []
+    for i in range(count):
+        page = np.full((height, width, 3), 255, dtype=np.uint8)
+        for top in range(60, height - 60, 28):
+            line_len = int(rng.integers(width // 3, width - 120))
+            page[top:top + 12, 60:60 + line_len] = rng.integers(0, 80)
+        path = folder / f"page_{i + 1:05d}.png"
+        Image.fromarray(page).save(path)
+        paths.append(path)
+    return paths
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the capture pipeline against a virtual viewer")
+    parser.add_argument("--pages-dir", type=Path, help="folder with page images (PNG)")
+    parser.add_argument("--synthetic", type=int, default=30, help="number of generated pages without --pages-dir")
+    parser.add_argument("--num-pages", type=int, default=0, help="page limit (0 = until end is detected)")
+    parser.add_argument("--latency", type=float, default=0.15, help="render latency after a page turn (s)")
+    parser.add_argument("--jitter", type=float, default=0.05, help="random latency variation (s)")
+    parser.add_argument("--no-tearing", action="store_true", help="show the old page until fully rendered")
+    parser.add_argument("--settle-timeout", type=float, default=DEFAULT_SETTLE_TIMEOUT)
+    parser.add_argument("--fixed-delay", type=float, help="use a fixed sleep instead of settle detection")
+    parser.add_argument("--encoders", type=int, default=2, help="PNG encoder threads")
+    parser.add_argument("--chrome", type=int, default=0, help="viewer background around the page in the region (px)")
+    parser.add_argument("--auto-crop", action="store_true", help="crop background and margins (capture.AutoCropper)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp_path = Path(tmp)
+        if args.pages_dir:
+            pages = sorted(args.pages_dir.glob("*.png"))
+        else:
+            source = tmp_path / "pages"
+            source.mkdir()
+            pages = make_synthetic_pages(source, args.synthetic)
+        out = tmp_path / "out"
+        out.mkdir()
+
+        chrome = max(0, args.chrome)
+        viewer = VirtualViewer(pages, origin=(chrome, chrome), render_latency=args.latency,
+                               latency_jitter=args.jitter, tearing=not args.no_tearing, seed=1)
+        with Image.open(pages[0]) as first:
+            region = (0, 0, first.width + 2 * chrome, first.height + 2 * chrome)
+        cropper = AutoCropper() if args.auto_crop else None
+
+        start = time.monotonic()
+        with FrameWriter(workers=args.encoders) as frames:
+            stats = run_capture(
+                lambda: viewer.grab(region),
+                viewer.press,
+                lambda frame, n: frames.submit(frame, out / f"strana_{n:02d}.png"),
+                num_pages=args.num_pages,
+                settle_timeout=args.settle_timeout,
+                fixed_delay=args.fixed_delay,
+                cropper=cropper,
+            )
+            capture_end = time.monotonic()
+        total = time.monotonic() - start
+
+        # Torn captures: saved frame differs from the clean render of its page
+        expected = min(len(pages), args.num_pages or len(pages))
+        torn = 0
+        for n in range(1, stats.pages + 1):
+            with Image.open(out / f"strana_{n:02d}.png") as saved:
+                clean = viewer.clean_frame(min(n, len(pages)) - 1, region)
+                if cropper is not None and cropper.box is not None:
+                    clean = clean.crop(cropper.box)
+                if frame_hash(saved.convert('RGB')) != frame_hash(clean):
+                    torn += 1
+
+    mode = f"fixed {args.fixed_delay:.2f} s" if args.fixed_delay is not None else f"settle (max {args.settle_timeout:.1f} s)"
+    print(f"Wait mode:          {mode}")
+    print(f"Pages captured:     {stats.pages} (document: {expected})")
+    print(f"Capture time:       {stats.seconds:.2f} s ({stats.pages_per_minute:.1f} pages/min)")
+    print(f"Encoder drain:      {total - (capture_end - start):.2f} s after capture")
+    per_thread = frames.written / frames.busy_seconds if frames.busy_seconds else 0.0
+    print(f"Encoder throughput: {per_thread:.1f} frames/s per thread ({args.encoders} threads)")
+    print(f"Settle timeouts:    {stats.settle_timeouts}")
+    print(f"End detected:       {stats.end_detected} ({stats.dropped_duplicates} duplicates dropped)")
+    print(f"Torn captures:      {torn}")
+    if cropper is not None:
+        print(f"Auto-crop:          box {cropper.box}, {cropper.saved_fraction:.0%} of the pixels removed, "
+              f"{cropper.refits} refits")
+
+
+if __name__ == "__main__":
+    main()
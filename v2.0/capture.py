@@ -0,0 +1,601 @@
+#!/usr/bin/env python3
+"""
+Capture pipeline helpers
+
+FrameWriter takes PNG compression off the screenshot loop: the capture
+thread pushes raw frames onto a bounded queue and a small pool of encoder
+threads writes them to disk. Pillow's PNG encoder releases the GIL while
+compressing, so encoding overlaps the page-turn wait. When the disk falls
+behind, the full queue blocks submit() and throttles capture.
+PDFFrameSink does the same for direct capture into a PDF, optionally
+handing each frame on to a FrameWriter for an archival PNG copy.
+
+SettleDetector replaces the fixed sleep after a page turn: it polls a small
+downscaled probe of the capture region and reports the page as ready once
+consecutive probes match (or a timeout is hit).
+
+EndOfDocumentDetector hashes every frame and stops the run once the viewer
+returns the same frame several times in a row, so the page count becomes
+optional.
+
+FrameScaler normalises HiDPI frames right after the grab: it keeps the
+native resolution or box-reduces to a target DPI, and tags each frame with
+the DPI that ends up in the PNG copies and the PDF.
+
+AutoCropper removes the viewer background and page margins around the
+content. It measures the content box on the first pages with NumPy
+row/column reductions, then locks it and only checks that later frames
+still fit inside.
+
+run_capture() is the capture loop shared by the GUI tabs and the headless
+benchmark: grab, hand frames to a sink, turn the page, wait for it to settle.
+"""
+
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from pdf_stream import DEFAULT_RESOLUTION, frame_hash
+
+
+DEFAULT_ENCODER_THREADS = 2
+DEFAULT_MAX_QUEUED = 8
+
+DEFAULT_SETTLE_TIMEOUT = 2.0
+
+DEFAULT_END_REPEATS = 3
+MAX_AUTO_PAGES = 20000
+
+DPI_CHOICES = ("native", "144", "96", "72")  # "native" = keep every device pixel
+
+DEFAULT_CROP_LOCK_PAGES = 3
+DEFAULT_CROP_TOLERANCE = 12  # colour levels a background pixel may vary by
+DEFAULT_CROP_PADDING = 8     # pixels kept around the content
+
+
+class FrameWriter:
+    """Bounded producer/consumer queue that saves captured frames as PNG files."""
+
+    def __init__(self, workers: int = DEFAULT_ENCODER_THREADS, max_queued: int = DEFAULT_MAX_QUEUED,
+                 on_saved: Optional[Callable[[Image.Image, object], None]] = None):
+        # on_saved(frame, path) runs on the writer thread once the file is written
+        self.on_saved = on_saved
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max(1, max_queued))
+        self._lock = threading.Lock()
+        self._error: Optional[BaseException] = None
+        self.written = 0
+        self.busy_seconds = 0.0  # summed encode time over all threads
+        self._closed = False
+        self._threads: List[threading.Thread] = [
+            threading.Thread(target=self._run, name=f"frame-writer-{i}", daemon=True)
+            for i in range(max(1, workers))
+        ]
+        for t in self._threads:
+            t.start()
+
+    def __enter__(self) -> "FrameWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            # Keep the original exception; just stop the workers
+            self._shutdown()
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def submit(self, frame: Image.Image, path) -> None:
+        """Queue a frame for saving; blocks while the queue is full."""
+        if self._error is not None:
+            raise self._error
+        self._queue.put((frame, path))
+
+    def _handle(self, frame: Image.Image, path) -> None:
+        """Write one frame; responsible for closing it."""
+        try:
+            dpi = frame.info.get("dpi")
+            frame.save(str(path), **({"dpi": dpi} if dpi else {}))
+            if self.on_saved is not None:
+                self.on_saved(frame, path)
+        finally:
+            frame.close()
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            frame, path = item
+            if self._error is not None:
+                frame.close()  # drain without writing after a failure
+                continue
+            try:
+                started = time.perf_counter()
+                self._handle(frame, path)
+                with self._lock:
+                    self.written += 1
+                    self.busy_seconds += time.perf_counter() - started
+            except Exception as e:
+                with self._lock:
+                    if self._error is None:
+                        self._error = e
+
+    def _shutdown(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        for _ in self._threads:
+            self._queue.put(None)
+        for t in self._threads:
+            t.join()
+
+    def close(self) -> None:
+        """Wait until every queued frame is written; re-raise the first write error."""
+        self._shutdown()
+        if self._error is not None:
+            raise self._error
+
+
+class PDFFrameSink(FrameWriter):
+    """Streams captured frames straight into a StreamingPDFWriter.
+
+    A single writer thread adds pages in capture order. With `encoders` > 1
+    the pages are encoded (pdf_writer.encode) on that many threads as they
+    are submitted and the writer thread only waits for each page's result;
+    Pillow's encoders release the GIL, so the threads run in parallel.
+    With one encoder, add_image() skips encoding pages that duplicate an
+    earlier one. With `archive_pngs` each frame is then passed to a
+    FrameWriter that saves the PNG copy asynchronously (to the path given
+    to submit()); `on_saved` is called for each written copy.
+    """
+
+    def __init__(self, pdf_writer, archive_pngs: bool = False, max_queued: int = DEFAULT_MAX_QUEUED,
+                 on_saved: Optional[Callable[[Image.Image, object], None]] = None, encoders: int = 1):
+        self.pdf_writer = pdf_writer
+        self.archive: Optional[FrameWriter] = (
+            FrameWriter(max_queued=max_queued, on_saved=on_saved) if archive_pngs else None
+        )
+        self._encoders: Optional[ThreadPoolExecutor] = (
+            ThreadPoolExecutor(max_workers=encoders, thread_name_prefix="pdf-encoder") if encoders > 1 else None
+        )
+        self._encoded: deque = deque()  # futures in submit (= queue) order
+        super().__init__(workers=1, max_queued=max_queued)
+
+    def submit(self, frame: Image.Image, path) -> None:
+        if self._encoders is not None and self._error is None:
+            self._encoded.append(self._encoders.submit(self.pdf_writer.encode, frame))
+        super().submit(frame, path)
+
+    def _handle(self, frame: Image.Image, path) -> None:
+        try:
+            if self._encoders is not None:
+                self.pdf_writer.add_encoded(self._encoded.popleft().result())
+            else:
+                self.pdf_writer.add_image(frame)
+        except Exception:
+            frame.close()
+            raise
+        if self.archive is not None:
+            self.archive.submit(frame, path)  # the archive writer closes it
+        else:
+            frame.close()
+
+    def _shutdown(self) -> None:
+        super()._shutdown()
+        if self._encoders is not None:
+            self._encoders.shutdown(wait=True, cancel_futures=True)
+        if self.archive is not None:
+            self.archive._shutdown()
+
+    def close(self) -> None:
+        """Finish all PDF pages and PNG copies; re-raise the first error."""
+        self._shutdown()
+        if self._error is not None:
+            raise self._error
+        if self.archive is not None:
+            self.archive.close()
+
+
+class FrameScaler:
+    """Brings HiDPI frames to a target DPI as they are grabbed.
+
+    `scale` is the display's pixels per point (CaptureBackend.detect_scale).
+    A point is 1/72 in, like a PDF unit, so native frames are 72 * scale
+    DPI. `target_dpi` 0 keeps them as they are; a lower target box-filters
+    them down (Image.reduce for whole factors, resize(BOX) otherwise).
+    Frames are never upsampled. `dpi` is the resolution of the output.
+    """
+
+    def __init__(self, scale: float = 1.0, target_dpi: float = 0):
+        self.native_dpi = DEFAULT_RESOLUTION * max(1.0, scale)
+        self.factor = self.native_dpi / target_dpi if 0 < target_dpi < self.native_dpi else 1.0
+        self.dpi = self.native_dpi / self.factor
+
+    def __call__(self, frame: Image.Image) -> Image.Image:
+        if self.factor != 1.0:
+            if self.factor.is_integer():
+                scaled = frame.reduce(int(self.factor))
+            else:
+                size = (max(1, round(frame.width / self.factor)), max(1, round(frame.height / self.factor)))
+                scaled = frame.resize(size, Image.Resampling.BOX)
+            frame.close()
+            frame = scaled
+        frame.info["dpi"] = (self.dpi, self.dpi)
+        return frame
+
+    def wrap(self, grab: Callable[[], Image.Image]) -> Callable[[], Image.Image]:
+        """`grab` with every frame passed through the scaler."""
+        return lambda: self(grab())
+
+
+Box = Tuple[int, int, int, int]  # (left, top, right, bottom), as Image.crop takes it
+
+
+def _background_mask(gray: np.ndarray, level: int, tolerance: int) -> np.ndarray:
+    """True where a grey level is within `tolerance` of `level`."""
+    lo = max(0, level - tolerance)
+    width = min(255, level + tolerance) - lo
+    # uint8 subtraction wraps around, so one comparison covers both bounds
+    return (gray - np.uint8(lo)) <= width
+
+
+def content_box(gray: np.ndarray, tolerance: int = DEFAULT_CROP_TOLERANCE,
+                layers: int = 2) -> Optional[Tuple[Box, List[int]]]:
+    """Bounding box of the content in a 2-D luminance frame and the background levels around it.
+
+    Peels up to `layers` uniform borders (viewer background, then the page
+    margin): each layer's level is the median of the current box's edge
+    pixels and only counts if most edge pixels share it. Returns None for a
+    frame with nothing but background.
+    """
+    height, width = gray.shape
+    left, top, right, bottom = 0, 0, width, height
+    colors: List[int] = []
+    for _ in range(layers):
+        sub = gray[top:bottom, left:right]
+        edge = np.concatenate([sub[0], sub[-1], sub[:, 0], sub[:, -1]])
+        color = int(np.median(edge))
+        if _background_mask(edge, color, tolerance).mean() < 0.9:
+            break  # content reaches the edge: no uniform border to remove
+        content = ~_background_mask(sub, color, tolerance)
+        rows = np.flatnonzero(content.any(axis=1))
+        if rows.size == 0:
+            return None
+        cols = np.flatnonzero(content.any(axis=0))
+        colors.append(color)
+        box = (left + int(cols[0]), top + int(rows[0]), left + int(cols[-1]) + 1, top + int(rows[-1]) + 1)
+        if box == (left, top, right, bottom):
+            break
+        left, top, right, bottom = box
+    return (left, top, right, bottom), colors
+
+
+class AutoCropper:
+    """Crops frames to the content box learned from the first pages.
+
+    feed() holds frames back until `lock_pages` frames with content have
+    been measured; the box (their union plus `padding`) is then locked and
+    the held frames are released cropped to it, so every page gets the same
+    box. A locked box is only checked: everything outside it must still be
+    one of the background levels seen while learning. A frame that does
+    not fit widens the lock (counted in `refits`), so content is never cut
+    off. Frames of another size than the learned one pass through
+    uncropped. Measuring works on the luminance plane (one C conversion, a
+    third of the RGB bytes).
+
+    `box` (with `frame_size` and `colors`) restores a lock from an earlier
+    run; `on_lock(box, frame_size, colors)` is called whenever it is set.
+    """
+
+    def __init__(self, lock_pages: int = DEFAULT_CROP_LOCK_PAGES, tolerance: int = DEFAULT_CROP_TOLERANCE,
+                 padding: int = DEFAULT_CROP_PADDING, box: Optional[Box] = None,
+                 frame_size: Optional[Tuple[int, int]] = None, colors: Optional[List[int]] = None,
+                 on_lock: Optional[Callable[[Box, Tuple[int, int], List[int]], None]] = None):
+        self.lock_pages = max(1, lock_pages)
+        self.tolerance = tolerance
+        self.padding = padding
+        self.on_lock = on_lock
+        self.box: Optional[Box] = tuple(box) if box else None
+        self.frame_size: Optional[Tuple[int, int]] = tuple(frame_size) if frame_size else None
+        self.colors: List[int] = [int(c) for c in colors or []]
+        self.locked = self.box is not None and self.frame_size is not None and bool(self.colors)
+        self.learned = 0
+        self.refits = 0
+        self.pixels_in = 0
+        self.pixels_out = 0
+        self._held: List[Image.Image] = []
+
+    @property
+    def saved_fraction(self) -> float:
+        """Share of captured pixels removed so far."""
+        return 1.0 - self.pixels_out / self.pixels_in if self.pixels_in else 0.0
+
+    def feed(self, frame: Image.Image) -> List[Image.Image]:
+        """Frames ready to save, cropped, in order (none while the box is being learned)."""
+        if self.frame_size is not None and frame.size != self.frame_size:
+            # Held pages come first, or this frame would take their page numbers
+            return self.flush() + [self.crop(frame)]
+        pixels = np.asarray(frame if frame.mode == "L" else frame.convert("L"))
+        if not self.locked:
+            self._learn(pixels, frame.size)
+            self._held.append(frame)
+            if self.learned < self.lock_pages:
+                return []
+            self._lock()
+            return self.flush()
+        if not self._fits(pixels):
+            self.refits += 1
+            self._learn(pixels, frame.size)
+            self._lock()
+        return [self.crop(frame)]
+
+    def flush(self) -> List[Image.Image]:
+        """Release held frames when the run ends before the box was locked."""
+        if self._held and not self.locked and self.box is not None:
+            self._lock()
+        released, self._held = self._held, []
+        return [self.crop(frame) for frame in released]
+
+    def crop(self, frame: Image.Image, count: bool = True) -> Image.Image:
+        """`frame` cut to the current box (unchanged before there is one or at another size).
+
+        `count=False` leaves the saved-pixel statistics alone (frames that are
+        only compared, not saved).
+        """
+        if self.box is None or frame.size != self.frame_size or self.box == (0, 0) + frame.size:
+            cropped = frame
+        else:
+            cropped = frame.crop(self.box)
+            frame.close()
+        if count:
+            self.pixels_in += frame.width * frame.height
+            self.pixels_out += cropped.width * cropped.height
+        return cropped
+
+    def _learn(self, pixels: np.ndarray, size: Tuple[int, int]) -> None:
+        found = content_box(pixels, self.tolerance)
+        if found is None:
+            return  # blank page: nothing to learn from
+        (left, top, right, bottom), colors = found
+        pad = self.padding
+        box = (max(0, left - pad), max(0, top - pad), min(size[0], right + pad), min(size[1], bottom + pad))
+        if self.box is not None:
+            box = (min(box[0], self.box[0]), min(box[1], self.box[1]),
+                   max(box[2], self.box[2]), max(box[3], self.box[3]))
+        self.colors.extend(c for c in colors if c not in self.colors)
+        self.box = box
+        self.frame_size = size
+        self.learned += 1
+
+    def _lock(self) -> None:
+        self.locked = True
+        if self.on_lock is not None:
+            self.on_lock(self.box, self.frame_size, list(self.colors))
+
+    def _fits(self, pixels: np.ndarray) -> bool:
+        """True if every pixel outside the locked box is background."""
+        left, top, right, bottom = self.box
+        strips = (pixels[:top], pixels[bottom:], pixels[top:bottom, :left], pixels[top:bottom, right:])
+        for strip in strips:
+            if strip.size == 0:
+                continue
+            background = np.zeros(strip.shape, dtype=bool)
+            for color in self.colors:
+                background |= _background_mask(strip, color, self.tolerance)
+            if not background.all():
+                return False
+        return True
+
+
+class SettleDetector:
+    """Waits until the capture region stops changing after a page turn.
+
+    `grab` returns the current region as a PIL image. Each probe is a
+    box-downscaled grayscale copy; two probes match when no probe pixel
+    differs by more than `tolerance` levels.
+    """
+
+    def __init__(self, grab: Callable[[], Image.Image], timeout: float = DEFAULT_SETTLE_TIMEOUT,
+                 interval: float = 0.03, stable_probes: int = 2, tolerance: int = 6,
+                 probe_size: Tuple[int, int] = (64, 64), unchanged_grace: float = 0.3):
+        self.grab = grab
+        self.timeout = timeout
+        self.interval = interval
+        self.stable_probes = max(1, stable_probes)
+        self.tolerance = tolerance
+        self.probe_size = probe_size
+        # How long an unchanged page must stay unchanged before it counts as settled
+        # (the viewer may not have reacted to the key press yet, or it is the last page)
+        self.unchanged_grace = unchanged_grace
+        self.timeouts = 0
+
+    def probe_image(self, img: Image.Image) -> np.ndarray:
+        small = img.resize(self.probe_size, Image.Resampling.BOX)
+        return np.asarray(small.convert('L'), dtype=np.int16)
+
+    def probe(self) -> np.ndarray:
+        shot = self.grab()
+        try:
+            return self.probe_image(shot)
+        finally:
+            shot.close()
+
+    def same(self, a: np.ndarray, b: np.ndarray) -> bool:
+        return a.shape == b.shape and int(np.abs(a - b).max()) <= self.tolerance
+
+    def wait(self, before: Optional[np.ndarray] = None) -> bool:
+        """Block until the page is ready. Returns False if the timeout was hit.
+
+        `before` is the probe of the previous page; a region that still looks
+        like it is only accepted after `unchanged_grace` seconds.
+        """
+        start = time.monotonic()
+        last = None
+        matches = 0
+        while True:
+            probe = self.probe()
+            elapsed = time.monotonic() - start
+            matches = matches + 1 if last is not None and self.same(probe, last) else 0
+            last = probe
+            changed = before is None or not self.same(probe, before)
+            if matches >= self.stable_probes and (changed or elapsed >= self.unchanged_grace):
+                return True
+            if elapsed >= self.timeout:
+                self.timeouts += 1
+                return False
+            time.sleep(self.interval)
+
+
+class EndOfDocumentDetector:
+    """Detects the end of a document from repeated identical frames.
+
+    feed() returns the frames that should be saved now. Frames identical to
+    the previous one are held back: if `repeats` identical frames arrive in
+    a row the viewer has stopped moving, the run is done and the held
+    duplicates are dropped. If a different frame shows up first, the held
+    frames were real (e.g. two blank pages) and are released in order.
+    """
+
+    def __init__(self, repeats: int = DEFAULT_END_REPEATS, previous_hash: Optional[str] = None):
+        self.repeats = max(2, repeats)
+        self.done = False
+        self.dropped = 0
+        # previous_hash: last page of an earlier run, so a resumed run still sees the end
+        self._last_hash: Optional[str] = previous_hash
+        self._held: List[Image.Image] = []
+
+    def feed(self, frame: Image.Image) -> List[Image.Image]:
+        digest = frame_hash(frame)
+        if digest == self._last_hash:
+            self._held.append(frame)
+            if len(self._held) + 1 >= self.repeats:
+                self.done = True
+                self.dropped = len(self._held)
+                for held in self._held:
+                    held.close()
+                self._held = []
+            return []
+        self._last_hash = digest
+        released = self._held + [frame]
+        self._held = []
+        return released
+
+    def flush(self) -> List[Image.Image]:
+        """Release frames still held back when the run stops for another reason."""
+        released, self._held = self._held, []
+        return released
+
+
+class CaptureStats:
+    """Outcome of one run_capture() call."""
+
+    def __init__(self):
+        self.pages = 0
+        self.seconds = 0.0
+        self.settle_timeouts = 0
+        self.dropped_duplicates = 0
+        self.end_detected = False
+        self.cancelled = False
+
+    @property
+    def pages_per_minute(self) -> float:
+        return self.pages * 60.0 / self.seconds if self.seconds > 0 else 0.0
+
+
+def run_capture(grab: Callable[[], Image.Image], press: Callable[[str], None],
+                save: Callable[[Image.Image, int], None], num_pages: int = 0,
+                settle_timeout: float = DEFAULT_SETTLE_TIMEOUT, fixed_delay: Optional[float] = None,
+                on_page: Optional[Callable[[int], None]] = None,
+                should_stop: Optional[Callable[[], bool]] = None,
+                first_page: int = 1, resume_hash: Optional[str] = None,
+                cropper: Optional[AutoCropper] = None) -> CaptureStats:
+    """Capture pages until `num_pages` (0 = until the end is detected) or a stop request.
+
+    End detection only runs in auto mode (`num_pages` = 0): with an explicit
+    page count, identical consecutive pages (blank separators, repeated
+    forms) are all kept.
+
+    `save(frame, page_number)` receives every kept frame in order and owns it
+    afterwards. `fixed_delay` replaces settle detection with a plain sleep.
+
+    Resuming: numbering starts at `first_page`, and `resume_hash` is the hash
+    of the last page already saved. If the viewer still shows that page it
+    is skipped with one page turn instead of being captured twice.
+
+    With a `cropper` the kept frames pass through it before they are saved
+    (settle probes and end detection use the full grab). A resumed run
+    should restore the cropper's locked box so the resume check crops the
+    same way as the saved page.
+    """
+    stats = CaptureStats()
+    settle = SettleDetector(grab, timeout=settle_timeout)
+    # The end detector compares full grabs; a cropped saved page's hash only serves the resume check
+    end_detector = EndOfDocumentDetector(previous_hash=resume_hash if cropper is None else None)
+    start = time.monotonic()
+
+    def keep(frame: Image.Image) -> None:
+        for out in (cropper.feed(frame) if cropper is not None else (frame,)):
+            save(out, first_page + stats.pages)
+            stats.pages += 1
+
+    def next_page(before: Optional[np.ndarray]) -> None:
+        press('down')
+        if fixed_delay is None:
+            settle.wait(before)
+        else:
+            time.sleep(fixed_delay)
+
+    try:
+        if resume_hash is not None:
+            shot = grab()
+            before = settle.probe_image(shot) if fixed_delay is None else None
+            full_hash = frame_hash(shot)
+            if cropper is not None and cropper.locked:
+                shot = cropper.crop(shot, count=False)  # compared only, not saved
+            try:
+                if frame_hash(shot) == resume_hash:
+                    # Still on the last saved page: its full grab is what the end detector compares
+                    end_detector = EndOfDocumentDetector(previous_hash=full_hash)
+                    next_page(before)
+            finally:
+                shot.close()
+
+        last_page = first_page + (num_pages or MAX_AUTO_PAGES) - 1
+        for page in range(first_page, last_page + 1):
+            if should_stop is not None and should_stop():
+                stats.cancelled = True
+                break
+            if on_page is not None:
+                on_page(page)
+
+            shot = grab()
+            before = settle.probe_image(shot) if fixed_delay is None else None
+            # Repeated frames are held back until they prove to be real pages
+            for frame in (end_detector.feed(shot) if not num_pages else (shot,)):
+                keep(frame)
+            if end_detector.done:
+                break
+
+            # Next page, then wait until it has finished rendering
+            next_page(before)
+        for frame in end_detector.flush():
+            keep(frame)
+        if cropper is not None:
+            for frame in cropper.flush():
+                save(frame, first_page + stats.pages)
+                stats.pages += 1
+    finally:
+        stats.seconds = time.monotonic() - start
+        stats.settle_timeouts = settle.timeouts
+        stats.dropped_duplicates = end_detector.dropped
+        stats.end_detected = end_detector.done
+    return stats
@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""
+Screen capture backends
+
+A capture backend grabs a screen region as a PIL image. Native backends
+grab only the requested region (no full-screen grab + crop) and expose the
+raw BGRA pixels through grab_raw() without copying them:
+
+- "xshm":     X11 MIT-SHM XShmGetImage into a reused shared-memory segment
+- "xlib":     X11 XGetImage of just the region (no MIT-SHM available)
+- "quartz":   macOS CGWindowListCreateImage of just the region
+- "pyautogui": pyautogui.screenshot(region=...), always available fallback
+
+get_backend("auto") picks the fastest one that works on this machine.
+
+Regions are given in screen points. On HiDPI displays (macOS Retina,
+scaled Windows/Linux desktops) a grab returns more pixels than points;
+detect_scale() measures that factor once per run.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import sys
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from PIL import Image
+
+
+Region = Tuple[int, int, int, int]  # (x, y, width, height)
+
+
+class RawFrame(NamedTuple):
+    """BGRA pixels of a grabbed region. `data` may be reused by the next grab."""
+    data: memoryview
+    width: int
+    height: int
+    stride: int
+
+
+class CaptureBackend:
+    """Base class: subclasses implement grab_raw() or override grab()."""
+
+    name = ""
+
+    def grab_raw(self, region: Region) -> RawFrame:
+        raise NotImplementedError
+
+    def grab(self, region: Region) -> Image.Image:
+        raw = self.grab_raw(region)
+        # One conversion pass BGRA -> RGB; the result owns its pixels
+        return Image.frombuffer("RGB", (raw.width, raw.height), raw.data, "raw", "BGRX", raw.stride, 1)
+
+    def detect_scale(self, region: Region) -> float:
+        """Device pixels per screen point in `region` (1.0, 2.0 on Retina, 1.25/1.5 on scaled desktops)."""
+        raw = self.grab_raw(region)
+        return max(1.0, round(raw.width / max(1, region[2]) * 4) / 4)
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> "CaptureBackend":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+class PyAutoGUIBackend(CaptureBackend):
+    name = "pyautogui"
+
+    def __init__(self):
+        import pyautogui
+        self._screenshot = pyautogui.screenshot
+
+    def grab(self, region: Region) -> Image.Image:
+        shot = self._screenshot(region=region)
+        return shot if shot.mode == 'RGB' else shot.convert('RGB')
+
+    def grab_raw(self, region: Region) -> RawFrame:
+        shot = self.grab(region)
+        data = shot.tobytes("raw", "BGRX")
+        return RawFrame(memoryview(data), shot.width, shot.height, shot.width * 4)
+
+
+# ---------------------- X11 (Linux) ----------------------
+class _XImage(ctypes.Structure):
+    # Leading fields of Xlib's XImage; only these are read
+    _fields_ = [
+        ("width", ctypes.c_int), ("height", ctypes.c_int), ("xoffset", ctypes.c_int),
+        ("format", ctypes.c_int), ("data", ctypes.c_void_p), ("byte_order", ctypes.c_int),
+        ("bitmap_unit", ctypes.c_int), ("bitmap_bit_order", ctypes.c_int), ("bitmap_pad", ctypes.c_int),
+        ("depth", ctypes.c_int), ("bytes_per_line", ctypes.c_int), ("bits_per_pixel", ctypes.c_int),
+    ]
+
+
+class _XShmSegmentInfo(ctypes.Structure):
+    _fields_ = [
+        ("shmseg", ctypes.c_ulong), ("shmid", ctypes.c_int),
+        ("shmaddr", ctypes.c_void_p), ("readOnly", ctypes.c_int),
+    ]
+
+
+_ZPIXMAP = 2
+_ALL_PLANES = ctypes.c_ulong(-1).value
+_IPC_PRIVATE = 0
+_IPC_CREAT = 0o1000
+_IPC_RMID = 0
+
+
+def _load_lib(name: str) -> ctypes.CDLL:
+    path = ctypes.util.find_library(name)
+    if not path:
+        raise OSError(f"lib{name} not found")
+    return ctypes.CDLL(path)
+
+
+class XlibBackend(CaptureBackend):
+    """Region-native X11 grab. Uses MIT-SHM when `use_shm` and the server allow it."""
+
+    name = "xlib"
+
+    def __init__(self, use_shm: bool = False):
+        if not os.environ.get("DISPLAY"):
+            raise OSError("DISPLAY is not set")
+        x11 = _load_lib("X11")
+        x11.XOpenDisplay.restype = ctypes.c_void_p
+        x11.XOpenDisplay.argtypes = [ctypes.c_char_p]
+        x11.XDefaultScreen.argtypes = [ctypes.c_void_p]
+        x11.XRootWindow.restype = ctypes.c_ulong
+        x11.XRootWindow.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        x11.XDefaultVisual.restype = ctypes.c_void_p
+        x11.XDefaultVisual.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        x11.XDefaultDepth.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        x11.XGetImage.restype = ctypes.POINTER(_XImage)
+        x11.XGetImage.argtypes = [ctypes.c_void_p, ctypes.c_ulong, ctypes.c_int, ctypes.c_int,
+                                  ctypes.c_uint, ctypes.c_uint, ctypes.c_ulong, ctypes.c_int]
+        x11.XDestroyImage.argtypes = [ctypes.POINTER(_XImage)]
+        x11.XSync.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        x11.XCloseDisplay.argtypes = [ctypes.c_void_p]
+        self._x11 = x11
+
+        self._display = x11.XOpenDisplay(None)
+        if not self._display:
+            raise OSError("cannot open X display")
+        screen = x11.XDefaultScreen(self._display)
+        self._root = x11.XRootWindow(self._display, screen)
+        self._visual = x11.XDefaultVisual(self._display, screen)
+        self._depth = x11.XDefaultDepth(self._display, screen)
+
+        self._image = None          # last XImage (XGetImage) or reused shm XImage
+        self._shm = None
+        self._shm_size = None
+        if use_shm:
+            try:
+                self._init_shm()
+            except Exception:
+                self.close()
+                raise
+
+    # ---- MIT-SHM ----
+    def _init_shm(self) -> None:
+        xext = _load_lib("Xext")
+        xext.XShmQueryExtension.argtypes = [ctypes.c_void_p]
+        xext.XShmCreateImage.restype = ctypes.POINTER(_XImage)
+        xext.XShmCreateImage.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_uint, ctypes.c_int,
+                                         ctypes.c_void_p, ctypes.POINTER(_XShmSegmentInfo),
+                                         ctypes.c_uint, ctypes.c_uint]
+        xext.XShmAttach.argtypes = [ctypes.c_void_p, ctypes.POINTER(_XShmSegmentInfo)]
+        xext.XShmDetach.argtypes = [ctypes.c_void_p, ctypes.POINTER(_XShmSegmentInfo)]
+        xext.XShmGetImage.argtypes = [ctypes.c_void_p, ctypes.c_ulong, ctypes.POINTER(_XImage),
+                                      ctypes.c_int, ctypes.c_int, ctypes.c_ulong]
+        if not xext.XShmQueryExtension(self._display):
+            raise OSError("MIT-SHM extension not available")
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        libc.shmget.argtypes = [ctypes.c_int, ctypes.c_size_t, ctypes.c_int]
+        libc.shmat.restype = ctypes.c_void_p
+        libc.shmat.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_int]
+        libc.shmdt.argtypes = [ctypes.c_void_p]
+        libc.shmctl.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_void_p]
+        self._xext = xext
+        self._libc = libc
+        self._shm = _XShmSegmentInfo()
+        self.name = "xshm"
+        # Set up a segment now, so a failure surfaces here (get_backend falls back) and not on the first grab
+        self._shm_image(1, 1)
+
+    def _shm_image(self, width: int, height: int) -> "ctypes.POINTER(_XImage)":
+        if self._shm_size == (width, height):
+            return self._image
+        self._free_shm_image()
+        image = self._xext.XShmCreateImage(self._display, self._visual, self._depth, _ZPIXMAP,
+                                           None, ctypes.byref(self._shm), width, height)
+        if not image:
+            raise OSError("XShmCreateImage failed")
+        size = image.contents.bytes_per_line * height
+        shmid = self._libc.shmget(_IPC_PRIVATE, size, _IPC_CREAT | 0o600)
+        if shmid < 0:
+            self._x11.XDestroyImage(image)
+            raise OSError(ctypes.get_errno(), "shmget failed")
+        addr = self._libc.shmat(shmid, None, 0)
+        if addr == ctypes.c_void_p(-1).value:
+            errno = ctypes.get_errno()
+            self._x11.XDestroyImage(image)
+            self._libc.shmctl(shmid, _IPC_RMID, None)
+            raise OSError(errno, "shmat failed")
+        self._shm.shmid = shmid
+        self._shm.shmaddr = addr
+        self._shm.readOnly = 0
+        image.contents.data = addr
+        if not self._xext.XShmAttach(self._display, ctypes.byref(self._shm)):
+            image.contents.data = None  # not malloc'ed; keep XDestroyImage away from it
+            self._x11.XDestroyImage(image)
+            self._libc.shmdt(addr)
+            self._libc.shmctl(shmid, _IPC_RMID, None)
+            raise OSError("XShmAttach failed")
+        self._x11.XSync(self._display, 0)
+        # Segment is freed automatically once both sides detach
+        self._libc.shmctl(shmid, _IPC_RMID, None)
+        self._image = image
+        self._shm_size = (width, height)
+        return image
+
+    def _free_shm_image(self) -> None:
+        if self._shm_size is None:
+            return
+        self._xext.XShmDetach(self._display, ctypes.byref(self._shm))
+        self._x11.XSync(self._display, 0)
+        self._image.contents.data = None  # not malloc'ed; keep XDestroyImage away from it
+        self._x11.XDestroyImage(self._image)
+        self._libc.shmdt(self._shm.shmaddr)
+        self._image = None
+        self._shm_size = None
+
+    # ---- Grabbing ----
+    def grab_raw(self, region: Region) -> RawFrame:
+        x, y, width, height = region
+        if self._shm is not None:
+            image = self._shm_image(width, height)
+            self._xext.XShmGetImage(self._display, self._root, image, x, y, _ALL_PLANES)
+        else:
+            if self._image is not None:
+                self._x11.XDestroyImage(self._image)
+                self._image = None
+            image = self._x11.XGetImage(self._display, self._root, x, y, width, height, _ALL_PLANES, _ZPIXMAP)
+            if not image:
+                raise OSError("XGetImage failed (region outside the screen?)")
+            self._image = image
+        img = image.contents
+        if img.bits_per_pixel != 32:
+            raise OSError(f"unsupported X pixel format ({img.bits_per_pixel} bpp)")
+        size = img.bytes_per_line * height
+        data = memoryview((ctypes.c_char * size).from_address(img.data)).cast("B")
+        return RawFrame(data, width, height, img.bytes_per_line)
+
+    def close(self) -> None:
+        if not getattr(self, "_display", None):
+            return
+        if self._shm is not None:
+            self._free_shm_image()
+        elif self._image is not None:
+            self._x11.XDestroyImage(self._image)
+        self._image = None
+        self._x11.XCloseDisplay(self._display)
+        self._display = None
+
+
+class XShmBackend(XlibBackend):
+    name = "xshm"
+
+    def __init__(self):
+        super().__init__(use_shm=True)
+
+
+# ---------------------- Quartz (macOS) ----------------------
+class QuartzBackend(CaptureBackend):
+    """Region-native grab through CoreGraphics (pyobjc, installed with pyautogui on macOS).
+
+    Coordinates are in points; on Retina displays the frame comes back in pixels.
+    """
+
+    name = "quartz"
+
+    def __init__(self):
+        if sys.platform != "darwin":
+            raise OSError("Quartz capture is only available on macOS")
+        import Quartz
+        self._q = Quartz
+        self._keep = None
+
+    def grab_raw(self, region: Region) -> RawFrame:
+        q = self._q
+        x, y, width, height = region
+        cg_image = q.CGWindowListCreateImage(
+            q.CGRectMake(x, y, width, height),
+            q.kCGWindowListOptionOnScreenOnly,
+            q.kCGNullWindowID,
+            q.kCGWindowImageDefault,
+        )
+        if cg_image is None:
+            raise OSError("CGWindowListCreateImage failed (screen recording permission?)")
+        if q.CGImageGetBitsPerPixel(cg_image) != 32:
+            raise OSError("unsupported Quartz pixel format")
+        # CFData keeps the pixel buffer alive until the next grab
+        self._keep = q.CGDataProviderCopyData(q.CGImageGetDataProvider(cg_image))
+        return RawFrame(memoryview(self._keep).cast("B"), q.CGImageGetWidth(cg_image),
+                        q.CGImageGetHeight(cg_image), q.CGImageGetBytesPerRow(cg_image))
+
+
+# ---------------------- Registry ----------------------
+BACKENDS: Dict[str, Callable[[], CaptureBackend]] = {
+    "quartz": QuartzBackend,
+    "xshm": XShmBackend,
+    "xlib": XlibBackend,
+    "pyautogui": PyAutoGUIBackend,
+}
+
+BACKEND_CHOICES: List[str] = ["auto"] + list(BACKENDS)
+
+
+def get_backend(name: str = "auto") -> CaptureBackend:
+    """Create the named backend; "auto" tries native backends before pyautogui.
+
+    An unavailable named backend also falls back to pyautogui.
+    """
+    candidates = list(BACKENDS) if name == "auto" else [name, "pyautogui"]
+    last_error: Optional[Exception] = None
+    for candidate in candidates:
+        factory = BACKENDS.get(candidate)
+        if factory is None:
+            continue
+        try:
+            return factory()
+        except Exception as e:
+            last_error = e
+    raise OSError(f"no capture backend available: {last_error}")
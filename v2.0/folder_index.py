@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Folder image index
+
+Lists the images of a folder with one os.scandir pass and reads only the
+file headers (PNG IHDR, JPEG SOF marker) for size, mode and bit depth, so
+counting and validating folders with thousands of pages never decodes a
+pixel. Headers are cached per directory: every call lists the directory
+and stats each file (cheap), and only files that are new or whose size or
+mtime changed are read again, so a page overwritten in place is re-read
+even though the directory's own mtime did not change.
+"""
+
+import os
+import struct
+import threading
+from pathlib import Path
+from typing import BinaryIO, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from manifest import natural_key
+
+
+PNG_EXTENSIONS = (".png",)
+JPEG_EXTENSIONS = (".jpg", ".jpeg")
+IMAGE_EXTENSIONS = PNG_EXTENSIONS + JPEG_EXTENSIONS
+
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# IHDR color type -> PIL mode
+_PNG_MODES = {0: "L", 2: "RGB", 3: "P", 4: "LA", 6: "RGBA"}
+_JPEG_MODES = {1: "L", 3: "RGB", 4: "CMYK"}
+# SOF0..SOF15 except DHT (C4), JPG (C8) and DAC (CC)
+_JPEG_SOF = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+class ImageInfo(NamedTuple):
+    path: Path
+    format: str       # "PNG" or "JPEG"
+    width: int
+    height: int
+    mode: str         # PIL mode the file decodes to ("1", "L", "RGB", "P", ...)
+    bits: int         # bits per sample
+    file_size: int
+    mtime_ns: int
+
+
+def _png_header(f: BinaryIO) -> Optional[Tuple[int, int, str, int]]:
+    head = f.read(29)  # signature, IHDR length/type, 13 bytes of IHDR data
+    if len(head) < 29 or head[:8] != _PNG_SIGNATURE or head[12:16] != b"IHDR":
+        return None
+    width, height, bits, color_type = struct.unpack(">IIBB", head[16:26])
+    if color_type not in _PNG_MODES:
+        return None
+    mode = _PNG_MODES[color_type]
+    if color_type == 0 and bits == 1:
+        mode = "1"
+    elif color_type == 0 and bits == 16:
+        mode = "I;16"
+    return width, height, mode, bits
+
+
+def _jpeg_header(f: BinaryIO) -> Optional[Tuple[int, int, str, int]]:
+    if f.read(2) != b"\xff\xd8":
+        return None
+    while True:
+        if f.read(1) != b"\xff":
+            return None
+        marker = f.read(1)
+        while marker == b"\xff":  # fill bytes before a marker
+            marker = f.read(1)
+        if not marker:
+            return None
+        code = marker[0]
+        if code == 0xD9 or code == 0xDA:  # EOI / start of scan without a SOF
+            return None
+        if 0xD0 <= code <= 0xD7 or code == 0x01:
+            continue  # markers without a length field
+        seg = f.read(2)
+        if len(seg) < 2:
+            return None
+        length = struct.unpack(">H", seg)[0]
+        if code in _JPEG_SOF:
+            sof = f.read(6)
+            if len(sof) < 6:
+                return None
+            bits, height, width, components = struct.unpack(">BHHB", sof)
+            return width, height, _JPEG_MODES.get(components, "RGB"), bits
+        f.seek(length - 2, os.SEEK_CUR)
+
+
+def read_image_header(path) -> Optional[ImageInfo]:
+    """Header-only ImageInfo for a PNG or JPEG file, or None if it isn't one."""
+    path = Path(path)
+    suffix = path.suffix.lower()
+    reader = _png_header if suffix in PNG_EXTENSIONS else _jpeg_header if suffix in JPEG_EXTENSIONS else None
+    if reader is None:
+        return None
+    try:
+        st = path.stat()
+        with open(path, "rb") as f:
+            header = reader(f)
+    except (OSError, struct.error):
+        return None
+    if header is None:
+        return None
+    width, height, mode, bits = header
+    fmt = "PNG" if reader is _png_header else "JPEG"
+    return ImageInfo(path, fmt, width, height, mode, bits, st.st_size, st.st_mtime_ns)
+
+
+_cache: Dict[str, Dict[str, ImageInfo]] = {}  # directory -> file name -> header
+_cache_lock = threading.Lock()
+
+
+def scan_folder(folder, extensions: Sequence[str] = IMAGE_EXTENSIONS) -> List[ImageInfo]:
+    """Images in `folder` (matching `extensions`, case-insensitive) in natural name order.
+
+    Unreadable or corrupt files are left out.
+    """
+    folder = Path(folder)
+    key = str(folder.resolve())
+    with _cache_lock:
+        previous = _cache.get(key, {})
+    current: Dict[str, ImageInfo] = {}
+    with os.scandir(key) as it:
+        for entry in it:
+            if not entry.name.lower().endswith(IMAGE_EXTENSIONS) or not entry.is_file():
+                continue
+            st = entry.stat()
+            old = previous.get(entry.name)
+            if old is not None and old.file_size == st.st_size and old.mtime_ns == st.st_mtime_ns:
+                current[entry.name] = old
+                continue
+            info = read_image_header(folder / entry.name)
+            if info is not None:
+                current[entry.name] = info
+    with _cache_lock:
+        _cache[key] = current
+    wanted = tuple(ext.lower() for ext in extensions)
+    infos = [info for name, info in current.items() if name.lower().endswith(wanted)]
+    infos.sort(key=lambda info: natural_key(info.path.name))
+    return infos
+
+
+def count_images(folder, extensions: Sequence[str] = IMAGE_EXTENSIONS) -> int:
+    """Number of readable images in `folder`; 0 if the folder can't be listed."""
+    try:
+        return len(scan_folder(folder, extensions))
+    except OSError:
+        return 0
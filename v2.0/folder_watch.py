@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+Watch-folder conversion
+
+FolderWatcher reports page files of a folder once they are complete on
+disk. On Linux it listens to inotify (through ctypes, no extra package);
+elsewhere, or when inotify is unavailable (some network shares), it polls
+the directory. A PNG counts as stable when it ends with the IEND chunk and
+either its writer closed it (inotify), or it has not changed for `settle`
+seconds.
+
+watch_to_pdf() encodes every stable page on a process pool and writes it
+into the PDF right away, in arrival order. Pages can arrive out of order
+(parallel capture, files synced in from other machines), so the page tree
+is sorted into reading order only when the run stops; that and the trailer
+are all that is left to do at the end.
+
+Usage:
+    python3 folder_watch.py FOLDER [-o book.pdf] [--idle S] [--backend auto|inotify|poll]
+"""
+
+import argparse
+import ctypes
+import ctypes.util
+import os
+import select
+import signal
+import struct
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from manifest import natural_key, ordered_pages
+from pdf_stream import encode_file, image_resolution, ocr_worker_initializer, StreamingPDFWriter
+
+
+WATCH_BACKENDS = ("auto", "inotify", "poll")
+
+DEFAULT_SETTLE = 1.0        # seconds without change before a polled file is taken
+DEFAULT_POLL_INTERVAL = 0.5
+
+_PNG_END = b"\x00\x00\x00\x00IEND\xaeB`\x82"  # empty IEND chunk with its CRC
+
+# <sys/inotify.h>
+_IN_MODIFY = 0x00000002
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_Q_OVERFLOW = 0x00004000
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+_EVENT = struct.Struct("iIII")  # wd, mask, cookie, len (name follows, NUL padded)
+
+
+def png_complete(path) -> bool:
+    """True if the file ends with a PNG IEND chunk (i.e. it was written to the end)."""
+    try:
+        with open(path, 'rb') as f:
+            f.seek(-len(_PNG_END), os.SEEK_END)
+            return f.read() == _PNG_END
+    except OSError:
+        return False
+
+
+class _Inotify:
+    """Minimal inotify binding for one directory."""
+
+    def __init__(self, folder: Path):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError("inotify is not available")
+        self.fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE | _IN_MODIFY
+        if libc.inotify_add_watch(self.fd, os.fsencode(str(folder)), mask) < 0:
+            err = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(err, f"inotify_add_watch failed for {folder}")
+
+    def read(self, timeout: float) -> Tuple[Set[str], Set[str], bool]:
+        """Wait up to `timeout` s; returns (changed names, closed names, queue overflowed)."""
+        changed: Set[str] = set()
+        closed: Set[str] = set()
+        overflow = False
+        ready, _, _ = select.select([self.fd], [], [], max(0.0, timeout))
+        while ready:
+            try:
+                buf = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            pos = 0
+            while pos + _EVENT.size <= len(buf):
+                _, mask, _, length = _EVENT.unpack_from(buf, pos)
+                name = os.fsdecode(buf[pos + _EVENT.size:pos + _EVENT.size + length].rstrip(b"\0"))
+                pos += _EVENT.size + length
+                if mask & _IN_Q_OVERFLOW:
+                    overflow = True
+                elif name:
+                    changed.add(name)
+                    if mask & (_IN_CLOSE_WRITE | _IN_MOVED_TO):
+                        closed.add(name)
+        return changed, closed, overflow
+
+    def close(self) -> None:
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class FolderWatcher:
+    """Reports each page file of `folder` once, as soon as it is stable on disk.
+
+    Files already in the folder are reported too (the first poll picks them
+    up). `backend` is "auto" (inotify when available, else polling),
+    "inotify" or "poll".
+    """
+
+    def __init__(self, folder, suffix: str = ".png", settle: float = DEFAULT_SETTLE,
+                 interval: float = DEFAULT_POLL_INTERVAL, backend: str = "auto"):
+        if backend not in WATCH_BACKENDS:
+            raise ValueError(f"unknown watch backend {backend!r} (expected one of {', '.join(WATCH_BACKENDS)})")
+        self.folder = Path(folder)
+        self.suffix = suffix.lower()
+        self.settle = settle
+        self.interval = interval
+        self._inotify: Optional[_Inotify] = None
+        if backend != "poll":
+            try:
+                self._inotify = _Inotify(self.folder)
+            except (OSError, AttributeError):
+                if backend == "inotify":
+                    raise
+        self.backend = "inotify" if self._inotify is not None else "poll"
+        self._reported: Set[str] = set()
+        self._pending: Dict[str, Tuple[int, int, float]] = {}  # name -> (size, mtime_ns, unchanged since)
+        self._closed: Set[str] = set()
+        self._rescan = True  # first poll lists the whole folder
+
+    def __enter__(self) -> "FolderWatcher":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def poll(self, timeout: float = DEFAULT_POLL_INTERVAL) -> List[Path]:
+        """Newly stable files, waiting up to `timeout` s for one to appear."""
+        ready = self._collect()
+        if not ready and timeout > 0:
+            self._wait(timeout)
+            ready = self._collect()
+        return ready
+
+    def finish(self) -> List[Path]:
+        """Final sweep: every remaining complete file, without waiting for it to settle."""
+        self._rescan = True
+        return self._collect(final=True)
+
+    def close(self) -> None:
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+
+    # ---------------------- Internals ----------------------
+    def _wait(self, timeout: float) -> None:
+        if self._inotify is None:
+            time.sleep(min(timeout, self.interval))
+            self._rescan = True
+            return
+        if self._pending:
+            timeout = min(timeout, self.settle)  # unsettled files need a second look
+        changed, closed, overflow = self._inotify.read(timeout)
+        for name in changed - closed:
+            self._closed.discard(name)  # written again after it was closed
+        self._closed |= closed
+        self._rescan = self._rescan or overflow
+        for name in changed:
+            self._pending.setdefault(name, (-1, -1, 0.0))
+
+    def _wanted(self, name: str) -> bool:
+        return (name not in self._reported and not name.startswith(".")
+                and name.lower().endswith(self.suffix))
+
+    def _collect(self, final: bool = False) -> List[Path]:
+        if self._rescan:
+            self._rescan = False
+            with os.scandir(self.folder) as it:
+                for entry in it:
+                    if self._wanted(entry.name) and entry.name not in self._pending:
+                        self._pending[entry.name] = (-1, -1, 0.0)
+        ready = []
+        for name in list(self._pending):
+            if not self._wanted(name):
+                del self._pending[name]
+            elif self._stable(name, final):
+                del self._pending[name]
+                self._closed.discard(name)
+                self._reported.add(name)
+                ready.append(self.folder / name)
+        ready.sort(key=lambda p: natural_key(p.name))
+        return ready
+
+    def _stable(self, name: str, final: bool) -> bool:
+        path = self.folder / name
+        try:
+            st = os.stat(path)
+        except OSError:
+            del self._pending[name]  # removed or renamed away (temporary file)
+            return False
+        now = time.monotonic()
+        size, mtime_ns, since = self._pending[name]
+        if (size, mtime_ns) != (st.st_size, st.st_mtime_ns):
+            self._pending[name] = (st.st_size, st.st_mtime_ns, now)
+            since = now
+        quiet = (now - since >= self.settle or time.time() - st.st_mtime >= self.settle)
+        if not (final or name in self._closed or quiet):
+            return False
+        return png_complete(path)
+
+
+def _page_order(folder: Path, names: List[str]) -> List[int]:
+    """Indices of `names` in reading order (capture manifest, else natural sort)."""
+    rank = {path.name: i for i, path in enumerate(ordered_pages(folder))}
+    return sorted(range(len(names)), key=lambda i: (rank.get(names[i], len(rank)), natural_key(names[i])))
+
+
+def watch_to_pdf(folder, pdf_path, should_stop: Callable[[], bool], idle_timeout: float = 0,
+                 workers: int = 0, backend: str = "auto", settle: float = DEFAULT_SETTLE,
+                 on_page: Optional[Callable[[int, Path], None]] = None,
+                 **writer_options) -> StreamingPDFWriter:
+    """Convert PNGs of `folder` into `pdf_path` while they arrive.
+
+    Runs until `should_stop()` returns True or, with `idle_timeout` > 0, no
+    new page has arrived for that many seconds (after at least one page).
+    `on_page(count, path)` runs after every page written. Without a
+    `resolution` option the first page's recorded DPI is used. Returns the
+    closed writer (page_count, shared_pages).
+    """
+    folder = Path(folder)
+    workers = workers if workers > 0 else (os.cpu_count() or 1)
+    max_in_flight = workers * 2
+    writer = StreamingPDFWriter(pdf_path, **writer_options)
+    # OCR runs in the pool even with one worker, so this process never loads the engine
+    initializer = ocr_worker_initializer(writer.ocr)
+    pool = (ProcessPoolExecutor(max_workers=workers, initializer=initializer)
+            if workers > 1 or initializer is not None else None)
+    waiting: deque = deque()    # stable files not yet submitted
+    in_flight: deque = deque()  # (path, future) in submission order
+    names: List[str] = []       # file of every page written, in write order
+    resolution_known = "resolution" in writer_options
+    try:
+        with FolderWatcher(folder, settle=settle, backend=backend) as watcher:
+            last_new = time.monotonic()
+            while True:
+                stopping = should_stop() or bool(
+                    idle_timeout and names and time.monotonic() - last_new >= idle_timeout)
+                new = watcher.finish() if stopping else watcher.poll(0.05 if in_flight else DEFAULT_POLL_INTERVAL)
+                if new:
+                    last_new = time.monotonic()
+                    waiting.extend(new)
+
+                while waiting and len(in_flight) < max_in_flight:
+                    path = waiting.popleft()
+                    if not resolution_known:
+                        writer.resolution = image_resolution(path)  # DPI recorded by the capture
+                        resolution_known = True
+                    if pool is None:
+                        writer.add_encoded(encode_file(path, writer.quality, writer.passthrough, writer.codec,
+                                                       writer.ocr, writer.dedupe))
+                        names.append(path.name)
+                        if on_page is not None:
+                            on_page(len(names), path)
+                        continue
+                    in_flight.append((path, pool.submit(encode_file, path, writer.quality, writer.passthrough,
+                                                        writer.codec, writer.ocr, writer.dedupe)))
+                while in_flight and (stopping or in_flight[0][1].done()):
+                    path, future = in_flight.popleft()
+                    writer.add_encoded(future.result())
+                    names.append(path.name)
+                    if on_page is not None:
+                        on_page(len(names), path)
+
+                if stopping and not waiting and not in_flight:
+                    break
+
+        if not names:
+            raise RuntimeError("no PNG files arrived")
+        # Final assembly: page tree in reading order, trailer
+        writer.reorder_pages(_page_order(folder, names))
+        writer.close()
+    except BaseException:
+        writer.abort()
+        raise
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+    return writer
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Convert PNGs into a PDF as they arrive in a folder")
+    parser.add_argument("folder", help="folder to watch")
+    parser.add_argument("-o", "--output", help="PDF to write (default: <folder>/<folder name>.pdf)")
+    parser.add_argument("--idle", type=float, default=0,
+                        help="stop after this many seconds without a new page (default: run until Ctrl+C)")
+    parser.add_argument("--backend", choices=WATCH_BACKENDS, default="auto")
+    parser.add_argument("--settle", type=float, default=DEFAULT_SETTLE,
+                        help="seconds a polled file must stay unchanged (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=0, help="encoder processes (default: all CPUs)")
+    parser.add_argument("--codec", choices=("jpeg", "auto"), default="jpeg")
+    args = parser.parse_args()
+
+    folder = Path(args.folder)
+    output = Path(args.output) if args.output else folder / f"{folder.resolve().name}.pdf"
+    stop = []
+    # Ctrl+C finishes the PDF with the pages that have arrived so far
+    signal.signal(signal.SIGINT, lambda *_: stop.append(True))
+
+    def on_page(count: int, path: Path) -> None:
+        print(f"\r{count} pages (last: {path.name})", end="", flush=True)
+
+    started = time.perf_counter()
+    print(f"Watching {folder} -> {output} (Ctrl+C to finish)")
+    try:
+        writer = watch_to_pdf(folder, output, lambda: bool(stop), idle_timeout=args.idle,
+                              workers=args.workers, backend=args.backend, settle=args.settle,
+                              on_page=on_page, codec=args.codec)
+    except RuntimeError as e:
+        sys.exit(f"\n{e}")
+    print(f"\n{output}: {writer.page_count} pages in {time.perf_counter() - started:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
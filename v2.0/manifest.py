@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Capture run manifest
+
+Every capture run keeps `capture_manifest.jsonl` in its output folder. The
+file is append-only JSON lines, written while the run progresses:
+
+    {"type": "run", "region": [x, y, w, h], "num_pages": 0, "resume_from": 0, "started": ...}
+    {"type": "page", "page": 1, "file": "strana_01.png", "width": 840, "height": 1150,
+     "hash": "...", "t": 0.84, "save": 0.21}
+    {"type": "crop", "box": [l, t, r, b], "frame": [w, h], "colors": [grey levels]}
+
+`t` is when the page was grabbed (seconds into the run) and `save` how long
+it then took to reach the disk. A page line is appended only after its PNG
+is fully written, so after a crash or cancel the manifest tells exactly
+which pages are done; `hash` lets a resumed run recognise the last saved
+page on screen. A torn last line (crash mid-write) is ignored when loading.
+A crop line records the auto-crop box once it is locked, so a resumed run
+crops (and hashes) its frames exactly like the pages already saved.
+
+ordered_pages() is the page index the converters read: manifest order when
+the folder has one, otherwise a natural sort, because plain name order puts
+`strana_100.png` before `strana_11.png`.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+from PIL import Image
+
+from pdf_stream import frame_hash
+
+
+MANIFEST_NAME = "capture_manifest.jsonl"
+
+_DIGITS = re.compile(r"(\d+)")
+
+
+def natural_key(name: str) -> list:
+    """Sort key that orders embedded numbers numerically (strana_9 < strana_10 < strana_100)."""
+    return [int(part) if part.isdigit() else part.lower() for part in _DIGITS.split(name)]
+
+
+def _file_names(folder: Path) -> Set[str]:
+    with os.scandir(folder) as it:
+        return {entry.name for entry in it if entry.is_file()}
+
+
+def ordered_pages(folder, suffix: str = ".png") -> List[Path]:
+    """Page files of a folder in reading order.
+
+    A capture manifest gives the order directly; plain folders fall back to
+    a natural sort of the file names. One directory scan either way.
+    """
+    folder = Path(folder)
+    names = _file_names(folder)
+    if MANIFEST_NAME in names:
+        pages = CaptureManifest(folder).page_files(names)
+        if pages:
+            return pages
+    suffix = suffix.lower()
+    return [folder / name for name in sorted((n for n in names if n.lower().endswith(suffix)), key=natural_key)]
+
+
+class CaptureManifest:
+    """Reader/appender for one folder's capture manifest."""
+
+    def __init__(self, folder):
+        self.folder = Path(folder)
+        self.path = self.folder / MANIFEST_NAME
+        self.runs: List[dict] = []
+        self.pages: Dict[int, dict] = {}
+        self.crop: Optional[dict] = None  # last locked auto-crop box
+        self._lock = threading.Lock()
+        self._fp = None
+        self._pending: Dict[str, Tuple[int, float]] = {}
+        self._run_started = time.monotonic()
+        if self.path.exists():
+            self._load()
+
+    @classmethod
+    def exists(cls, folder) -> bool:
+        return (Path(folder) / MANIFEST_NAME).exists()
+
+    def _load(self) -> None:
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # torn line from an interrupted write
+                if entry.get("type") == "run":
+                    self.runs.append(entry)
+                elif entry.get("type") == "page":
+                    self.pages[int(entry["page"])] = entry
+                elif entry.get("type") == "crop":
+                    self.crop = entry
+
+    # ---------------------- Queries ----------------------
+    @property
+    def region(self) -> Optional[tuple]:
+        return tuple(self.runs[-1]["region"]) if self.runs else None
+
+    def last_good_page(self, names: Optional[Set[str]] = None) -> int:
+        """Highest page N such that pages 1..N are recorded and their files exist.
+
+        `names` is the folder's file list if the caller has already scanned it.
+        """
+        if names is None:
+            names = _file_names(self.folder)
+        page = 0
+        while (page + 1) in self.pages and self.pages[page + 1]["file"] in names:
+            page += 1
+        return page
+
+    def page_hash(self, page: int) -> Optional[str]:
+        entry = self.pages.get(page)
+        return entry["hash"] if entry else None
+
+    def page_files(self, names: Optional[Set[str]] = None) -> List[Path]:
+        """Recorded page files that still exist, in page order."""
+        if names is None:
+            names = _file_names(self.folder)
+        files = (self.pages[p]["file"] for p in sorted(self.pages))
+        return [self.folder / name for name in files if name in names]
+
+    # ---------------------- Writing ----------------------
+    def start_run(self, region, num_pages: int = 0, resume_from: int = 0, backend: str = "") -> None:
+        """Open the manifest for appending; a fresh run (resume_from=0) starts a new file."""
+        if resume_from == 0:
+            self.runs = []
+            self.pages = {}
+            self.crop = None
+        self._fp = open(self.path, 'a' if resume_from else 'w', encoding='utf-8')
+        self._run_started = time.monotonic()
+        entry = {"type": "run", "region": list(region), "num_pages": num_pages,
+                 "resume_from": resume_from, "backend": backend,
+                 "started": time.strftime("%Y-%m-%dT%H:%M:%S")}
+        self.runs.append(entry)
+        self._append(entry)
+
+    def page_captured(self, page: int, path) -> None:
+        """Note when a page was grabbed (capture thread, before the frame is queued)."""
+        with self._lock:
+            self._pending[Path(path).name] = (page, time.monotonic())
+
+    def page_saved(self, frame: Image.Image, path) -> None:
+        """Record a page once its file is on disk (FrameWriter `on_saved` hook)."""
+        digest = frame_hash(frame)
+        now = time.monotonic()
+        with self._lock:
+            page, captured = self._pending.pop(Path(path).name)
+            entry = {"type": "page", "page": page, "file": Path(path).name,
+                     "width": frame.width, "height": frame.height, "hash": digest,
+                     "t": round(captured - self._run_started, 3), "save": round(now - captured, 3)}
+            self.pages[page] = entry
+            self._append(entry)
+
+    def crop_locked(self, box, frame_size, colors) -> None:
+        """Record the auto-crop box (AutoCropper `on_lock` hook)."""
+        entry = {"type": "crop", "box": list(box), "frame": list(frame_size), "colors": colors}
+        with self._lock:
+            self.crop = entry
+            self._append(entry)
+
+    def _append(self, entry: dict) -> None:
+        self._fp.write(json.dumps(entry) + "\n")
+        self._fp.flush()
+
+    def close(self) -> None:
+        if self._fp is not None:
+            self._fp.close()
+            self._fp = None
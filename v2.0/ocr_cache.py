@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+On-disk OCR result cache
+
+Results are content-addressed: the key hashes the image file's bytes
+together with the OCR engine and its version, the language, Tesseract
+config and preprocessing parameters, so a renamed or copied page still
+hits and any changed setting (or Tesseract upgrade) misses.
+One small JSON file per result under <root>/<key[:2]>/<key>.json.
+
+Safe for concurrent processes: entries are written to a temp file in the
+same directory and moved into place with os.replace (readers see the old
+entry, the new one or none, never a partial file). A hit refreshes the
+file's mtime, which is the LRU clock; when the cache grows past
+`max_bytes`, the least recently used entries are removed under an
+advisory lock file so only one process evicts at a time.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: eviction runs without the lock (deletes are race-tolerant)
+    fcntl = None
+
+
+CACHE_VERSION = 1
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+# Eviction trims to this fraction of max_bytes, so it does not run after every write
+EVICT_TARGET = 0.9
+STALE_TEMP_SECONDS = 3600
+
+_HASH_CHUNK = 1 << 20
+
+
+def default_cache_dir() -> Path:
+    base = os.environ.get("XDG_CACHE_HOME") or str(Path.home() / ".cache")
+    return Path(base) / "supertool" / "ocr"
+
+
+def file_digest(path: Path) -> str:
+    """BLAKE2b of the file's bytes."""
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _pack_words(words: List[dict]) -> List[list]:
+    return [[w['text'], w['conf'], w['left'], w['top'], w['width'], w['height'], list(w['block']), w['line']]
+            for w in words]
+
+
+def _unpack_words(rows: List[list]) -> List[dict]:
+    return [{'text': text, 'conf': conf, 'left': left, 'top': top, 'width': width, 'height': height,
+             'block': tuple(block), 'line': line}
+            for text, conf, left, top, width, height, block, line in rows]
+
+
+class OCRCache:
+    """Size-bounded LRU cache of OCR results, shared by processes through the file system."""
+
+    def __init__(self, root: Optional[Path] = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.root = Path(root) if root is not None else default_cache_dir()
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._written = 0
+
+    def key(self, image_path: Path, language: str, config: str, preprocess: Optional[Dict[str, Any]] = None,
+            engine: str = "") -> str:
+        """Cache key for an image file and the settings that affect its OCR result.
+
+        `engine` identifies the engine and its version (ocr_engine.engine_id).
+        """
+        settings = json.dumps([CACHE_VERSION, engine, language, config, preprocess or {}], sort_keys=True)
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(file_digest(image_path).encode("ascii"))
+        digest.update(settings.encode("utf-8"))
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[Tuple[str, float, List[dict]]]:
+        """(text, confidence, words) or None; a hit becomes the most recently used entry."""
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            result = entry["text"], float(entry["confidence"]), _unpack_words(entry["words"])
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except (OSError, ValueError, KeyError, TypeError):
+            # Unreadable or from an older layout: drop it and recompute
+            try:
+                path.unlink()
+            except OSError:
+                pass
+            self.misses += 1
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass  # evicted meanwhile; the result is still valid
+        self.hits += 1
+        return result
+
+    def put(self, key: str, text: str, confidence: float, words: List[dict]) -> None:
+        """Store a result (atomically); errors are ignored, the cache is only an optimisation."""
+        path = self._path(key)
+        data = json.dumps({"text": text, "confidence": confidence, "words": _pack_words(words)},
+                          ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        tmp = None
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".", suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+            tmp = None
+        except OSError:
+            return
+        finally:
+            if tmp is not None:
+                try:
+                    os.unlink(tmp)
+                except OSError:
+                    pass
+        # Check the total size after every ~5 % of the budget written by this process
+        self._written += len(data)
+        if self._written >= self.max_bytes // 20:
+            self._written = 0
+            self.evict()
+
+    def _entries(self) -> List[Tuple[float, int, str]]:
+        """(mtime, size, path) of every entry; removes temp files left by crashed writers."""
+        entries = []
+        now = time.time()
+        try:
+            shards = list(os.scandir(self.root))
+        except OSError:
+            return entries
+        for shard in shards:
+            if not shard.is_dir():
+                continue
+            try:
+                files = list(os.scandir(shard.path))
+            except OSError:
+                continue
+            for entry in files:
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                if entry.name.endswith(".tmp"):
+                    if now - stat.st_mtime > STALE_TEMP_SECONDS:
+                        try:
+                            os.unlink(entry.path)
+                        except OSError:
+                            pass
+                    continue
+                if entry.name.endswith(".json"):
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def evict(self) -> int:
+        """Remove least recently used entries while over `max_bytes`; returns the number removed.
+
+        Skipped (returns 0) when another process is already evicting.
+        """
+        try:
+            self.root.mkdir(parents=True, exist_ok=True)
+            lock = open(self.root / ".lock", "a")
+        except OSError:
+            return 0
+        with lock:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    return 0
+            entries = self._entries()
+            total = sum(size for _, size, _ in entries)
+            if total <= self.max_bytes:
+                return 0
+            removed = 0
+            target = self.max_bytes * EVICT_TARGET
+            for _, size, path in sorted(entries):
+                if total <= target:
+                    break
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+                except OSError:
+                    continue
+                total -= size
+                removed += 1
+            return removed
+
+    def size(self) -> Tuple[int, int]:
+        """(entries, bytes) currently on disk."""
+        entries = self._entries()
+        return len(entries), sum(size for _, size, _ in entries)
+
+    def clear(self) -> None:
+        for _, _, path in self._entries():
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+"""
+OCR engines
+
+An OCR engine turns a PIL image into Tesseract's word table (the layout of
+pytesseract.image_to_data(..., output_type=Output.DICT)). Two engines:
+
+- "capi":        libtesseract through its C API (ctypes, no extra package).
+                 The engine is initialised once per language and config and
+                 then reused, so the traineddata is loaded once per process.
+                 Pixels go in as an in-memory buffer, no temp files.
+- "pytesseract": runs the tesseract binary per call (fallback, always works
+                 when the command-line tool is installed).
+
+get_engine("auto") picks the C API when libtesseract can be loaded.
+Engines are cached per process, so every pool worker keeps its own.
+
+words_from_data() and text_from_words() turn the word table into word
+boxes and plain text (same separators as image_to_string), so one
+recognition pass gives text, confidences and boxes.
+
+PageOCR is the OCR step of the PDF writer (searchable PDF): it runs in the
+encoder processes on the page image they have already decoded and returns
+word boxes in that image's pixels.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import shlex
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from PIL import Image
+
+from ocr_cache import OCRCache
+
+
+DEFAULT_CONFIG = '--oem 3 --psm 6'
+# Pages below this resolution are upscaled 2x before OCR (screen captures are 72-144 DPI)
+UPSCALE_BELOW_DPI = 150
+# Resolution assumed for images that do not record one (screen)
+SCREEN_DPI = 72.0
+
+DATA_COLUMNS = ("level", "page_num", "block_num", "par_num", "line_num", "word_num",
+                "left", "top", "width", "height", "conf", "text")
+
+_LIBRARY_CANDIDATES = ("libtesseract.so.5", "libtesseract.so.4",
+                       "/opt/homebrew/lib/libtesseract.dylib", "/usr/local/lib/libtesseract.dylib")
+
+
+# ---------------------- Word table ----------------------
+def words_from_data(data: dict) -> List[dict]:
+    """Words of a word table: text, confidence and box (image pixels)."""
+    words = []
+    for i, text in enumerate(data['text']):
+        # Level 5 = word; page, block, paragraph and line rows carry no text
+        if int(data['level'][i]) != 5 or not str(text).strip():
+            continue
+        words.append({
+            'text': str(text),
+            'conf': float(data['conf'][i]),
+            'left': int(data['left'][i]),
+            'top': int(data['top'][i]),
+            'width': int(data['width'][i]),
+            'height': int(data['height'][i]),
+            'block': (int(data['page_num'][i]), int(data['block_num'][i]), int(data['par_num'][i])),
+            'line': int(data['line_num'][i]),
+        })
+    return words
+
+
+def text_from_words(words: List[dict]) -> str:
+    """Plain text laid out like image_to_string (after strip()).
+
+    Words of a line are joined by spaces, lines by newlines, paragraphs and
+    blocks by an empty line.
+    """
+    paragraphs: List[List[List[str]]] = []
+    current_block = current_line = None
+    for word in words:
+        if word['block'] != current_block:
+            paragraphs.append([])
+            current_block, current_line = word['block'], None
+        if word['line'] != current_line:
+            paragraphs[-1].append([])
+            current_line = word['line']
+        paragraphs[-1][-1].append(word['text'])
+    return "\n\n".join("\n".join(" ".join(line) for line in paragraph) for paragraph in paragraphs)
+
+
+def parse_tsv(tsv: str) -> dict:
+    """Tesseract TSV rows (with or without the header line) as a word table."""
+    data: Dict[str, list] = {column: [] for column in DATA_COLUMNS}
+    for row in tsv.splitlines():
+        cells = row.split("\t")
+        if len(cells) < len(DATA_COLUMNS) - 1 or cells[0] == "level":
+            continue
+        cells += [""] * (len(DATA_COLUMNS) - len(cells))  # rows without text end after conf
+        for column, cell in zip(DATA_COLUMNS, cells):
+            if column == "text":
+                data[column].append(cell)
+            elif column == "conf":
+                data[column].append(float(cell))
+            else:
+                data[column].append(int(cell))
+    return data
+
+
+def parse_config(config: str) -> Tuple[Optional[int], Optional[int], Dict[str, str], Optional[int]]:
+    """(oem, psm, variables, dpi) from a tesseract command-line config string."""
+    oem = psm = dpi = None
+    variables: Dict[str, str] = {}
+    tokens = shlex.split(config or "")
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        value = tokens[i + 1] if i + 1 < len(tokens) else None
+        if token in ("--oem", "--psm", "--dpi") and value is not None:
+            if token == "--oem":
+                oem = int(value)
+            elif token == "--psm":
+                psm = int(value)
+            else:
+                dpi = int(value)
+            i += 2
+        elif token == "-c" and value is not None and "=" in value:
+            name, _, setting = value.partition("=")
+            variables[name] = setting
+            i += 2
+        else:
+            raise ValueError(f"unsupported tesseract option {token!r}")
+    return oem, psm, variables, dpi
+
+
+# ---------------------- Engines ----------------------
+class OCREngine:
+    """Base class: image_to_data() returns the word table of one image."""
+
+    name = ""
+    version = ""
+
+    def image_to_data(self, img: Image.Image) -> dict:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class PyTesseractEngine(OCREngine):
+    """One tesseract process per call (pytesseract)."""
+
+    name = "pytesseract"
+
+    def __init__(self, language: str = "eng", config: str = DEFAULT_CONFIG):
+        import pytesseract
+        self._pytesseract = pytesseract
+        self.version = str(pytesseract.get_tesseract_version())
+        self.language = language
+        self.config = config
+
+    def image_to_data(self, img: Image.Image) -> dict:
+        return self._pytesseract.image_to_data(img, lang=self.language, config=self.config,
+                                               output_type=self._pytesseract.Output.DICT)
+
+
+def _load_libtesseract() -> ctypes.CDLL:
+    names = [ctypes.util.find_library("tesseract")] + list(_LIBRARY_CANDIDATES)
+    last_error: Optional[Exception] = None
+    for name in names:
+        if not name:
+            continue
+        try:
+            return ctypes.CDLL(name)
+        except OSError as e:
+            last_error = e
+    raise OSError(f"libtesseract not found ({last_error})")
+
+
+class CAPIEngine(OCREngine):
+    """libtesseract's TessBaseAPI, initialised once and reused for every image."""
+
+    name = "capi"
+
+    def __init__(self, language: str = "eng", config: str = DEFAULT_CONFIG):
+        oem, psm, variables, dpi = parse_config(config)
+        lib = _load_libtesseract()
+        lib.TessVersion.restype = ctypes.c_char_p
+        lib.TessBaseAPICreate.restype = ctypes.c_void_p
+        lib.TessBaseAPIInit2.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_char_p, ctypes.c_int]
+        lib.TessBaseAPISetPageSegMode.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        lib.TessBaseAPISetVariable.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_char_p]
+        lib.TessBaseAPISetImage.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_int, ctypes.c_int,
+                                            ctypes.c_int, ctypes.c_int]
+        lib.TessBaseAPISetSourceResolution.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        lib.TessBaseAPIRecognize.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
+        # char* that must go back through TessDeleteText: keep it as a raw pointer
+        lib.TessBaseAPIGetTsvText.restype = ctypes.c_void_p
+        lib.TessBaseAPIGetTsvText.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        lib.TessDeleteText.argtypes = [ctypes.c_void_p]
+        lib.TessBaseAPIClear.argtypes = [ctypes.c_void_p]
+        lib.TessBaseAPIEnd.argtypes = [ctypes.c_void_p]
+        lib.TessBaseAPIDelete.argtypes = [ctypes.c_void_p]
+        self._lib = lib
+        self.version = lib.TessVersion().decode("ascii", "replace")
+        self.language = language
+        self.dpi = dpi
+
+        self._api = lib.TessBaseAPICreate()
+        # OEM_DEFAULT = 3; language data from TESSDATA_PREFIX / the install prefix
+        if lib.TessBaseAPIInit2(self._api, None, language.encode("utf-8"), 3 if oem is None else oem) != 0:
+            self.close()
+            raise OSError(f"tesseract could not load language {language!r}")
+        if psm is not None:
+            lib.TessBaseAPISetPageSegMode(self._api, psm)
+        for name, value in variables.items():
+            if not lib.TessBaseAPISetVariable(self._api, name.encode("utf-8"), value.encode("utf-8")):
+                self.close()
+                raise ValueError(f"unknown tesseract variable {name!r}")
+
+    def image_to_data(self, img: Image.Image) -> dict:
+        if img.mode not in ("L", "RGB"):
+            img = img.convert("RGB" if img.mode in ("RGBA", "P", "CMYK") else "L")
+        pixels = img.tobytes()  # stays referenced until Recognize has finished
+        channels = 1 if img.mode == "L" else 3
+        lib = self._lib
+        lib.TessBaseAPISetImage(self._api, pixels, img.width, img.height, channels, img.width * channels)
+        dpi = self.dpi or (img.info.get("dpi") or (0, 0))[0]
+        if dpi:
+            lib.TessBaseAPISetSourceResolution(self._api, int(round(dpi)))
+        try:
+            if lib.TessBaseAPIRecognize(self._api, None) != 0:
+                raise RuntimeError("tesseract recognition failed")
+            text = lib.TessBaseAPIGetTsvText(self._api, 0)
+            if not text:
+                raise RuntimeError("tesseract returned no layout")
+            try:
+                tsv = ctypes.string_at(text).decode("utf-8", "replace")
+            finally:
+                lib.TessDeleteText(text)
+        finally:
+            lib.TessBaseAPIClear(self._api)  # drop the image and results, keep the language data
+        return parse_tsv(tsv)
+
+    def close(self) -> None:
+        if getattr(self, "_api", None):
+            self._lib.TessBaseAPIEnd(self._api)
+            self._lib.TessBaseAPIDelete(self._api)
+            self._api = None
+
+
+# ---------------------- Registry ----------------------
+ENGINES: Dict[str, Callable[..., OCREngine]] = {
+    "capi": CAPIEngine,
+    "pytesseract": PyTesseractEngine,
+}
+
+ENGINE_CHOICES: List[str] = ["auto"] + list(ENGINES)
+
+_cache: Dict[Tuple[str, str, str], OCREngine] = {}
+
+
+def get_engine(name: str = "auto", language: str = "eng", config: str = DEFAULT_CONFIG) -> OCREngine:
+    """Engine for `language` and `config`, created on first use and kept for the process.
+
+    "auto" tries the C API before pytesseract; an unavailable named engine
+    also falls back to pytesseract.
+    """
+    key = (name, language, config)
+    engine = _cache.get(key)
+    if engine is not None:
+        return engine
+    candidates = list(ENGINES) if name == "auto" else [name, "pytesseract"]
+    errors = []
+    for candidate in dict.fromkeys(candidates):
+        factory = ENGINES.get(candidate)
+        if factory is None:
+            continue
+        try:
+            engine = factory(language, config)
+            break
+        except Exception as e:
+            errors.append(f"{candidate}: {e}")
+    else:
+        raise OSError("no OCR engine available (" + "; ".join(errors) + ")")
+    _cache[key] = engine
+    return engine
+
+
+def ocr_image_data(img: Image.Image, language: str = "eng", config: str = DEFAULT_CONFIG,
+                   engine: str = "auto") -> Tuple[str, float, List[dict]]:
+    """One recognition pass: (text, average word confidence, words with boxes)."""
+    words = words_from_data(get_engine(engine, language, config).image_to_data(img))
+    confidences = [word['conf'] for word in words if word['conf'] > 0]
+    avg_confidence = sum(confidences) / len(confidences) if confidences else 0.0
+    return text_from_words(words), avg_confidence, words
+
+
+def engine_id(engine: str = "auto", language: str = "eng", config: str = DEFAULT_CONFIG) -> str:
+    """Name and version of the engine get_engine() picks, e.g. "capi 5.3.0" (part of OCR cache keys)."""
+    resolved = get_engine(engine, language, config)
+    return f"{resolved.name} {resolved.version}".strip()
+
+
+def probe_engine(engine: str = "auto", language: str = "eng", config: str = DEFAULT_CONFIG) -> str:
+    """engine_id() from a short-lived process; raises OSError when no engine is available.
+
+    Loading libtesseract in the calling process would start OpenMP there,
+    and worker processes forked from it would inherit it before their
+    thread limit is set.
+    """
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        return pool.submit(engine_id, engine, language, config).result()
+
+
+class PageOCR:
+    """Picklable OCR step for StreamingPDFWriter(ocr=...): word boxes of a page in image pixels.
+
+    The page is recognised in grayscale, `upscale` times larger (Tesseract
+    reads small screen text much better at ~2x), and the boxes are scaled
+    back to the page image. `upscale=0` decides per page from the DPI the
+    image records (2x below UPSCALE_BELOW_DPI, screen DPI if none).
+    `threads` caps Tesseract's (OpenMP) and OpenCV threads in each encoder
+    process (init_worker, the pool initializer, runs before any engine
+    loads). With `cache`, pages read from files are looked up in the OCR
+    cache first. A page Tesseract fails on gets no text layer instead of
+    stopping the document.
+    """
+
+    def __init__(self, language: str = "eng", config: str = DEFAULT_CONFIG, engine: str = "auto",
+                 upscale: int = 0, threads: int = 0, cache: Optional[OCRCache] = None):
+        self.language = language
+        self.config = config
+        self.engine = engine
+        self.upscale = max(0, int(upscale))
+        self.threads = threads
+        self.cache = cache
+
+    def check(self) -> str:
+        """Name and version of the engine that will be used (tried in a child process, see probe_engine)."""
+        return probe_engine(self.engine, self.language, self.config)
+
+    def init_worker(self) -> None:
+        """Pool initializer: limit Tesseract (OpenMP) and OpenCV threads before an engine exists."""
+        if self.threads <= 0:
+            return
+        os.environ['OMP_THREAD_LIMIT'] = str(self.threads)
+        try:
+            import cv2
+            cv2.setNumThreads(self.threads)
+        except ImportError:
+            pass
+
+    def page_upscale(self, img: Image.Image) -> int:
+        if self.upscale:
+            return self.upscale
+        dpi = (img.info.get("dpi") or (SCREEN_DPI, SCREEN_DPI))[0] or SCREEN_DPI
+        return 2 if dpi < UPSCALE_BELOW_DPI else 1
+
+    def __call__(self, img: Image.Image, path: Optional[Path] = None) -> List[dict]:
+        upscale = self.page_upscale(img)
+        key = None
+        if self.cache is not None and path is not None:
+            key = self.cache.key(path, self.language, self.config, {'mode': 'L', 'upscale': upscale},
+                                 engine_id(self.engine, self.language, self.config))
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached[2]
+        gray = img if img.mode == "L" else img.convert("L")
+        if upscale > 1:
+            gray = gray.resize((gray.width * upscale, gray.height * upscale), Image.BICUBIC)
+        try:
+            text, confidence, words = ocr_image_data(gray, self.language, self.config, self.engine)
+        except RuntimeError:
+            return []
+        for word in words:
+            for field in ('left', 'top', 'width', 'height'):
+                word[field] = word[field] / upscale
+        if key is not None:
+            self.cache.put(key, text, confidence, words)
+        return words
@@ -0,0 +1,558 @@
+#!/usr/bin/env python3
+"""
+Linearized PDF output ("fast web view")
+
+linearize_pdf() rewrites a finished PDF so a viewer reading it over a
+network (file share, HTTP range requests) can show the first page before
+the rest has arrived. The first page and everything it uses come right
+after a linearization dictionary and a small first-page cross-reference
+stream, followed by hint tables that tell the viewer where every other
+page starts. Layout as in PDF 1.7 Annex F:
+
+    header, linearization dictionary, first-page xref stream,
+    catalog, hint stream, page 1 and everything it uses,
+    pages 2..N (each followed by the objects only it uses),
+    objects shared by later pages, other objects, main xref stream
+
+The output is PDF 1.5: dictionaries no page needs (page tree, document
+info) go into a compressed object stream and both xref sections are
+streams, so the 20 bytes per object of a classic xref table disappear.
+Page dictionaries stay uncompressed, as linearization requires. Objects
+are copied byte for byte (stream data is never decoded) and renumbered in
+file order.
+
+Usage:
+    python3 pdf_linearize.py input.pdf [-o output.pdf]
+"""
+
+import argparse
+import hashlib
+import os
+import re
+import time
+import zlib
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from pdf_stream import OBJECTS_PER_STREAM, PDFObjects, encode_xref_rows, read_pdf_tail
+
+
+HEADER = b"%PDF-1.5\n%\xe2\xe3\xcf\xd3\n"
+
+# Catalog entries a viewer needs before showing the first page (kept next to the catalog)
+OPEN_DOCUMENT_KEYS = {b"/ViewerPreferences", b"/PageMode", b"/Threads", b"/OpenAction", b"/AcroForm"}
+# Page attributes that may be inherited from the page tree root
+INHERITABLE_KEYS = (b"/Resources", b"/MediaBox", b"/CropBox", b"/Rotate")
+
+_REFERENCE = re.compile(rb"(\d+)\s+(\d+)\s+R\b")
+_INDIRECT_LENGTH = re.compile(rb"/Length\s+\d+\s+\d+\s+R\b")
+_PARENT = re.compile(rb"/Parent\s+\d+\s+\d+\s+R\b")
+_WHITESPACE = b" \t\r\n\f\x00"
+_DELIMITERS = b"()<>[]{}/%"
+
+_OBJ_TAIL = b"\nendobj\n"
+_STREAM_TAIL = b"\nendstream\nendobj\n"
+
+
+# ---------------------- Dictionary parsing ----------------------
+def _skip_space(data: bytes, i: int) -> int:
+    while i < len(data):
+        if data[i] in _WHITESPACE:
+            i += 1
+        elif data[i:i + 1] == b"%":
+            while i < len(data) and data[i] not in b"\r\n":
+                i += 1
+        else:
+            break
+    return i
+
+
+def _value_end(data: bytes, i: int) -> int:
+    """Index just past the PDF object that starts at `i`."""
+    if data.startswith(b"<<", i):
+        i += 2
+        while True:
+            i = _skip_space(data, i)
+            if data.startswith(b">>", i):
+                return i + 2
+            if i >= len(data):
+                raise ValueError("unterminated dictionary")
+            i = _value_end(data, i)
+    first = data[i:i + 1]
+    if first == b"[":
+        i += 1
+        while True:
+            i = _skip_space(data, i)
+            if data[i:i + 1] == b"]":
+                return i + 1
+            if i >= len(data):
+                raise ValueError("unterminated array")
+            i = _value_end(data, i)
+    if first == b"(":
+        depth = 0
+        while i < len(data):
+            c = data[i:i + 1]
+            if c == b"\\":
+                i += 2
+                continue
+            depth += (c == b"(") - (c == b")")
+            i += 1
+            if depth == 0:
+                return i
+        raise ValueError("unterminated string")
+    if first == b"<":
+        return data.index(b">", i) + 1
+    ref = _REFERENCE.match(data, i)
+    if ref is not None:
+        return ref.end()
+    i += 1  # a name's slash, or the first character of a number/keyword
+    while i < len(data) and data[i] not in _WHITESPACE and data[i] not in _DELIMITERS:
+        i += 1
+    return i
+
+
+def _dict_entries(body: bytes) -> Dict[bytes, bytes]:
+    """Top-level /Key -> value text of a dictionary, in order."""
+    i = _skip_space(body, 0)
+    if not body.startswith(b"<<", i):
+        raise ValueError("not a dictionary")
+    entries: Dict[bytes, bytes] = {}
+    i += 2
+    while True:
+        i = _skip_space(body, i)
+        if body.startswith(b">>", i) or i >= len(body):
+            return entries
+        key_end = _value_end(body, i)
+        value_start = _skip_space(body, key_end)
+        value_end = _value_end(body, value_start)
+        entries[body[i:key_end]] = body[value_start:value_end]
+        i = value_end
+
+
+def _make_dict(entries: Dict[bytes, bytes]) -> bytes:
+    return b"<< " + b" ".join(key + b" " + value for key, value in entries.items()) + b" >>"
+
+
+def _refs(data: bytes) -> List[int]:
+    return [int(m.group(1)) for m in _REFERENCE.finditer(data)]
+
+
+# ---------------------- Hint tables ----------------------
+class _BitWriter:
+    """Big-endian bit packer for the hint tables."""
+
+    def __init__(self):
+        self.data = bytearray()
+        self._acc = 0
+        self._bits = 0
+
+    def write(self, value: int, bits: int) -> None:
+        if bits == 0:
+            return
+        self._acc = (self._acc << bits) | value
+        self._bits += bits
+        while self._bits >= 8:
+            self._bits -= 8
+            self.data.append((self._acc >> self._bits) & 0xFF)
+        self._acc &= (1 << self._bits) - 1
+
+    def flush(self) -> None:
+        """Pad to the next byte boundary (each hint table item list starts on one)."""
+        if self._bits:
+            self.write(0, 8 - self._bits)
+
+    def items(self, values: Iterable[int], bits: int) -> None:
+        for value in values:
+            self.write(value, bits)
+        self.flush()
+
+
+# ---------------------- Linearizer ----------------------
+class _Linearizer:
+    """Reads a PDF, sorts its objects into linearization parts and writes the new file."""
+
+    def __init__(self, src):
+        self.src = src
+        tail = read_pdf_tail(src)
+        self.objects = PDFObjects(src, tail.startxref)
+        trailer = _dict_entries(self.objects.trailer)
+        if b"/Encrypt" in trailer:
+            raise ValueError("encrypted PDFs are not supported")
+        self.file_id = trailer.get(b"/ID")
+        self.root_id = tail.root_id
+        self.info_id = tail.info_id
+        self.pages_id = tail.pages_id
+
+        self.bodies: Dict[int, bytes] = {}
+        self.streams: Dict[int, Tuple[int, int]] = {}  # object -> (data offset, length) in the source
+        self.page_ids = _refs(_dict_entries(tail.pages_dict).get(b"/Kids", b"[]"))
+        self._page_set = set(self.page_ids)
+        self._push_down_inherited(tail.pages_dict)
+        for page_id in self.page_ids:
+            if re.search(rb"/Type\s*/Pages\b", self.body(page_id)):
+                raise ValueError("nested page trees are not supported")
+
+        # Who uses each object: pages (by index), other document entries, open-document entries
+        self.page_users: Dict[int, Set[int]] = {}
+        self.other_users: Dict[int, int] = {}
+        self.open_document: Set[int] = set()
+        self.from_pages_key: List[int] = []
+        self.page_objects = [self._walk([page_id], top=page_id) for page_id in self.page_ids]
+        for index, used in enumerate(self.page_objects):
+            for obj_id in used:
+                self.page_users.setdefault(obj_id, set()).add(index)
+        for key, value in trailer.items():
+            if key != b"/Root":
+                for obj_id in self._walk(_refs(value)):
+                    self.other_users[obj_id] = self.other_users.get(obj_id, 0) + 1
+        for key, value in _dict_entries(self.body(self.root_id)).items():
+            reached = self._walk(_refs(value))
+            if key == b"/Pages":
+                self.from_pages_key = reached
+            for obj_id in reached:
+                if key in OPEN_DOCUMENT_KEYS:
+                    self.open_document.add(obj_id)
+                else:
+                    self.other_users[obj_id] = self.other_users.get(obj_id, 0) + 1
+
+    # ---------------------- Source objects ----------------------
+    def body(self, obj_id: int) -> bytes:
+        if obj_id not in self.bodies:
+            body, data_offset, length = self.objects.locate(obj_id)
+            if data_offset is not None:
+                # Lengths become direct, so length objects drop out of the file
+                body = _INDIRECT_LENGTH.sub(b"/Length %d" % length, body)
+                self.streams[obj_id] = (data_offset, length)
+            self.bodies[obj_id] = body
+        return self.bodies[obj_id]
+
+    def _exists(self, obj_id: int) -> bool:
+        return obj_id in self.objects.offsets or obj_id in self.objects.compressed
+
+    def _push_down_inherited(self, pages_dict: bytes) -> None:
+        """Copy attributes the pages inherit from the page tree root into the pages themselves."""
+        root = _dict_entries(pages_dict)
+        inherited = {key: root.pop(key) for key in INHERITABLE_KEYS if key in root}
+        if not inherited:
+            return
+        for page_id in self.page_ids:
+            page = _dict_entries(self.body(page_id))
+            for key, value in inherited.items():
+                page.setdefault(key, value)
+            self.bodies[page_id] = _make_dict(page)
+        self.bodies[self.pages_id] = _make_dict(root)
+
+    def _walk(self, start: List[int], top: Optional[int] = None) -> List[int]:
+        """Objects reachable from `start`, without climbing to /Parent or entering other pages."""
+        page_set = self._page_set
+        reached: List[int] = []
+        visited: Set[int] = set()
+        stack = list(reversed(start))
+        while stack:
+            obj_id = stack.pop()
+            if obj_id in visited or not self._exists(obj_id) or (obj_id in page_set and obj_id != top):
+                continue
+            visited.add(obj_id)
+            reached.append(obj_id)
+            body = self.body(obj_id)
+            if obj_id in page_set:
+                if body.count(b"/Parent") == 1:
+                    body = _PARENT.sub(b"", body)
+                else:  # only the page's own /Parent, not one in a nested dictionary
+                    entries = _dict_entries(body)
+                    entries.pop(b"/Parent", None)
+                    body = b" ".join(entries.values())
+            stack.extend(reversed(_refs(body)))
+        return reached
+
+    # ---------------------- Layout ----------------------
+    def _parts(self) -> Tuple[List[int], List[int], List[List[int]], List[int], List[int]]:
+        """Objects of parts 4 (document), 6 (first page), 7 (per later page), 8 (shared), 9 (other)."""
+        part4 = [self.root_id]
+        first_private: List[int] = []
+        first_shared: List[int] = []
+        private: List[List[int]] = [[] for _ in self.page_ids]
+        part8: List[int] = []
+        other: Set[int] = set()
+        everything = set(self.page_users) | set(self.other_users) | self.open_document
+        for obj_id in sorted(everything - {self.root_id}):
+            pages = self.page_users.get(obj_id, set())
+            others = self.other_users.get(obj_id, 0)
+            if obj_id in self.open_document:
+                part4.append(obj_id)
+            elif 0 in pages:
+                (first_private if len(pages) == 1 and not others else first_shared).append(obj_id)
+            elif len(pages) == 1 and not others:
+                private[next(iter(pages))].append(obj_id)
+            elif len(pages) > 1:
+                part8.append(obj_id)
+            else:
+                other.add(obj_id)
+        part6 = [self.page_ids[0]] + [o for o in first_private + first_shared if o != self.page_ids[0]]
+        part7 = [[page_id] + [o for o in private[i] if o != page_id]
+                 for i, page_id in enumerate(self.page_ids)][1:]
+        # Page tree first, then everything else in number order
+        part9 = [o for o in self.from_pages_key if o in other]
+        part9 += sorted(other - set(part9))
+        return part4, part6, part7, part8, part9
+
+    def write(self, out) -> int:
+        if not self.page_ids:
+            raise ValueError("the PDF has no pages")
+        part4, part6, part7, part8, part9 = self._parts()
+        direct9 = [o for o in part9 if o in self.streams]
+        packed9 = [o for o in part9 if o not in self.streams]
+        groups = [packed9[i:i + OBJECTS_PER_STREAM] for i in range(0, len(packed9), OBJECTS_PER_STREAM)]
+
+        # Main section (numbered first): pages 2..N, shared objects, other objects, main xref
+        new_ids: Dict[int, int] = {}
+        for obj_id in [o for page in part7 for o in page] + part8 + direct9:
+            new_ids[obj_id] = len(new_ids) + 1
+        stream_ids = [len(new_ids) + 1 + i for i in range(len(groups))]
+        main_xref_id = len(new_ids) + len(groups) + 1
+        next_id = main_xref_id + 1
+        for obj_id in packed9:
+            new_ids[obj_id] = next_id
+            next_id += 1
+        # First-page section: linearization dict, first-page xref, document objects, hints, page 1
+        first_id = next_id
+        lin_id, first_xref_id = first_id, first_id + 1
+        next_id = first_xref_id + 1
+        for obj_id in part4:
+            new_ids[obj_id] = next_id
+            next_id += 1
+        hint_id = next_id
+        next_id += 1
+        for obj_id in part6:
+            new_ids[obj_id] = next_id
+            next_id += 1
+        size = next_id
+
+        def renumber(m: "re.Match") -> bytes:
+            new = new_ids.get(int(m.group(1)))
+            return b"%d 0 R" % new if new is not None else b"null"
+
+        def head(obj_id: int) -> bytes:
+            body = _REFERENCE.sub(renumber, self.body(obj_id))
+            if obj_id in self.streams:
+                return b"%d 0 obj\n%s\nstream\n" % (new_ids[obj_id], body)
+            return b"%d 0 obj\n%s" % (new_ids[obj_id], body)
+
+        heads = {obj_id: head(obj_id) for obj_id in new_ids if obj_id not in packed9}
+
+        def length(obj_id: int) -> int:
+            if obj_id in self.streams:
+                return len(heads[obj_id]) + self.streams[obj_id][1] + len(_STREAM_TAIL)
+            return len(heads[obj_id]) + len(_OBJ_TAIL)
+
+        object_streams = []
+        for stream_id, group in zip(stream_ids, groups):
+            header, bodies, position = [], [], 0
+            for obj_id in group:
+                body = _REFERENCE.sub(renumber, self.body(obj_id))
+                header.append(b"%d %d" % (new_ids[obj_id], position))
+                bodies.append(body)
+                position += len(body) + 1
+            header_bytes = b" ".join(header) + b"\n"
+            data = zlib.compress(header_bytes + b"\n".join(bodies) + b"\n", 9)
+            object_streams.append(
+                b"%d 0 obj\n<< /Type /ObjStm /N %d /First %d /Filter /FlateDecode /Length %d >>\nstream\n"
+                % (stream_id, len(group), len(header_bytes), len(data)) + data + _STREAM_TAIL)
+
+        file_id = self.file_id or b"[<%s><%s>]" % ((hashlib.blake2b(
+            b"%d %d %f" % (len(self.bodies), self.objects.offsets.get(self.root_id, 0), time.time()),
+            digest_size=16).hexdigest().encode("ascii"),) * 2)
+        info = b" /Info %d 0 R" % new_ids[self.info_id] if self.info_id in new_ids else b""
+        main_sizes = sum(length(o) for o in new_ids if o not in packed9) + sum(map(len, object_streams))
+        width = 4 if main_sizes + (1 << 20) < (1 << 32) else 8
+        first_rows = size - first_id
+
+        def lin_object(values: Tuple[int, ...]) -> bytes:
+            return (b"%d 0 obj\n<< /Linearized 1 /L %d /H [ %d %d ] /O %d /E %d /N %d /T %d >>" % ((lin_id,) + values)
+                    + _OBJ_TAIL)
+
+        def first_xref_object(prev: int, rows: bytes) -> bytes:
+            return (b"%d 0 obj\n<< /Type /XRef /W [1 %d 2] /Index [%d %d] /Size %d /Root %d 0 R%s /Prev %d /ID %s "
+                    b"/Length %d >>\nstream\n"
+                    % (first_xref_id, width, first_id, first_rows, size, new_ids[self.root_id], info,
+                       prev, file_id, len(rows)) + rows + _STREAM_TAIL)
+
+        big = 10 ** 15
+        lin_size = len(lin_object((big,) * 7)) + 1
+        first_xref_size = len(first_xref_object(big, bytes(first_rows * (3 + width)))) + 1
+
+        # Offsets as if the hint stream were absent (hint tables are written that way)
+        offsets: Dict[int, int] = {}
+        position = len(HEADER) + lin_size + first_xref_size
+        for obj_id in part4:
+            offsets[obj_id] = position
+            position += length(obj_id)
+        hint_offset = position
+        for obj_id in part6 + [o for page in part7 for o in page] + part8 + direct9:
+            offsets[obj_id] = position
+            position += length(obj_id)
+        stream_offsets = []
+        for data in object_streams:
+            stream_offsets.append(position)
+            position += len(data)
+        main_xref_nohint = position
+
+        hints = self._hint_stream(hint_id, part6, part7, part8, new_ids, offsets, length)
+        shift = len(hints)
+        for obj_id in offsets:
+            if offsets[obj_id] >= hint_offset:
+                offsets[obj_id] += shift
+        stream_offsets = [o + shift for o in stream_offsets]
+        main_xref_offset = main_xref_nohint + shift
+        first_page_end = offsets[part6[-1]] + length(part6[-1])
+
+        rows: List[Optional[Tuple[int, int, int]]] = [(0, 0, 65535)] + [None] * (first_id - 1)
+        for obj_id, new in new_ids.items():
+            if new < first_id and obj_id not in packed9:
+                rows[new] = (1, offsets[obj_id], 0)
+        for stream_id, offset, group in zip(stream_ids, stream_offsets, groups):
+            rows[stream_id] = (1, offset, 0)
+            for index, obj_id in enumerate(group):
+                rows[new_ids[obj_id]] = (2, stream_id, index)
+        rows[main_xref_id] = (1, main_xref_offset, 0)
+        main_width = max(1, (max(max(r[1] for r in rows), main_xref_offset).bit_length() + 7) // 8)
+        main_data = encode_xref_rows(rows, main_width)
+        main_xref = (b"%d 0 obj\n<< /Type /XRef /W [1 %d 2] /Size %d /ID %s /Filter /FlateDecode "
+                     b"/DecodeParms << /Columns %d /Predictor 12 >> /Length %d >>\nstream\n"
+                     % (main_xref_id, main_width, first_id, file_id, 3 + main_width, len(main_data))
+                     + main_data + _STREAM_TAIL)
+        first_xref_offset = len(HEADER) + lin_size
+        trailer = b"startxref\n%d\n%%%%EOF\n" % first_xref_offset
+        file_length = main_xref_offset + len(main_xref) + len(trailer)
+
+        first_offsets = [len(HEADER), first_xref_offset] + [offsets[o] for o in part4] + [hint_offset] \
+            + [offsets[o] for o in part6]
+        first_data = b"".join(b"\x01" + off.to_bytes(width, "big") + b"\x00\x00" for off in first_offsets)
+        lin = lin_object((file_length, hint_offset, shift, new_ids[self.page_ids[0]], first_page_end,
+                          len(self.page_ids), main_xref_offset - 1))
+        first_xref = first_xref_object(main_xref_offset, first_data)
+
+        out.write(HEADER)
+        out.write(lin.ljust(lin_size - 1) + b"\n")
+        out.write(first_xref.ljust(first_xref_size - 1) + b"\n")
+        for obj_id in part4:
+            self._copy(out, obj_id, heads[obj_id])
+        out.write(hints)
+        for obj_id in part6 + [o for page in part7 for o in page] + part8 + direct9:
+            self._copy(out, obj_id, heads[obj_id])
+        for data in object_streams:
+            out.write(data)
+        out.write(main_xref)
+        out.write(trailer)
+        if out.tell() != file_length:
+            raise RuntimeError("linearized layout does not add up")
+        return len(self.page_ids)
+
+    def _copy(self, out, obj_id: int, head: bytes) -> None:
+        out.write(head)
+        if obj_id not in self.streams:
+            out.write(_OBJ_TAIL)
+            return
+        offset, remaining = self.streams[obj_id]
+        self.src.seek(offset)
+        while remaining:
+            chunk = self.src.read(min(remaining, 1 << 20))
+            if not chunk:
+                raise ValueError(f"truncated stream in object {obj_id}")
+            out.write(chunk)
+            remaining -= len(chunk)
+        out.write(_STREAM_TAIL)
+
+    def _hint_stream(self, hint_id: int, part6: List[int], part7: List[List[int]], part8: List[int],
+                     new_ids: Dict[int, int], offsets: Dict[int, int], length) -> bytes:
+        """Page offset and shared object hint tables (offsets exclude the hint stream itself)."""
+        shared_index = {obj_id: i for i, obj_id in enumerate(part6 + part8)}
+        page_objects = [part6] + part7
+        nobjects = [len(objs) for objs in page_objects]
+        page_lengths = [sum(length(o) for o in objs) for objs in page_objects]
+        # Page 1 lists no shared objects; later pages list what they use from parts 6 and 8
+        shared_refs = [[]] + [sorted(shared_index[o] for o in used if o in shared_index)
+                              for used in self.page_objects[1:]]
+
+        pages = _BitWriter()
+        min_objects, min_length = min(nobjects), min(page_lengths)
+        objects_bits = (max(nobjects) - min_objects).bit_length()
+        length_bits = (max(page_lengths) - min_length).bit_length()
+        count_bits = max(len(refs) for refs in shared_refs).bit_length()
+        id_bits = len(shared_index).bit_length()
+        pages.write(min_objects, 32)
+        pages.write(offsets[part6[0]], 32)
+        pages.write(objects_bits, 16)
+        pages.write(min_length, 32)
+        pages.write(length_bits, 16)
+        pages.write(0, 32)             # content stream offset (not used, as in Acrobat)
+        pages.write(0, 16)
+        pages.write(min_length, 32)    # content stream length: same as the page length
+        pages.write(length_bits, 16)
+        pages.write(count_bits, 16)
+        pages.write(id_bits, 16)
+        pages.write(0, 16)             # shared object numerator bits
+        pages.write(4, 16)             # ... and denominator
+        pages.items((n - min_objects for n in nobjects), objects_bits)
+        pages.items((n - min_length for n in page_lengths), length_bits)
+        pages.items((len(refs) for refs in shared_refs), count_bits)
+        pages.items((i for refs in shared_refs for i in refs), id_bits)
+        pages.items((n - min_length for n in page_lengths), length_bits)
+
+        shared = _BitWriter()
+        group_lengths = [length(o) for o in part6 + part8]
+        min_group = min(group_lengths)
+        group_bits = (max(group_lengths) - min_group).bit_length()
+        shared.write(new_ids[part8[0]] if part8 else 0, 32)
+        shared.write(offsets[part8[0]] if part8 else 0, 32)
+        shared.write(len(part6), 32)
+        shared.write(len(part6) + len(part8), 32)
+        shared.write(0, 16)            # bits for objects per group: every group is one object
+        shared.write(min_group, 32)
+        shared.write(group_bits, 16)
+        shared.items((n - min_group for n in group_lengths), group_bits)
+        shared.items((0 for _ in group_lengths), 1)  # no MD5 signatures
+
+        data = bytes(pages.data) + bytes(shared.data)
+        return (b"%d 0 obj\n<< /S %d /Length %d >>\nstream\n" % (hint_id, len(pages.data), len(data))
+                + data + _STREAM_TAIL)
+
+
+def linearize_pdf(source, output=None) -> int:
+    """Rewrite `source` as a linearized PDF; returns the page count.
+
+    `output` defaults to `source` itself, which is replaced only once the
+    new file is complete and synced to disk.
+    """
+    source = Path(source)
+    output = Path(output) if output is not None else source
+    tmp = output.with_name(output.name + ".tmp")
+    try:
+        with open(source, 'rb') as src, open(tmp, 'wb') as out:
+            pages = _Linearizer(src).write(out)
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp, output)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    return pages
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Rewrite a PDF for fast web view (linearized, PDF 1.5)")
+    parser.add_argument("input")
+    parser.add_argument("-o", "--output", help="output file (default: replace the input)")
+    args = parser.parse_args()
+    started = time.perf_counter()
+    pages = linearize_pdf(args.input, args.output)
+    output = Path(args.output or args.input)
+    print(f"{output}: {pages} pages, {output.stat().st_size / (1024 * 1024):.1f} MB, linearized "
+          f"in {time.perf_counter() - started:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Sharded PDF output
+
+ShardedPDFWriter spreads one long capture over numbered part files
+(`book_part001.pdf`, `book_part002.pdf`, ...). A part is finished as soon as
+it reaches the page or byte limit: its trailer is written and the file is
+fsynced before the next page goes into a new part, so a crash late in a run
+only loses the part that was still open.
+
+The part boundaries are recorded in `<name>.parts.json` next to the parts,
+rewritten atomically after every finished part:
+
+    {"output": "book.pdf", "complete": true, "pages": 1200,
+     "parts": [{"file": "book_part001.pdf", "first_page": 1, "pages": 500, "bytes": ...}, ...]}
+
+merge_parts() joins the parts into a single PDF without decoding any page
+(objects are copied byte for byte, see StreamingPDFWriter.add_pdf).
+
+Usage:
+    python3 pdf_shards.py book.parts.json [-o book.pdf]
+    python3 pdf_shards.py part1.pdf part2.pdf ... -o book.pdf [--linearize]
+"""
+
+import argparse
+import json
+import os
+import time
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+from PIL import Image
+
+from pdf_linearize import linearize_pdf
+from pdf_stream import EncodedImage, StreamingPDFWriter, encode_page
+
+
+PARTS_SUFFIX = ".parts.json"
+# Writer options that decide how a page is encoded (see encode_page)
+_PAGE_OPTIONS = ("quality", "passthrough", "codec", "dedupe", "ocr")
+
+
+def parts_manifest_path(path) -> Path:
+    """Manifest file for the sharded output `path` (book.pdf -> book.parts.json)."""
+    path = Path(path)
+    return path.with_name(path.stem + PARTS_SUFFIX)
+
+
+def _write_json_atomic(path: Path, data: dict) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=1)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class ShardedPDFWriter:
+    """StreamingPDFWriter front end that rolls over into numbered part files.
+
+    `max_pages` and `max_bytes` (0 = no limit) bound each part; the byte
+    limit is checked after every page, so a part ends on the first page
+    that reaches it. `linearize` rewrites every finished part for fast web
+    view before it is recorded. Other keyword arguments go to every part's
+    writer.
+    """
+
+    def __init__(self, path, max_pages: int = 0, max_bytes: int = 0, linearize: bool = False,
+                 **writer_options):
+        self.path = Path(path)
+        self.max_pages = max(0, max_pages)
+        self.max_bytes = max(0, max_bytes)
+        self.linearize = linearize
+        self.writer_options = writer_options
+        self.manifest_path = parts_manifest_path(self.path)
+        self.parts: List[dict] = []
+        self._pages_done = 0     # pages in finished parts
+        self._shared_done = 0
+        self._writer: Optional[StreamingPDFWriter] = None
+        self._save_manifest(complete=False)
+
+    def __enter__(self) -> "ShardedPDFWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    @property
+    def page_count(self) -> int:
+        return self._pages_done + (self._writer.page_count if self._writer is not None else 0)
+
+    @property
+    def shared_pages(self) -> int:
+        return self._shared_done + (self._writer.shared_pages if self._writer is not None else 0)
+
+    @property
+    def part_paths(self) -> List[Path]:
+        """Finished parts, in page order."""
+        return [self.path.with_name(part["file"]) for part in self.parts]
+
+    # ---------------------- Pages ----------------------
+    def add_image(self, img: Image.Image) -> None:
+        self._current().add_image(img)
+        self._maybe_roll_over()
+
+    def add_file(self, path) -> None:
+        self._current().add_file(path)
+        self._maybe_roll_over()
+
+    def add_encoded(self, enc: EncodedImage) -> None:
+        self._current().add_encoded(enc)
+        self._maybe_roll_over()
+
+    def encode(self, img: Image.Image) -> EncodedImage:
+        """Encode a page with the parts' settings (any thread); add it with add_encoded()."""
+        return encode_page(img, **{name: value for name, value in self.writer_options.items()
+                                   if name in _PAGE_OPTIONS})
+
+    def _current(self) -> StreamingPDFWriter:
+        if self._writer is None:
+            part_path = self.path.with_name(f"{self.path.stem}_part{len(self.parts) + 1:03d}.pdf")
+            options = dict(self.writer_options)
+            options.setdefault("title", f"{self.path.stem} ({len(self.parts) + 1})")
+            self._writer = StreamingPDFWriter(part_path, fsync=True, **options)
+        return self._writer
+
+    def _maybe_roll_over(self) -> None:
+        writer = self._writer
+        if ((self.max_pages and writer.page_count >= self.max_pages)
+                or (self.max_bytes and writer.bytes_written >= self.max_bytes)):
+            self._finish_part()
+
+    def _finish_part(self) -> None:
+        writer, self._writer = self._writer, None
+        writer.close()  # trailer + fsync
+        if self.linearize:
+            linearize_pdf(writer.path)  # synced copy replaces the part atomically
+        self.parts.append({"file": writer.path.name, "first_page": self._pages_done + 1,
+                           "pages": writer.page_count, "bytes": writer.path.stat().st_size})
+        self._pages_done += writer.page_count
+        self._shared_done += writer.shared_pages
+        self._save_manifest(complete=False)
+
+    def _save_manifest(self, complete: bool) -> None:
+        _write_json_atomic(self.manifest_path, {
+            "output": self.path.name, "complete": complete, "pages": self._pages_done,
+            "max_pages": self.max_pages, "max_bytes": self.max_bytes,
+            "updated": time.strftime("%Y-%m-%dT%H:%M:%S"), "parts": self.parts,
+        })
+
+    # ---------------------- Finishing ----------------------
+    def close(self) -> None:
+        """Finish the open part and mark the manifest complete."""
+        if self._writer is not None:
+            if self._writer.page_count:
+                self._finish_part()
+            else:
+                self._writer.abort()
+                self._writer = None
+        self._save_manifest(complete=True)
+
+    def abort(self) -> None:
+        """Drop the part that is still open; finished parts and the manifest stay."""
+        if self._writer is not None:
+            self._writer.abort()
+            self._writer = None
+
+
+def read_parts_manifest(path) -> List[Path]:
+    """Part files listed in a parts manifest, in page order."""
+    path = Path(path)
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    return [path.with_name(part["file"]) for part in data["parts"]]
+
+
+def merge_parts(parts: Sequence, output, title: Optional[str] = None, linearize: bool = False) -> int:
+    """Join PDF files into `output` without re-encoding; returns the page count."""
+    with StreamingPDFWriter(output, title=title) as writer:
+        for part in parts:
+            writer.add_pdf(part)
+    if linearize:
+        linearize_pdf(output)
+    return writer.page_count
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Merge PDF parts into one file without re-encoding")
+    parser.add_argument("inputs", nargs="+", help="a .parts.json manifest or PDF files in order")
+    parser.add_argument("-o", "--output", help="merged PDF (default: the manifest's output name)")
+    parser.add_argument("--linearize", action="store_true", help="write a linearized (fast web view) PDF")
+    args = parser.parse_args()
+
+    if len(args.inputs) == 1 and args.inputs[0].endswith(PARTS_SUFFIX):
+        manifest = Path(args.inputs[0])
+        parts = read_parts_manifest(manifest)
+        output = Path(args.output) if args.output else manifest.with_name(
+            json.loads(manifest.read_text(encoding='utf-8'))["output"])
+    else:
+        if not args.output:
+            parser.error("--output is required when merging PDF files")
+        parts = [Path(p) for p in args.inputs]
+        output = Path(args.output)
+
+    if output.resolve() in {p.resolve() for p in parts}:
+        parser.error("the output must not be one of the inputs")
+    started = time.perf_counter()
+    pages = merge_parts(parts, output, title=output.stem, linearize=args.linearize)
+    size_mb = output.stat().st_size / (1024 * 1024)
+    print(f"{output}: {pages} pages from {len(parts)} parts, {size_mb:.1f} MB "
+          f"in {time.perf_counter() - started:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1207 @@
+#!/usr/bin/env python3
+"""
+Streaming PDF writer
+
+Writes image pages into a PDF one page at a time. Each page is encoded,
+written and released before the next one is opened, so peak memory stays
+flat no matter how many pages the document has.
+
+The page layout mirrors Pillow's PDF plugin (one image XObject per page,
+72 dpi, RGB pages stored as JPEG at quality 95), so the output matches the
+previous `first_image.save(..., append_images=...)` path.
+
+Zero-transcode mode (`passthrough=True`) copies the compressed IDAT data of
+suitable PNG files straight into a FlateDecode image with PNG predictors.
+Interlaced, palette and alpha PNGs are decoded and stored as lossless Flate.
+
+Content-aware mode (`codec="auto"`) classifies each page from its color
+histogram and stores it in the cheapest exact form: bilevel pages as 1-bit
+Flate or CCITT G4 (whichever is smaller), grayscale as 8-bit gray Flate,
+pages with at most 256 colors as an indexed palette, and only photographic
+pages as JPEG.
+
+Identical pages are stored once: every page's pixel data is hashed and
+duplicates (blank separators, repeated title pages, a frame captured twice)
+reference the image XObject of the first copy. Pages added with
+add_image() are hashed before encoding, so duplicates cost no encode time.
+Pages of the same size also share one content stream.
+
+Compact mode (`compact=True`) writes PDF 1.5 with the page dictionaries
+packed into compressed object streams and a compressed cross-reference
+stream instead of the 20-bytes-per-object xref table. PDFObjects reads
+both layouts back (appending, merging, linearizing).
+
+Append mode (`append=True` on an existing file) adds pages as an
+incremental update: new page objects, a rewritten page tree root, and a
+new xref section whose trailer points back (/Prev) at the old one. The
+existing bytes are never touched, so the cost depends only on the pages
+being added.
+
+encode_files_parallel() spreads page encoding over a process pool and hands
+the finished streams back in page order, so a single writer can assemble
+them while the number of pages in flight (and so memory) stays bounded.
+
+Searchable output (`ocr=...`): an OCR callable runs on each page's already
+decoded image in the same worker that encodes it, and its word boxes become
+an invisible text layer (text render mode 3) over the page image. The text
+uses Helvetica (never embedded, so viewers need no font) with uniform
+glyph widths stretched to each word's box, and a ToUnicode map per font so
+search and copy return the recognised characters.
+"""
+
+import hashlib
+import io
+import os
+import re
+import struct
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from PIL import Image, ImageChops, features
+
+
+DEFAULT_QUALITY = 95
+DEFAULT_RESOLUTION = 72.0
+
+CODECS = ("jpeg", "auto")
+
+# Page classes of classify_image()
+BILEVEL = "bilevel"
+GRAY = "gray"
+LOW_COLOR = "low-color"
+PHOTO = "photo"
+MAX_PALETTE_COLORS = 256
+
+# Dictionaries per object stream in compact (PDF 1.5) output
+OBJECTS_PER_STREAM = 100
+
+# Invisible text layer: every character code is this wide (in text space
+# units per font size); Tz then stretches each word to its OCR box
+TEXT_GLYPH_WIDTH = 0.5
+# Codes of a text font left for non-ASCII characters (printable ASCII maps to itself)
+_TEXT_FONT_CODES = [code for code in range(1, 256) if not 0x20 <= code <= 0x7E]
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# PNG color type -> (PDF color space, components) for layouts PDF can read as-is
+_PNG_PASSTHROUGH_TYPES = {0: ("/DeviceGray", 1), 2: ("/DeviceRGB", 3)}
+
+
+class EncodedImage(NamedTuple):
+    """Page image already encoded as a PDF image stream."""
+    width: int
+    height: int
+    data: bytes
+    filter: str
+    color_space: str
+    bits_per_component: int = 8
+    decode_parms: Optional[str] = None
+    digest: Optional[str] = None  # source pixel hash, used to share identical pages
+    words: Optional[list] = None  # OCR word boxes in image pixels (invisible text layer)
+
+
+# OCR step of a page: (decoded image, source file or None) -> word boxes in image pixels.
+# An optional init_worker() method runs once in every encoder process before its first page.
+OCRFunction = Callable[[Image.Image, Optional[Path]], list]
+
+
+def ocr_worker_initializer(ocr: Optional[OCRFunction]) -> Optional[Callable[[], None]]:
+    """Pool initializer of an OCR step (its init_worker method), if it has one."""
+    return getattr(ocr, "init_worker", None) if ocr is not None else None
+
+
+def frame_hash(frame: Image.Image) -> str:
+    """Content hash of a frame's pixel data."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{frame.mode}{frame.size}".encode("ascii"))
+    h.update(frame.tobytes())
+    return h.hexdigest()
+
+
+def encode_image(img: Image.Image, quality: int = DEFAULT_QUALITY) -> EncodedImage:
+    """Encode a PIL image the same way Pillow's PDF plugin does for RGB pages."""
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    buf = io.BytesIO()
+    img.save(buf, format='JPEG', quality=quality, optimize=False)
+    return EncodedImage(img.width, img.height, buf.getvalue(), "DCTDecode", "/DeviceRGB")
+
+
+def encode_image_flate(img: Image.Image) -> EncodedImage:
+    """Encode a PIL image losslessly as raw Flate (gray stays gray)."""
+    if img.mode not in ('L', 'RGB'):
+        img = img.convert('RGB')
+    color_space = "/DeviceGray" if img.mode == 'L' else "/DeviceRGB"
+    return EncodedImage(img.width, img.height, zlib.compress(img.tobytes()), "FlateDecode", color_space)
+
+
+def classify_image(img: Image.Image) -> Tuple[str, Optional[list]]:
+    """Classify a page as BILEVEL, GRAY, LOW_COLOR or PHOTO from its color histogram.
+
+    `img` must be 'L' or 'RGB'. Also returns the (count, color) list for all
+    classes except PHOTO (more than MAX_PALETTE_COLORS colors).
+    """
+    colors = img.getcolors(MAX_PALETTE_COLORS)
+    if colors is None:
+        return PHOTO, None
+    if img.mode == 'L':
+        levels = {color for _, color in colors}
+    elif any(r != g or g != b for _, (r, g, b) in colors):
+        return LOW_COLOR, colors
+    else:
+        levels = {color[0] for _, color in colors}
+    return (BILEVEL if levels <= {0, 255} else GRAY), colors
+
+
+def _encode_ccitt(bw: Image.Image) -> Optional[EncodedImage]:
+    """CCITT G4 stream of a mode '1' image, or None if libtiff split it into strips."""
+    buf = io.BytesIO()
+    bw.save(buf, format='TIFF', compression='group4', strip_size=(bw.width + 7) // 8 * bw.height)
+    buf.seek(0)
+    with Image.open(buf) as tif:
+        offsets = tif.tag_v2.get(273)
+        counts = tif.tag_v2.get(279)
+    if not offsets or len(offsets) != 1:
+        return None
+    data = buf.getvalue()[offsets[0]:offsets[0] + counts[0]]
+    parms = f"<< /K -1 /Columns {bw.width} /Rows {bw.height} /BlackIs1 true >>"
+    return EncodedImage(bw.width, bw.height, data, "CCITTFaxDecode", "/DeviceGray", 1, parms)
+
+
+def encode_image_bilevel(img: Image.Image) -> EncodedImage:
+    """Encode a black-and-white page as 1-bit Flate or CCITT G4, whichever is smaller.
+
+    Screen-rendered text repeats identical glyph bitmaps, which Flate often
+    compresses better than G4; G4 wins on scanned or dithered pages.
+    """
+    bw = img if img.mode == '1' else img.convert('1', dither=Image.Dither.NONE)
+    # Mode '1' rows are packed MSB first with 1 = white, as DeviceGray expects
+    enc = EncodedImage(bw.width, bw.height, zlib.compress(bw.tobytes()), "FlateDecode", "/DeviceGray", 1)
+    if features.check("libtiff"):
+        g4 = _encode_ccitt(bw)
+        if g4 is not None and len(g4.data) < len(enc.data):
+            return g4
+    return enc
+
+
+def encode_image_indexed(img: Image.Image, colors: list) -> EncodedImage:
+    """Encode an RGB page with at most 256 colors losslessly as an indexed image."""
+    indexed = img.quantize(colors=len(colors), method=Image.Quantize.MAXCOVERAGE, dither=Image.Dither.NONE)
+    # With as many palette slots as colors the quantizer is exact; verify, never lose pixels
+    if ImageChops.difference(indexed.convert('RGB'), img).getbbox() is not None:
+        return encode_image_flate(img)
+    palette = bytes(indexed.getpalette())
+    color_space = f"[/Indexed /DeviceRGB {len(palette) // 3 - 1} <{palette.hex()}>]"
+    return EncodedImage(img.width, img.height, zlib.compress(indexed.tobytes()), "FlateDecode", color_space)
+
+
+def encode_image_auto(img: Image.Image, quality: int = DEFAULT_QUALITY) -> EncodedImage:
+    """Pick the storage for a page from its content (see classify_image)."""
+    if img.mode not in ('L', 'RGB'):
+        img = img.convert('RGB')
+    kind, colors = classify_image(img)
+    if kind == BILEVEL:
+        return encode_image_bilevel(img)
+    if kind == GRAY:
+        return encode_image_flate(img if img.mode == 'L' else img.convert('L'))
+    if kind == LOW_COLOR:
+        return encode_image_indexed(img, colors)
+    return encode_image(img, quality)
+
+
+def read_png_passthrough(path) -> Optional[EncodedImage]:
+    """Return the PNG's IDAT data as a Flate image stream without decoding it.
+
+    Returns None when the PNG layout cannot be embedded as-is (interlaced,
+    palette, alpha, transparency key or 16-bit samples).
+    """
+    with open(path, 'rb') as f:
+        if f.read(8) != PNG_SIGNATURE:
+            return None
+        header = None
+        idat = []
+        while True:
+            chunk_head = f.read(8)
+            if len(chunk_head) < 8:
+                return None  # truncated file
+            length, chunk_type = struct.unpack(">I4s", chunk_head)
+            if chunk_type == b"IHDR":
+                width, height, bits, color_type, _, _, interlace = struct.unpack(">IIBBBBB", f.read(13))
+                if interlace or color_type not in _PNG_PASSTHROUGH_TYPES or bits > 8:
+                    return None
+                header = (width, height, bits, color_type)
+            elif chunk_type == b"IDAT":
+                idat.append(f.read(length))
+            elif chunk_type == b"tRNS":
+                return None
+            elif chunk_type == b"IEND":
+                break
+            else:
+                f.seek(length, os.SEEK_CUR)
+            f.seek(4, os.SEEK_CUR)  # CRC
+
+    if header is None or not idat:
+        return None
+    width, height, bits, color_type = header
+    color_space, colors = _PNG_PASSTHROUGH_TYPES[color_type]
+    parms = f"<< /Predictor 15 /Colors {colors} /BitsPerComponent {bits} /Columns {width} >>"
+    data = b"".join(idat)
+    # Same header and IDAT bytes mean the same pixels (no decoding needed)
+    digest = hashlib.blake2b(f"{header}".encode("ascii") + data, digest_size=16).hexdigest()
+    return EncodedImage(width, height, data, "FlateDecode", color_space, bits, parms, digest)
+
+
+def _encode_pixels(img: Image.Image, quality: int, passthrough: bool, codec: str) -> EncodedImage:
+    if passthrough:
+        return encode_image_flate(img)
+    if codec == "auto":
+        return encode_image_auto(img, quality)
+    return encode_image(img, quality)
+
+
+def encode_page(img: Image.Image, quality: int = DEFAULT_QUALITY, passthrough: bool = False,
+                codec: str = "jpeg", dedupe: bool = True, ocr: Optional[OCRFunction] = None) -> EncodedImage:
+    """Encode a decoded page with a writer's settings, ready for add_encoded().
+
+    Carries the frame_hash when deduplicating and the OCR words when `ocr`
+    is set. Touches no writer state, so pages can be encoded on other threads.
+    """
+    digest = frame_hash(img) if dedupe else None
+    words = ocr(img, None) if ocr is not None else None
+    return _encode_pixels(img, quality, passthrough, codec)._replace(digest=digest, words=words)
+
+
+def encode_file(path, quality: int = DEFAULT_QUALITY, passthrough: bool = False,
+                codec: str = "jpeg", ocr: Optional[OCRFunction] = None, dedupe: bool = True) -> EncodedImage:
+    """Open, encode and close one image file.
+
+    With `passthrough` the PNG data is copied without transcoding when the
+    layout allows it; other files fall back to lossless Flate. Otherwise
+    `codec` selects JPEG for every page or content-aware storage ("auto").
+    `ocr` adds the page's word boxes, recognised from the same decoded image.
+    Decoded pages get a frame_hash only with `dedupe`.
+    """
+    if passthrough:
+        enc = read_png_passthrough(path)
+        if enc is not None:
+            if ocr is None:
+                return enc
+            with Image.open(path) as img:  # decoded for OCR only
+                return enc._replace(words=ocr(img, Path(path)))
+    with Image.open(path) as img:
+        digest = frame_hash(img) if dedupe else None
+        enc = _encode_pixels(img, quality, passthrough, codec)
+        words = ocr(img, Path(path)) if ocr is not None else None
+        return enc._replace(digest=digest, words=words)
+
+
+def image_resolution(path, default: float = DEFAULT_RESOLUTION) -> float:
+    """DPI recorded in an image file (PNG pHYs, JPEG JFIF), else `default`. Reads only the header."""
+    with Image.open(path) as img:
+        dpi = img.info.get("dpi")
+    # pHYs stores dots per metre: 144 DPI reads back as 143.9999...
+    return round(float(dpi[0]), 1) if dpi and dpi[0] > 0 else default
+
+
+def encode_files_parallel(paths: Iterable, quality: int = DEFAULT_QUALITY, passthrough: bool = False,
+                          workers: int = 0, max_in_flight: int = 0,
+                          codec: str = "jpeg", ocr: Optional[OCRFunction] = None,
+                          dedupe: bool = True) -> Iterator[EncodedImage]:
+    """Encode files on a process pool and yield the results in input order.
+
+    `workers` <= 0 uses all CPUs; `max_in_flight` <= 0 allows two pages per
+    worker. At most `max_in_flight` encoded pages exist at any time. An OCR
+    step with a worker initializer always runs in a pool, so the calling
+    process never loads the OCR engine.
+    """
+    workers = workers if workers > 0 else (os.cpu_count() or 1)
+    max_in_flight = max_in_flight if max_in_flight > 0 else workers * 2
+    initializer = ocr_worker_initializer(ocr)
+    if workers == 1 and initializer is None:
+        for path in paths:
+            yield encode_file(path, quality, passthrough, codec, ocr, dedupe)
+        return
+
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=initializer)
+    try:
+        pending = deque()
+        path_iter = iter(paths)
+        for path in path_iter:
+            pending.append(pool.submit(encode_file, path, quality, passthrough, codec, ocr, dedupe))
+            if len(pending) >= max_in_flight:
+                break
+        while pending:
+            enc = pending.popleft().result()
+            next_path = next(path_iter, None)
+            if next_path is not None:
+                pending.append(pool.submit(encode_file, next_path, quality, passthrough, codec, ocr, dedupe))
+            yield enc
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+class PDFTail(NamedTuple):
+    """What an incremental update needs to know about an existing PDF."""
+    file_size: int
+    startxref: int
+    size: int                  # trailer /Size: first free object number
+    root_id: int
+    info_id: Optional[int]
+    file_id: Optional[bytes]   # trailer /ID array, carried over unchanged
+    pages_id: int              # page tree root
+    pages_dict: bytes          # its dictionary as written
+    page_count: int
+    xref_stream: bool = False  # newest section is a cross-reference stream (PDF 1.5)
+    info_dict: Optional[bytes] = None  # document information dictionary as written
+
+
+def _trailer_ref(trailer: bytes, key: bytes) -> Optional[int]:
+    m = re.search(rb"/" + key + rb"\s+(\d+)\s+\d+\s+R", trailer)
+    return int(m.group(1)) if m else None
+
+
+def _read_xref_section(fp, xref_offset: int, wanted: Iterable[int]) -> Tuple[Dict[int, Optional[int]], bytes]:
+    """Look up `wanted` objects in one classic xref section.
+
+    Returns {object number: offset, or None if the section marks it free}
+    for the objects the section lists, plus the section's trailer dictionary.
+    Only subsection headers and the wanted entries are read.
+    """
+    fp.seek(xref_offset)
+    if fp.read(4) != b"xref":
+        raise ValueError("not a classic xref table")
+    wanted = set(wanted)
+    found: Dict[int, Optional[int]] = {}
+    while True:
+        line = fp.readline().strip()
+        if not line:
+            continue
+        if line.startswith(b"trailer"):
+            break
+        start, count = (int(v) for v in line.split()[:2])
+        section_start = fp.tell()
+        for obj_id in wanted:
+            if start <= obj_id < start + count:
+                fp.seek(section_start + 20 * (obj_id - start))
+                offset, gen, kind = fp.read(20).split()[:3]
+                if kind == b"n" and int(gen) != 0:
+                    raise ValueError(f"cannot append: object {obj_id} has generation {int(gen)}")
+                found[obj_id] = int(offset) if kind == b"n" else None
+        fp.seek(section_start + 20 * count)
+    rest = line[len(b"trailer"):] + fp.read(4096)
+    return found, rest.split(b"startxref")[0]
+
+
+def _read_object(fp, offset: int) -> bytes:
+    """Body of the object at `offset` (between 'obj' and 'endobj')."""
+    fp.seek(offset)
+    data = b""
+    while b"endobj" not in data:
+        chunk = fp.read(65536)
+        if not chunk:
+            raise ValueError(f"truncated object at offset {offset}")
+        data += chunk
+    return data[data.index(b"obj") + 3:data.index(b"endobj")].strip()
+
+
+_STREAM_START = re.compile(rb">>\s*stream\r?\n")
+_REFERENCE = re.compile(rb"(\d+)\s+(\d+)\s+R\b")
+
+
+def _locate_raw_object(fp, offset: int, resolve_length: Optional[Callable[[int], int]] = None
+                       ) -> Tuple[bytes, Optional[int], int]:
+    """Body (dictionary for streams), stream data offset (None if not a stream) and data length.
+
+    `resolve_length` looks up an indirect /Length by object number.
+    """
+    fp.seek(offset)
+    head = fp.read(4096)
+    while True:
+        start = head.find(b"obj") + 3
+        stream = _STREAM_START.search(head, start) if start > 2 else None
+        end = head.find(b"endobj", start) if start > 2 else -1
+        if stream is not None and (end == -1 or stream.start() < end):
+            break
+        if end != -1:
+            return head[start:end].strip(), None, 0
+        more = fp.read(max(4096, len(head)))
+        if not more:
+            raise ValueError(f"truncated object at offset {offset}")
+        head += more
+    body = head[start:stream.start() + 2].strip()
+    length = re.search(rb"/Length\s+(\d+)(\s+\d+\s+R)?", body)
+    if length is None or (length.group(2) and resolve_length is None):
+        raise ValueError(f"unsupported stream length in object at offset {offset}")
+    size = resolve_length(int(length.group(1))) if length.group(2) else int(length.group(1))
+    return body, offset + stream.end(), size
+
+
+def _read_raw_object(fp, offset: int, resolve_length: Optional[Callable[[int], int]] = None
+                     ) -> Tuple[bytes, Optional[bytes]]:
+    """Dictionary (or body) and raw stream data (None if not a stream) of the object at `offset`."""
+    body, data_offset, size = _locate_raw_object(fp, offset, resolve_length)
+    if data_offset is None:
+        return body, None
+    fp.seek(data_offset)
+    return body, fp.read(size)
+
+
+def _png_unpredict(data: bytes, columns: int) -> bytes:
+    """Undo PNG row filters (predictors 10-15) on 8-bit, one-component rows."""
+    out = bytearray()
+    prev = bytearray(columns)
+    for start in range(0, len(data), columns + 1):
+        kind = data[start]
+        row = bytearray(data[start + 1:start + 1 + columns])
+        for i in range(len(row)):
+            left = row[i - 1] if i else 0
+            if kind == 1:
+                row[i] = (row[i] + left) & 0xFF
+            elif kind == 2:
+                row[i] = (row[i] + prev[i]) & 0xFF
+            elif kind == 3:
+                row[i] = (row[i] + ((left + prev[i]) >> 1)) & 0xFF
+            elif kind == 4:
+                up_left = prev[i - 1] if i else 0
+                p = left + prev[i] - up_left
+                pa, pb, pc = abs(p - left), abs(p - prev[i]), abs(p - up_left)
+                row[i] = (row[i] + (left if pa <= pb and pa <= pc else prev[i] if pb <= pc else up_left)) & 0xFF
+        out += row
+        prev = row
+    return bytes(out)
+
+
+def _decode_stream(body: bytes, data: bytes) -> bytes:
+    """Decoded data of an unfiltered or Flate stream (xref and object streams)."""
+    filters = re.search(rb"/Filter\s*(\[[^\]]*\]|/\w+)", body)
+    if filters is not None:
+        if filters.group(1).strip(b"[] ") != b"/FlateDecode":
+            raise ValueError(f"unsupported stream filter {filters.group(1).decode('ascii', 'replace')}")
+        data = zlib.decompress(data)
+    predictor = re.search(rb"/Predictor\s+(\d+)", body)
+    if predictor is None or int(predictor.group(1)) == 1:
+        return data
+    if int(predictor.group(1)) < 10:
+        raise ValueError("unsupported TIFF predictor")
+    columns = re.search(rb"/Columns\s+(\d+)", body)
+    return _png_unpredict(data, int(columns.group(1)) if columns else 1)
+
+
+def _read_xref_stream(fp, offset: int) -> Tuple[Dict[int, Tuple[int, int, int]], bytes]:
+    """Entries {object: (type, field 2, field 3)} and dictionary of the xref stream at `offset`."""
+    body, data = _read_raw_object(fp, offset)
+    if not re.search(rb"/Type\s*/XRef\b", body):
+        raise ValueError(f"no cross-reference section at offset {offset}")
+    data = _decode_stream(body, data)
+    widths = [int(v) for v in re.search(rb"/W\s*\[([^\]]*)\]", body).group(1).split()]
+    index = re.search(rb"/Index\s*\[([^\]]*)\]", body)
+    ranges = ([int(v) for v in index.group(1).split()] if index
+              else [0, int(re.search(rb"/Size\s+(\d+)", body).group(1))])
+    entries: Dict[int, Tuple[int, int, int]] = {}
+    pos = 0
+    for start, count in zip(ranges[::2], ranges[1::2]):
+        for obj_id in range(start, start + count):
+            fields = []
+            for width in widths:
+                fields.append(int.from_bytes(data[pos:pos + width], "big"))
+                pos += width
+            if widths[0] == 0:
+                fields[0] = 1  # type defaults to "in use"
+            entries[obj_id] = (fields[0], fields[1], fields[2] if len(fields) > 2 else 0)
+    return entries, body
+
+
+def _read_xref_table(fp, offset: int) -> Tuple[Dict[int, Tuple[int, int, int]], bytes]:
+    """Entries and trailer dictionary of the classic xref section at `offset`."""
+    fp.seek(offset + 4)  # past "xref"
+    entries: Dict[int, Tuple[int, int, int]] = {}
+    while True:
+        line = fp.readline().strip()
+        if not line:
+            continue
+        if line.startswith(b"trailer"):
+            break
+        start, count = (int(v) for v in line.split()[:2])
+        table = fp.read(20 * count)
+        for i in range(count):
+            entry_offset, gen, kind = table[20 * i:20 * i + 20].split()[:3]
+            entries[start + i] = (1 if kind == b"n" else 0, int(entry_offset), int(gen))
+    trailer = (line[len(b"trailer"):] + fp.read(4096)).split(b"startxref")[0]
+    hybrid = re.search(rb"/XRefStm\s+(\d+)", trailer)
+    if hybrid is not None:
+        # Hybrid file: objects hidden from PDF 1.4 readers are listed in an xref stream
+        for obj_id, entry in _read_xref_stream(fp, int(hybrid.group(1)))[0].items():
+            if entries.get(obj_id, (0,))[0] == 0:
+                entries[obj_id] = entry
+    return entries, trailer
+
+
+def _read_xref_chain(fp, startxref: int) -> Tuple[Dict[int, int], Dict[int, Tuple[int, int]], bytes]:
+    """All objects in use, merged over the whole /Prev chain (newest section wins).
+
+    Returns {object: offset}, {object: (object stream, index)} for objects
+    stored inside object streams, and the newest trailer dictionary.
+    """
+    offsets: Dict[int, int] = {}
+    compressed: Dict[int, Tuple[int, int]] = {}
+    seen = set()
+    newest: Optional[bytes] = None
+    xref_offset: Optional[int] = startxref
+    visited = set()
+    while xref_offset is not None and xref_offset not in visited:
+        visited.add(xref_offset)
+        fp.seek(xref_offset)
+        if fp.read(4) == b"xref":
+            entries, trailer = _read_xref_table(fp, xref_offset)
+        else:
+            entries, trailer = _read_xref_stream(fp, xref_offset)
+        for obj_id, (kind, field2, field3) in entries.items():
+            if obj_id in seen:
+                continue
+            seen.add(obj_id)
+            if kind == 1 and obj_id:
+                offsets[obj_id] = field2
+            elif kind == 2:
+                compressed[obj_id] = (field2, field3)
+        if newest is None:
+            newest = trailer
+        prev = re.search(rb"/Prev\s+(\d+)", trailer)
+        xref_offset = int(prev.group(1)) if prev else None
+    return offsets, compressed, newest
+
+
+class PDFObjects:
+    """Random access to the objects of an existing PDF.
+
+    Reads classic xref tables, cross-reference streams and objects packed
+    into object streams; object streams are decoded once and kept.
+    """
+
+    def __init__(self, fp, startxref: int):
+        self.fp = fp
+        self.offsets, self.compressed, self.trailer = _read_xref_chain(fp, startxref)
+        self._object_streams: Dict[int, Dict[int, bytes]] = {}
+
+    def ids(self) -> List[int]:
+        return sorted(set(self.offsets) | set(self.compressed))
+
+    def get(self, obj_id: int) -> Tuple[bytes, Optional[bytes]]:
+        """Body (dictionary for streams) and raw stream data (None if not a stream) of an object."""
+        if obj_id in self.compressed:
+            stream_id = self.compressed[obj_id][0]
+            if stream_id not in self._object_streams:
+                self._object_streams[stream_id] = self._load_object_stream(stream_id)
+            return self._object_streams[stream_id][obj_id], None
+        body, data_offset, size = self.locate(obj_id)
+        if data_offset is None:
+            return body, None
+        self.fp.seek(data_offset)
+        return body, self.fp.read(size)
+
+    def locate(self, obj_id: int) -> Tuple[bytes, Optional[int], int]:
+        """Like get(), but returns where the stream data is instead of reading it.
+
+        Gives (body, data offset, data length); the offset is None for
+        objects that are not streams.
+        """
+        if obj_id in self.compressed:
+            return self.get(obj_id)[0], None, 0
+        if obj_id not in self.offsets:
+            raise ValueError(f"object {obj_id} not found")
+        return _locate_raw_object(self.fp, self.offsets[obj_id], lambda length_id: int(self.get(length_id)[0]))
+
+    def _load_object_stream(self, stream_id: int) -> Dict[int, bytes]:
+        body, data = self.get(stream_id)
+        data = _decode_stream(body, data)
+        count = int(re.search(rb"/N\s+(\d+)", body).group(1))
+        first = int(re.search(rb"/First\s+(\d+)", body).group(1))
+        header = [int(v) for v in data[:first].split()[:2 * count]]
+        numbers, starts = header[0::2], header[1::2]
+        ends = starts[1:] + [len(data) - first]
+        return {num: data[first + a:first + b].strip() for num, a, b in zip(numbers, starts, ends)}
+
+
+def read_pdf_tail(fp) -> PDFTail:
+    """Read the trailer chain and page tree root of a PDF."""
+    fp.seek(0, os.SEEK_END)
+    file_size = fp.tell()
+    fp.seek(max(0, file_size - 2048))
+    tail = fp.read()
+    m = re.search(rb"startxref\s+(\d+)\s+%%EOF", tail[tail.rfind(b"startxref"):])
+    if m is None:
+        raise ValueError("not a complete PDF (no startxref)")
+    startxref = int(m.group(1))
+
+    fp.seek(startxref)
+    xref_stream = fp.read(4) != b"xref"
+    trailer = b"" if xref_stream else _read_xref_section(fp, startxref, ())[1]
+    if xref_stream or b"/XRefStm" in trailer:
+        # Cross-reference streams are compressed: read the whole chain once
+        objects = PDFObjects(fp, startxref)
+        trailer = objects.trailer
+
+        def find(obj_id: int) -> bytes:
+            return objects.get(obj_id)[0]
+    else:
+        def find(obj_id: int) -> bytes:
+            # Newest section first, following /Prev back to the original table
+            xref_offset = startxref
+            while True:
+                found, section_trailer = _read_xref_section(fp, xref_offset, (obj_id,))
+                if obj_id in found:
+                    if found[obj_id] is None:
+                        break
+                    return _read_object(fp, found[obj_id])
+                prev = re.search(rb"/Prev\s+(\d+)", section_trailer)
+                if prev is None:
+                    break
+                xref_offset = int(prev.group(1))
+            raise ValueError(f"object {obj_id} not found")
+
+    size = int(re.search(rb"/Size\s+(\d+)", trailer).group(1))
+    root_id = _trailer_ref(trailer, b"Root")
+    file_id = re.search(rb"/ID\s*(\[[^\]]*\])", trailer)
+    pages_id = _trailer_ref(find(root_id), b"Pages")
+    pages_dict = find(pages_id)
+    count = re.search(rb"/Count\s+(\d+)", pages_dict)
+    if pages_id is None or count is None or not re.search(rb"/Kids\s*\[", pages_dict):
+        raise ValueError("cannot append: unsupported page tree")
+    info_id = _trailer_ref(trailer, b"Info")
+    try:
+        info_dict = find(info_id) if info_id is not None else None
+    except ValueError:
+        info_dict = None
+    if info_dict is not None and not info_dict.rstrip().endswith(b">>"):
+        info_dict = None  # missing or not a plain dictionary: written anew on append
+    return PDFTail(file_size, startxref, size, root_id, info_id,
+                   file_id.group(1) if file_id else None, pages_id, pages_dict, int(count.group(1)),
+                   xref_stream, info_dict)
+
+
+def encode_xref_rows(rows: Iterable[Tuple[int, int, int]], width: int) -> bytes:
+    """Compressed cross-reference stream data for /W [1 width 2] with the PNG Up predictor."""
+    out = bytearray()
+    prev = bytes(3 + width)
+    for kind, field2, field3 in rows:
+        row = bytes((kind,)) + field2.to_bytes(width, "big") + field3.to_bytes(2, "big")
+        out.append(2)
+        out += bytes((a - b) & 0xFF for a, b in zip(row, prev))
+        prev = row
+    return zlib.compress(bytes(out), 9)
+
+
+def _fmt(value: float) -> str:
+    return f"{value:.4f}".rstrip("0").rstrip(".")
+
+
+def _text_string(text: str) -> bytes:
+    # UTF-16BE with BOM as a hex string: safe for any title characters
+    return b"<" + ("\ufeff" + text).encode("utf_16_be").hex().upper().encode("ascii") + b">"
+
+
+def _to_unicode_cmap(mapping: Dict[str, int]) -> bytes:
+    """ToUnicode CMap of a text layer font: printable ASCII plus the allocated codes."""
+    lines = ["/CIDInit /ProcSet findresource begin", "12 dict begin", "begincmap",
+             "/CIDSystemInfo << /Registry (Adobe) /Ordering (UCS) /Supplement 0 >> def",
+             "/CMapName /Adobe-Identity-UCS def", "/CMapType 2 def",
+             "1 begincodespacerange", "<00> <FF>", "endcodespacerange",
+             "1 beginbfrange", "<20> <7E> <0020>", "endbfrange"]
+    chars = sorted(mapping.items(), key=lambda item: item[1])
+    for start in range(0, len(chars), 100):  # at most 100 entries per block
+        block = chars[start:start + 100]
+        lines.append(f"{len(block)} beginbfchar")
+        lines.extend(f"<{code:02X}> <{char.encode('utf_16_be').hex().upper()}>" for char, code in block)
+        lines.append("endbfchar")
+    lines += ["endcmap", "CMapName currentdict /CMap defineresource pop", "end", "end"]
+    return ("\n".join(lines) + "\n").encode("ascii")
+
+
+class _TextFonts:
+    """Single-byte fonts of the invisible text layer.
+
+    Printable ASCII uses its own code in every font; other characters get
+    the next free code of the last font, and a new font is started when it
+    runs out (about 160 distinct non-ASCII characters per font).
+    """
+
+    def __init__(self):
+        self.fonts: List[Tuple[int, Dict[str, int]]] = []  # (object id, character -> code)
+
+    def encode(self, text: str, reserve: Callable[[], int]) -> List[Tuple[int, bytearray]]:
+        """Runs of (font index, codes) that show `text`."""
+        runs: List[Tuple[int, bytearray]] = []
+        if not self.fonts:
+            self.fonts.append((reserve(), {}))
+        for char in text:
+            if 0x20 <= ord(char) <= 0x7E:
+                index = runs[-1][0] if runs else 0
+                code = ord(char)
+            else:
+                index = next((i for i, (_, mapping) in enumerate(self.fonts) if char in mapping), -1)
+                if index < 0:
+                    if len(self.fonts[-1][1]) >= len(_TEXT_FONT_CODES):
+                        self.fonts.append((reserve(), {}))
+                    index = len(self.fonts) - 1
+                    mapping = self.fonts[index][1]
+                    mapping[char] = _TEXT_FONT_CODES[len(mapping)]
+                code = self.fonts[index][1][char]
+            if runs and runs[-1][0] == index:
+                runs[-1][1].append(code)
+            else:
+                runs.append((index, bytearray((code,))))
+        return runs
+
+
+def _procset(color_space: str) -> str:
+    if color_space == "/DeviceGray":
+        return "/ImageB"
+    if color_space.startswith("[/Indexed"):
+        return "/ImageI"
+    return "/ImageC"
+
+
+class StreamingPDFWriter:
+    """Append-only PDF writer that flushes every page as soon as it is added.
+
+    Only object offsets and page references are kept in memory. The page
+    tree, catalog and xref table are written by close(). With `append` an
+    existing file is extended by an incremental update instead of being
+    replaced (a missing file is simply created).
+
+    `compact=True` writes PDF 1.5: dictionaries (pages, page tree, catalog,
+    info) are packed into compressed object streams and the xref table
+    becomes a compressed cross-reference stream. Appending to a file that
+    already uses cross-reference streams always does this.
+
+    `ocr(img, path)` returns a page's word boxes (dicts with text, left,
+    top, width, height, block and line, in image pixels); pages with words
+    get an invisible text layer. Pages can also bring their own words
+    (add_image(words=...), EncodedImage.words).
+    """
+
+    CATALOG_ID = 1
+    PAGES_ID = 2
+
+    def __init__(self, path, quality: int = DEFAULT_QUALITY,
+                 resolution: float = DEFAULT_RESOLUTION, title: Optional[str] = None,
+                 passthrough: bool = False, codec: str = "jpeg", dedupe: bool = True,
+                 append: bool = False, fsync: bool = False, compact: bool = False,
+                 ocr: Optional[OCRFunction] = None):
+        if codec not in CODECS:
+            raise ValueError(f"unknown codec {codec!r} (expected one of {', '.join(CODECS)})")
+        self.path = Path(path)
+        self.quality = quality
+        self.passthrough = passthrough
+        self.codec = codec
+        self.dedupe = dedupe
+        self.fsync = fsync  # make the finished file durable before close() returns
+        self.ocr = ocr
+        self.text_pages = 0  # pages with a text layer
+        self._text_fonts = _TextFonts()
+        self.shared_pages = 0  # pages that reuse an earlier identical image
+        self._images: Dict[str, Tuple[int, int, int, str]] = {}  # digest -> (id, w, h, color space)
+        self._contents: Dict[Tuple[str, str], int] = {}  # page size -> content stream id
+        self.resolution = float(resolution)
+        self.title = self.path.stem if title is None else title
+        self._page_ids: List[int] = []
+        self._base: Optional[PDFTail] = None
+        if append and self.path.exists() and self.path.stat().st_size > 0:
+            self._fp = open(self.path, 'r+b')
+            try:
+                self._base = read_pdf_tail(self._fp)
+            except Exception:
+                self._fp.close()
+                raise
+            # Only objects written by this update get xref entries (plus the free list head)
+            self._offsets: List[Optional[int]] = [0] + [None] * (self._base.size - 1)
+            self._pages_id = self._base.pages_id
+            # An update must use the same kind of xref section as the file it extends
+            self.compact = self._base.xref_stream
+            self._fp.seek(self._base.file_size - 1)
+            if self._fp.read(1) not in (b"\n", b"\r"):
+                self._fp.write(b"\n")
+        else:
+            self._offsets = [0, None, None]  # index = object number; 0 = free list head
+            self._pages_id = self.PAGES_ID
+            self.compact = compact
+            self._fp = open(self.path, 'wb')
+            self._fp.write(b"%PDF-1.5\n" if compact else b"%PDF-1.4\n")
+            self._fp.write(b"%\xe2\xe3\xcf\xd3\n")
+        self._packed: List[Tuple[int, bytes]] = []  # objects waiting for the next object stream
+        self._compressed: Dict[int, Tuple[int, int]] = {}  # object -> (object stream, index)
+
+    # ---------------------- Context manager ----------------------
+    def __enter__(self) -> "StreamingPDFWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    @property
+    def page_count(self) -> int:
+        """Pages added by this writer."""
+        return len(self._page_ids)
+
+    @property
+    def bytes_written(self) -> int:
+        """Current size of the output file."""
+        return self._fp.tell() if not self._fp.closed else self.path.stat().st_size
+
+    @property
+    def base_page_count(self) -> int:
+        """Pages already in the file when appending (0 for a new file)."""
+        return self._base.page_count if self._base is not None else 0
+
+    # ---------------------- Pages ----------------------
+    def add_image(self, img: Image.Image, words: Optional[list] = None) -> None:
+        if words is None and self.ocr is not None:
+            words = self.ocr(img, None)
+        digest = frame_hash(img) if self.dedupe else None
+        if digest is not None and self._add_shared(digest, words):
+            return
+        enc = _encode_pixels(img, self.quality, self.passthrough, self.codec)
+        self.add_encoded(enc._replace(digest=digest, words=words))
+
+    def encode(self, img: Image.Image) -> EncodedImage:
+        """encode_page() with this writer's settings (any thread); add the result with add_encoded()."""
+        return encode_page(img, self.quality, self.passthrough, self.codec, self.dedupe, self.ocr)
+
+    def add_file(self, path) -> None:
+        self.add_encoded(encode_file(path, self.quality, self.passthrough, self.codec, self.ocr, self.dedupe))
+
+    def add_files(self, paths: Iterable, workers: int = 0, max_in_flight: int = 0) -> Iterator[int]:
+        """Encode files on a process pool and add them in order.
+
+        Yields the number of pages written so far after every page.
+        """
+        for enc in encode_files_parallel(paths, self.quality, self.passthrough, workers, max_in_flight,
+                                         self.codec, self.ocr, self.dedupe):
+            self.add_encoded(enc)
+            yield self.page_count
+
+    def add_pdf(self, path) -> int:
+        """Copy every page of another PDF without decoding or re-encoding anything.
+
+        Objects are copied byte for byte with their references renumbered.
+        Supports xref tables and streams, object streams and flat page trees
+        (this writer's and Pillow's output). Returns the number of pages added.
+        """
+        with open(path, 'rb') as src:
+            tail = read_pdf_tail(src)
+            objects = PDFObjects(src, tail.startxref)
+            kids_array = re.search(rb"/Kids\s*\[([^\]]*)\]", tail.pages_dict).group(1)
+            kids = [int(m.group(1)) for m in _REFERENCE.finditer(kids_array)]
+            for kid in kids:
+                if re.search(rb"/Type\s*/Pages\b", objects.get(kid)[0]):
+                    raise ValueError(f"{Path(path).name}: nested page trees are not supported")
+
+            skip = {tail.root_id, tail.pages_id, tail.info_id}
+            copied = []
+            for old in objects.ids():
+                if old in skip:
+                    continue
+                body, data = objects.get(old)
+                if data is not None and re.search(rb"/Type\s*/(ObjStm|XRef)\b", body):
+                    continue  # containers: their objects are copied one by one
+                copied.append(old)
+            new_ids = {old: self._reserve() for old in copied}
+            new_ids[tail.pages_id] = self._pages_id  # pages now hang off this file's page tree
+
+            def renumber(m: "re.Match") -> bytes:
+                old = int(m.group(1))
+                if old not in new_ids:
+                    raise ValueError(f"{Path(path).name}: reference to unknown object {old}")
+                return b"%d 0 R" % new_ids[old]
+
+            for old in copied:
+                body, data = objects.get(old)
+                body = _REFERENCE.sub(renumber, body)
+                if data is None:
+                    self._write_obj(new_ids[old], body)
+                else:
+                    self._offsets[new_ids[old]] = self._fp.tell()
+                    self._fp.write(b"%d 0 obj\n%s\nstream\n" % (new_ids[old], body))
+                    self._fp.write(data)
+                    self._fp.write(b"\nendstream\nendobj\n")
+            self._fp.flush()
+        self._page_ids.extend(new_ids[kid] for kid in kids)
+        return len(kids)
+
+    def reorder_pages(self, order: Sequence[int]) -> None:
+        """Set the final order of this writer's pages before close().
+
+        `order` lists page indices (0-based, in the order the pages were
+        added) as they should appear. Only the page tree changes; the page
+        objects are already on disk.
+        """
+        if sorted(order) != list(range(len(self._page_ids))):
+            raise ValueError("order must be a permutation of the added pages")
+        self._page_ids = [self._page_ids[i] for i in order]
+
+    def add_encoded(self, enc: EncodedImage) -> None:
+        digest = enc.digest if self.dedupe else None
+        if digest is not None and self._add_shared(digest, enc.words):
+            return
+        image_id = self._write_image(enc)
+        if digest is not None:
+            self._images[digest] = (image_id, enc.width, enc.height, enc.color_space)
+        self._add_page(image_id, enc.width, enc.height, enc.color_space, enc.words)
+
+    def _add_shared(self, digest: str, words: Optional[list] = None) -> bool:
+        """Add a page showing an already written identical image, if there is one."""
+        shared = self._images.get(digest)
+        if shared is None:
+            return False
+        self._add_page(*shared, words=words)
+        self.shared_pages += 1
+        return True
+
+    def _add_page(self, image_id: int, width: int, height: int, color_space: str,
+                  words: Optional[list] = None) -> None:
+        page_w = width * 72.0 / self.resolution
+        page_h = height * 72.0 / self.resolution
+        image_draw = b"q %f 0 0 %f 0 0 cm /image Do Q\n" % (page_w, page_h)
+
+        page_id = self._reserve()
+        procset = f"/PDF {_procset(color_space)}"
+        fonts = ""
+        if words:
+            # Text layer: the page gets its own (compressed) content stream
+            layer, used = self._text_layer(words, page_w / width, page_h / height, page_h)
+            procset = f"/PDF /Text {_procset(color_space)}"
+            fonts = " /Font << " + " ".join(f"/F{i} {self._text_fonts.fonts[i][0]} 0 R" for i in used) + " >>"
+            contents_id = self._reserve()
+            self._write_stream(contents_id, "/Filter /FlateDecode", zlib.compress(image_draw + layer, 6))
+            self.text_pages += 1
+        else:
+            # Pages of the same size draw the same content stream: share it
+            size_key = (_fmt(page_w), _fmt(page_h))
+            contents_id = self._contents.get(size_key) if self.dedupe else None
+            if contents_id is None:
+                contents_id = self._reserve()
+                self._write_stream(contents_id, "", image_draw)
+                self._contents[size_key] = contents_id
+        self._write_obj(
+            page_id,
+            (f"<< /Type /Page /Parent {self._pages_id} 0 R "
+             f"/Resources << /ProcSet [{procset}] "
+             f"/XObject << /image {image_id} 0 R >>{fonts} >> "
+             f"/MediaBox [0 0 {_fmt(page_w)} {_fmt(page_h)}] "
+             f"/Contents {contents_id} 0 R >>").encode("ascii")
+        )
+        self._page_ids.append(page_id)
+
+    def _text_layer(self, words: list, scale_x: float, scale_y: float, page_h: float) -> Tuple[bytes, List[int]]:
+        """Invisible text (render mode 3) for OCR word boxes; returns (operators, fonts used).
+
+        Each word is set on the bottom edge of its box at the box height and
+        horizontally scaled (Tz) to the box width, so selecting text
+        highlights the words on the image. Words of a line are followed by
+        a space, so copied text keeps word breaks.
+        """
+        ops = ["BT", "3 Tr"]
+        used: List[int] = []
+        for i, word in enumerate(words):
+            text = str(word['text']).strip()
+            width = word['width'] * scale_x
+            size = word['height'] * scale_y
+            if not text or width <= 0 or size <= 0:
+                continue
+            following = words[i + 1] if i + 1 < len(words) else None
+            scaling = 100.0 * width / (len(text) * TEXT_GLYPH_WIDTH * size)
+            if following is not None and (following['block'], following['line']) == (word['block'], word['line']):
+                text += " "
+            x = word['left'] * scale_x
+            y = page_h - (word['top'] + word['height']) * scale_y
+            ops.append(f"{_fmt(scaling)} Tz 1 0 0 1 {_fmt(x)} {_fmt(y)} Tm")
+            for index, codes in self._text_fonts.encode(text, self._reserve):
+                ops.append(f"/F{index} {_fmt(size)} Tf <{codes.hex()}> Tj")
+                if index not in used:
+                    used.append(index)
+        ops.append("ET")
+        return ("\n".join(ops) + "\n").encode("ascii"), used
+
+    def _write_text_fonts(self) -> None:
+        """Helvetica (not embedded) with uniform widths and a ToUnicode map, one per font."""
+        widths = " ".join([str(int(TEXT_GLYPH_WIDTH * 1000))] * 255)
+        for font_id, mapping in self._text_fonts.fonts:
+            cmap_id = self._reserve()
+            self._write_stream(cmap_id, "/Filter /FlateDecode", zlib.compress(_to_unicode_cmap(mapping), 9))
+            self._write_obj(
+                font_id,
+                (f"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /FirstChar 1 /LastChar 255 "
+                 f"/Widths [{widths}] /ToUnicode {cmap_id} 0 R >>").encode("ascii")
+            )
+
+    def _write_image(self, enc: EncodedImage) -> int:
+        image_id = self._reserve()
+        entries = (f"/Type /XObject /Subtype /Image /Width {enc.width} /Height {enc.height} "
+                   f"/ColorSpace {enc.color_space} /BitsPerComponent {enc.bits_per_component} "
+                   f"/Filter /{enc.filter}")
+        if enc.decode_parms:
+            entries += f" /DecodeParms {enc.decode_parms}"
+        self._write_stream(image_id, entries, enc.data)
+        return image_id
+
+    # ---------------------- Low-level output ----------------------
+    def _reserve(self) -> int:
+        self._offsets.append(None)
+        return len(self._offsets) - 1
+
+    def _write_obj(self, obj_id: int, body: bytes) -> None:
+        if self.compact:
+            self._packed.append((obj_id, body))
+            if len(self._packed) >= OBJECTS_PER_STREAM:
+                self._write_object_stream()
+            return
+        self._offsets[obj_id] = self._fp.tell()
+        self._fp.write(b"%d 0 obj\n" % obj_id + body + b"\nendobj\n")
+
+    def _write_object_stream(self) -> None:
+        if not self._packed:
+            return
+        stream_id = self._reserve()
+        header = []
+        position = 0
+        for index, (obj_id, body) in enumerate(self._packed):
+            header.append(b"%d %d" % (obj_id, position))
+            position += len(body) + 1
+            self._compressed[obj_id] = (stream_id, index)
+        header_bytes = b" ".join(header) + b"\n"
+        data = header_bytes + b"\n".join(body for _, body in self._packed) + b"\n"
+        self._write_stream(stream_id, f"/Type /ObjStm /N {len(self._packed)} /First {len(header_bytes)} "
+                                      f"/Filter /FlateDecode", zlib.compress(data, 9))
+        self._packed = []
+
+    def _write_stream(self, obj_id: int, entries: str, data: bytes) -> None:
+        self._offsets[obj_id] = self._fp.tell()
+        entries = f"{entries} /Length {len(data)}".lstrip()
+        self._fp.write(f"{obj_id} 0 obj\n<< {entries} >>\nstream\n".encode("ascii"))
+        self._fp.write(data)
+        self._fp.write(b"\nendstream\nendobj\n")
+        self._fp.flush()
+
+    def _trailer_entries(self, root_id: int, info_id: Optional[int]) -> bytes:
+        trailer = b"/Size %d /Root %d 0 R" % (len(self._offsets), root_id)
+        if info_id is not None:
+            trailer += b" /Info %d 0 R" % info_id
+        if self._base is not None:
+            trailer += b" /Prev %d" % self._base.startxref
+            if self._base.file_id:
+                trailer += b" /ID " + self._base.file_id
+        return trailer
+
+    def _write_xref_and_trailer(self, root_id: int, info_id: Optional[int]) -> None:
+        if self.compact:
+            self._write_object_stream()
+            self._write_xref_stream(root_id, info_id)
+            return
+        xref_offset = self._fp.tell()
+        lines = [b"xref\n"]
+        ids = [obj_id for obj_id, off in enumerate(self._offsets) if off is not None]
+        run_start = 0
+        for i, obj_id in enumerate(ids):
+            # One subsection per run of consecutive object numbers
+            if i + 1 == len(ids) or ids[i + 1] != obj_id + 1:
+                run = ids[run_start:i + 1]
+                lines.append(b"%d %d\n" % (run[0], len(run)))
+                lines.extend(b"0000000000 65535 f \n" if n == 0 else b"%010d 00000 n \n" % self._offsets[n]
+                             for n in run)
+                run_start = i + 1
+        self._fp.write(b"".join(lines))
+        self._fp.write(b"trailer\n<< %s >>\nstartxref\n%d\n%%%%EOF\n"
+                       % (self._trailer_entries(root_id, info_id), xref_offset))
+
+    def _write_xref_stream(self, root_id: int, info_id: Optional[int]) -> None:
+        xref_id = self._reserve()
+        xref_offset = self._fp.tell()
+        self._offsets[xref_id] = xref_offset
+        entries = {obj_id: (1, off, 0) for obj_id, off in enumerate(self._offsets) if off is not None}
+        entries[0] = (0, 0, 65535)
+        entries.update((obj_id, (2, stream_id, index)) for obj_id, (stream_id, index) in self._compressed.items())
+        ids = sorted(entries)
+        width = max(1, (max(off for _, off, _ in entries.values()).bit_length() + 7) // 8)
+        data = encode_xref_rows([entries[obj_id] for obj_id in ids], width)
+        index = []
+        run_start = 0
+        for i, obj_id in enumerate(ids):
+            if i + 1 == len(ids) or ids[i + 1] != obj_id + 1:
+                index += [ids[run_start], i + 1 - run_start]
+                run_start = i + 1
+        self._write_stream(
+            xref_id,
+            f"/Type /XRef /W [1 {width} 2] /Index [{' '.join(map(str, index))}] "
+            + self._trailer_entries(root_id, info_id).decode("latin-1")
+            + f" /Filter /FlateDecode /DecodeParms << /Columns {3 + width} /Predictor 12 >>",
+            data,
+        )
+        self._fp.write(b"startxref\n%d\n%%%%EOF\n" % xref_offset)
+
+    # ---------------------- Finish ----------------------
+    def close(self) -> None:
+        if self._fp.closed:
+            return
+        kids = " ".join(f"{pid} 0 R" for pid in self._page_ids)
+        self._write_text_fonts()
+        if self._base is not None:
+            # Incremental update: only the page tree root changes among the old objects
+            base = self._base
+            pages = re.sub(rb"/Count\s+\d+", b"/Count %d" % (base.page_count + self.page_count),
+                           base.pages_dict, count=1)
+            pages = re.sub(rb"(/Kids\s*\[[^\]]*)\]", lambda m: m.group(1).rstrip() + b" " + kids.encode("ascii") + b"]",
+                           pages, count=1)
+            self._write_obj(self._pages_id, pages)
+            # The document changed: carry the Info over with a new /ModDate
+            now = time.strftime("%Y%m%d%H%M%SZ", time.gmtime())
+            if base.info_dict is not None:
+                info = re.sub(rb"/ModDate\s*(\((?:\\.|[^\\)])*\)|<[^>]*>)", b"", base.info_dict).rstrip()
+                info = info[:-2].rstrip() + f" /ModDate (D:{now}) >>".encode("ascii")
+            else:
+                info = b"<< /Title " + _text_string(self.title) + f" /ModDate (D:{now}) >>".encode("ascii")
+            info_id = base.info_id if base.info_id is not None else self._reserve()
+            self._write_obj(info_id, info)
+            self._write_xref_and_trailer(base.root_id, info_id)
+            self._finish()
+            return
+
+        self._write_obj(
+            self.PAGES_ID,
+            f"<< /Type /Pages /Count {len(self._page_ids)} /Kids [{kids}] >>".encode("ascii")
+        )
+        self._write_obj(self.CATALOG_ID, f"<< /Type /Catalog /Pages {self.PAGES_ID} 0 R >>".encode("ascii"))
+
+        now = time.strftime("%Y%m%d%H%M%SZ", time.gmtime())
+        info_id = self._reserve()
+        self._write_obj(
+            info_id,
+            b"<< /Title " + _text_string(self.title)
+            + f" /CreationDate (D:{now}) /ModDate (D:{now}) >>".encode("ascii")
+        )
+        self._write_xref_and_trailer(self.CATALOG_ID, info_id)
+        self._finish()
+
+    def _finish(self) -> None:
+        self._fp.flush()
+        if self.fsync:
+            os.fsync(self._fp.fileno())
+        self._fp.close()
+
+    def abort(self) -> None:
+        """Close and remove a partially written file (or cut an unfinished update off)."""
+        if self._base is not None:
+            if not self._fp.closed:
+                self._fp.truncate(self._base.file_size)
+                self._fp.close()
+            return
+        if not self._fp.closed:
+            self._fp.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
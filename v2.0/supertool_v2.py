@@ -22,9 +22,20 @@ from tkinter import filedialog
 from pathlib import Path
 import pyautogui
 import threading
+import multiprocessing
 import time
 import os
-from PIL import Image
+from typing import Optional
+from pdf_stream import CODECS, StreamingPDFWriter, image_resolution, read_pdf_tail
+from pdf_shards import ShardedPDFWriter
+from pdf_linearize import linearize_pdf
+from folder_watch import watch_to_pdf
+from capture_backends import BACKEND_CHOICES, get_backend
+from capture import DPI_CHOICES, AutoCropper, FrameScaler, FrameWriter, PDFFrameSink, run_capture, DEFAULT_SETTLE_TIMEOUT
+from manifest import CaptureManifest, ordered_pages
+from folder_index import PNG_EXTENSIONS, scan_folder
+from ocr_cache import OCRCache
+from ocr_engine import PageOCR
 
 
 DEFAULT_X1 = 880
@@ -194,6 +205,10 @@ class PDFScreenshotToolGUI(ttk.Frame):
         self.var_y2 = tk.StringVar(value=str(DEFAULT_Y2))
         self.var_num_pages = tk.StringVar(value="")
         self.var_output_folder = tk.StringVar(value="")
+        self.var_settle_timeout = tk.StringVar(value=str(DEFAULT_SETTLE_TIMEOUT))
+        self.var_capture_backend = tk.StringVar(value="auto")
+        self.var_output_dpi = tk.StringVar(value="native")
+        self.var_auto_crop = tk.BooleanVar(value=False)
 
     # ---------------------- Screenshots Tab ----------------------
     def _build_tab_screenshots(self, parent: ttk.Frame) -> None:
@@ -238,7 +253,7 @@ class PDFScreenshotToolGUI(ttk.Frame):
 
         row4 = ttk.Frame(process_frame)
         row4.pack(fill=tk.X, padx=4, pady=4)
-        ttk.Label(row4, text="Number of pages:").pack(side=tk.LEFT)
+        ttk.Label(row4, text="Number of pages (blank = until end):").pack(side=tk.LEFT)
         self.entry_num_pages = ttk.Entry(row4, width=10, textvariable=self.var_num_pages)
         self.entry_num_pages.pack(side=tk.LEFT, padx=(8, 12))
 
@@ -248,6 +263,35 @@ class PDFScreenshotToolGUI(ttk.Frame):
         self.entry_output_folder = ttk.Entry(row5, width=32, textvariable=self.var_output_folder)
         self.entry_output_folder.pack(side=tk.LEFT, padx=(8, 12))
 
+        row6 = ttk.Frame(process_frame)
+        row6.pack(fill=tk.X, padx=4, pady=4)
+        ttk.Label(row6, text="Max page wait (s):").pack(side=tk.LEFT)
+        ttk.Entry(row6, width=6, textvariable=self.var_settle_timeout).pack(side=tk.LEFT, padx=(8, 12))
+        ttk.Label(row6, text="Capture backend:").pack(side=tk.LEFT)
+        ttk.Combobox(row6, width=10, state="readonly", values=BACKEND_CHOICES,
+                     textvariable=self.var_capture_backend).pack(side=tk.LEFT, padx=(8, 12))
+        # HiDPI displays: keep native pixels or box-reduce to a lower DPI while capturing
+        ttk.Label(row6, text="Output DPI:").pack(side=tk.LEFT)
+        ttk.Combobox(row6, width=7, state="readonly", values=DPI_CHOICES,
+                     textvariable=self.var_output_dpi).pack(side=tk.LEFT, padx=(8, 12))
+
+        row7 = ttk.Frame(process_frame)
+        row7.pack(fill=tk.X, padx=4, pady=4)
+        self.var_resume = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            row7,
+            text="Resume previous run in this folder (continue after the last saved page)",
+            variable=self.var_resume
+        ).pack(side=tk.LEFT)
+
+        row8 = ttk.Frame(process_frame)
+        row8.pack(fill=tk.X, padx=4, pady=4)
+        ttk.Checkbutton(
+            row8,
+            text="Auto-crop viewer background and page margins",
+            variable=self.var_auto_crop
+        ).pack(side=tk.LEFT)
+
         # Actions
         actions = ttk.Frame(container)
         actions.pack(fill=tk.X, pady=(16, 10))
@@ -293,6 +337,61 @@ class PDFScreenshotToolGUI(ttk.Frame):
         self.entry_pdf_name = ttk.Entry(row2, width=32, textvariable=self.var_pdf_name)
         self.entry_pdf_name.pack(side=tk.LEFT, padx=(8, 8))
 
+        row3 = ttk.Frame(container)
+        row3.pack(fill=tk.X, pady=4)
+        ttk.Label(row3, text="Encoder processes:").pack(side=tk.LEFT)
+        self.var_png_workers = tk.StringVar(value=str(os.cpu_count() or 1))
+        ttk.Entry(row3, width=6, textvariable=self.var_png_workers).pack(side=tk.LEFT, padx=(8, 12))
+        # "auto" stores text pages as 1-bit/gray/palette, only photos as JPEG
+        ttk.Label(row3, text="Page encoding:").pack(side=tk.LEFT)
+        self.var_png_codec = tk.StringVar(value="jpeg")
+        ttk.Combobox(row3, width=8, state="readonly", values=CODECS,
+                     textvariable=self.var_png_codec).pack(side=tk.LEFT, padx=(8, 8))
+
+        # Zero-transcode option: embed PNG data as-is (lossless, I/O-bound)
+        self.var_png_passthrough = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            container,
+            text="Embed PNG data without re-encoding (lossless, faster)",
+            variable=self.var_png_passthrough
+        ).pack(anchor=tk.W, pady=(8, 0))
+
+        # Incremental update: add only the folder's pages beyond those already in the PDF
+        self.var_png_append = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            container,
+            text="Append new pages to an existing PDF of this name",
+            variable=self.var_png_append
+        ).pack(anchor=tk.W, pady=(4, 0))
+
+        self.var_png_fast_web = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            container,
+            text="Fast web view (linearized PDF with object streams)",
+            variable=self.var_png_fast_web
+        ).pack(anchor=tk.W, pady=(4, 0))
+
+        # Searchable PDF: OCR every page in the encoder processes, invisible text over the image
+        row_ocr = ttk.Frame(container)
+        row_ocr.pack(fill=tk.X, pady=(4, 0))
+        self.var_png_ocr = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            row_ocr,
+            text="Searchable PDF (OCR text layer), language:",
+            variable=self.var_png_ocr
+        ).pack(side=tk.LEFT)
+        self.var_png_ocr_lang = tk.StringVar(value="eng")
+        ttk.Entry(row_ocr, width=10, textvariable=self.var_png_ocr_lang).pack(side=tk.LEFT, padx=(8, 0))
+
+        # Watch mode: encode PNGs as they arrive (capture running elsewhere, synced folders)
+        self.var_png_watch = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            container,
+            text="Watch folder: convert PNGs as they arrive, finish on Stop",
+            variable=self.var_png_watch
+        ).pack(anchor=tk.W, pady=(4, 0))
+        self._watch_stop = threading.Event()
+
         actions = ttk.Frame(container)
         actions.pack(fill=tk.X, pady=(8, 6))
         self.btn_create_pdf = ttk.Button(actions, text="Create PDF", command=self._on_create_pdf, style="Primary.TButton")
@@ -300,6 +399,9 @@ class PDFScreenshotToolGUI(ttk.Frame):
         ttk.Label(actions, text="  ").pack(side=tk.LEFT)
         self.btn_open_pdf = ttk.Button(actions, text="Open PDF", command=self._on_open_pdf, state=tk.DISABLED, style="Secondary.TButton")
         self.btn_open_pdf.pack(side=tk.LEFT)
+        ttk.Label(actions, text="  ").pack(side=tk.LEFT)
+        self.btn_stop_watch = ttk.Button(actions, text="Stop", command=self._on_stop_watch, state=tk.DISABLED, style="Secondary.TButton")
+        self.btn_stop_watch.pack(side=tk.LEFT)
 
         bottom = ttk.Frame(container)
         bottom.pack(fill=tk.X, side=tk.BOTTOM, pady=(8, 0))
@@ -347,7 +449,7 @@ class PDFScreenshotToolGUI(ttk.Frame):
 
         row4 = ttk.Frame(process_frame, style="Card.TFrame")
         row4.pack(fill=tk.X, padx=4, pady=4)
-        ttk.Label(row4, text="Number of pages:").pack(side=tk.LEFT)
+        ttk.Label(row4, text="Number of pages (blank = until end):").pack(side=tk.LEFT)
         ttk.Entry(row4, width=10, textvariable=self.var_num_pages).pack(side=tk.LEFT, padx=(8, 12))
 
         row5 = ttk.Frame(process_frame, style="Card.TFrame")
@@ -355,13 +457,59 @@ class PDFScreenshotToolGUI(ttk.Frame):
         ttk.Label(row5, text="Output folder name:").pack(side=tk.LEFT)
         ttk.Entry(row5, width=32, textvariable=self.var_output_folder).pack(side=tk.LEFT, padx=(8, 12))
 
+        row6 = ttk.Frame(process_frame, style="Card.TFrame")
+        row6.pack(fill=tk.X, padx=4, pady=4)
+        ttk.Label(row6, text="Max page wait (s):").pack(side=tk.LEFT)
+        ttk.Entry(row6, width=6, textvariable=self.var_settle_timeout).pack(side=tk.LEFT, padx=(8, 12))
+        ttk.Label(row6, text="Capture backend:").pack(side=tk.LEFT)
+        ttk.Combobox(row6, width=10, state="readonly", values=BACKEND_CHOICES,
+                     textvariable=self.var_capture_backend).pack(side=tk.LEFT, padx=(8, 12))
+        # HiDPI displays: keep native pixels or box-reduce to a lower DPI while capturing
+        ttk.Label(row6, text="Output DPI:").pack(side=tk.LEFT)
+        ttk.Combobox(row6, width=7, state="readonly", values=DPI_CHOICES,
+                     textvariable=self.var_output_dpi).pack(side=tk.LEFT, padx=(8, 12))
+
+        # Optional split into numbered parts (blank = one PDF)
+        self.var_split_pages = tk.StringVar(value="")
+        self.var_split_mb = tk.StringVar(value="")
+        row7 = ttk.Frame(process_frame, style="Card.TFrame")
+        row7.pack(fill=tk.X, padx=4, pady=4)
+        ttk.Label(row7, text="Split PDF every (pages):").pack(side=tk.LEFT)
+        ttk.Entry(row7, width=6, textvariable=self.var_split_pages).pack(side=tk.LEFT, padx=(8, 12))
+        ttk.Label(row7, text="or (MB):").pack(side=tk.LEFT)
+        ttk.Entry(row7, width=6, textvariable=self.var_split_mb).pack(side=tk.LEFT, padx=(8, 12))
+        ttk.Label(row7, text="blank = single PDF", style="Status.TLabel").pack(side=tk.LEFT)
+
+        # Pages are encoded into the PDF on background threads while capture goes on
+        self.var_complete_encoders = tk.StringVar(value=str(os.cpu_count() or 1))
+        row8 = ttk.Frame(process_frame, style="Card.TFrame")
+        row8.pack(fill=tk.X, padx=4, pady=4)
+        ttk.Label(row8, text="Encoder threads:").pack(side=tk.LEFT)
+        ttk.Entry(row8, width=6, textvariable=self.var_complete_encoders).pack(side=tk.LEFT, padx=(8, 12))
+        ttk.Label(row8, text="1 = duplicate pages are not encoded at all", style="Status.TLabel").pack(side=tk.LEFT)
+
         # Delete PNGs option
         self.var_delete_pngs = tk.BooleanVar(value=False)
         ttk.Checkbutton(
             container,
-            text="Delete PNG files after PDF creation",
+            text="PDF only (don't keep PNG copies of the pages)",
             variable=self.var_delete_pngs
-        ).pack(anchor=tk.W, pady=(12, 6))
+        ).pack(anchor=tk.W, pady=(12, 0))
+
+        # Content box is learned on the first pages, then locked for the rest of the run
+        ttk.Checkbutton(
+            container,
+            text="Auto-crop viewer background and page margins",
+            variable=self.var_auto_crop
+        ).pack(anchor=tk.W, pady=(4, 0))
+
+        # Linearized output: first page shows before the whole file is downloaded
+        self.var_fast_web = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            container,
+            text="Fast web view (linearized PDF with object streams)",
+            variable=self.var_fast_web
+        ).pack(anchor=tk.W, pady=(4, 6))
 
         actions = ttk.Frame(container)
         actions.pack(fill=tk.X, pady=(12, 8))
@@ -405,6 +553,67 @@ class PDFScreenshotToolGUI(ttk.Frame):
         except (TypeError, ValueError):
             return 0
 
+    @staticmethod
+    def _safe_float(var: tk.StringVar, default: float) -> float:
+        try:
+            return float(var.get())
+        except (TypeError, ValueError):
+            return default
+
+    def _read_page_limit(self) -> int:
+        """Page count from the shared field: 0 means run until the end is detected.
+
+        Raises ValueError for non-numeric or negative input.
+        """
+        text = (self.var_num_pages.get() or "").strip()
+        if not text:
+            return 0
+        num_pages = int(text)
+        if num_pages < 0:
+            raise ValueError("negative page count")
+        return num_pages
+
+    def _read_split_limits(self) -> tuple:
+        """(max pages, max bytes) per PDF part; (0, 0) means no splitting.
+
+        Raises ValueError for non-numeric or negative input.
+        """
+        pages_text = (self.var_split_pages.get() or "").strip()
+        mb_text = (self.var_split_mb.get() or "").strip()
+        max_pages = int(pages_text) if pages_text else 0
+        max_mb = float(mb_text) if mb_text else 0.0
+        if max_pages < 0 or max_mb < 0:
+            raise ValueError("negative split limit")
+        return max_pages, int(max_mb * 1024 * 1024)
+
+    def _settle_timeout(self) -> float:
+        # Upper bound for the adaptive wait after each page turn
+        return max(0.1, self._safe_float(self.var_settle_timeout, DEFAULT_SETTLE_TIMEOUT))
+
+    def _frame_scaler(self, backend, region) -> FrameScaler:
+        # Display scale is measured with one grab; "native" keeps every device pixel
+        choice = self.var_output_dpi.get()
+        target = 0.0 if choice == "native" else self._safe_float(self.var_output_dpi, 0.0)
+        return FrameScaler(backend.detect_scale(region), target)
+
+    def _auto_cropper(self, manifest: Optional[CaptureManifest] = None,
+                      resume: bool = False) -> Optional[AutoCropper]:
+        # A resumed run reuses the locked box so its frames match the saved pages
+        if not self.var_auto_crop.get():
+            return None
+        saved = manifest.crop if manifest is not None and resume else None
+        on_lock = manifest.crop_locked if manifest is not None else None
+        if saved:
+            return AutoCropper(box=saved["box"], frame_size=saved["frame"], colors=saved["colors"],
+                               on_lock=on_lock)
+        return AutoCropper(on_lock=on_lock)
+
+    @staticmethod
+    def _crop_note(cropper: Optional[AutoCropper]) -> str:
+        if cropper is None or not cropper.pixels_in:
+            return ""
+        return f", auto-crop removed {cropper.saved_fraction:.0%} of the pixels"
+
     def _update_status(self, message: str) -> None:
         self.status_var.set(message)
         self.master.update_idletasks()
@@ -435,7 +644,8 @@ class PDFScreenshotToolGUI(ttk.Frame):
             return "Status: Invalid region (X2>X1 and Y2>Y1 required)"
 
         try:
-            screenshot = pyautogui.screenshot(region=(x, y, width, height))
+            with get_backend(self.var_capture_backend.get()) as backend:
+                screenshot = backend.grab((x, y, width, height))
             desktop = Path.home() / "Desktop"
             out_path = desktop / "test_region.png"
             screenshot.save(str(out_path))
@@ -476,11 +686,18 @@ class PDFScreenshotToolGUI(ttk.Frame):
         if not folder:
             return
         self.var_png_folder.set(folder)
+        # Header-only scan: counts and page sizes without decoding any image
         try:
-            count = len(sorted(Path(folder).glob("*.png")))
-        except Exception:
-            count = 0
-        self.status_var_png.set(f"Status: Found {count} PNG files")
+            images = scan_folder(folder, PNG_EXTENSIONS)
+        except OSError:
+            images = []
+        sizes = {(info.width, info.height) for info in images}
+        if len(sizes) == 1:
+            width, height = sizes.pop()
+            detail = f" ({width}×{height})"
+        else:
+            detail = f" ({len(sizes)} page sizes)" if sizes else ""
+        self.status_var_png.set(f"Status: Found {len(images)} PNG files{detail}")
         # Suggest default PDF name
         folder_name = Path(folder).name
         suggested = f"{folder_name}.pdf"
@@ -497,16 +714,26 @@ class PDFScreenshotToolGUI(ttk.Frame):
         self.btn_open_pdf.configure(state=tk.DISABLED)
         self.progress_png["value"] = 0
         self.status_var_png.set("Status: Preparing...")
+        self._watch_stop.clear()
+        if self.var_png_watch.get():
+            self.btn_stop_watch.configure(state=tk.NORMAL)
         thread = threading.Thread(target=self._do_png_to_pdf, daemon=True)
         thread.start()
 
+    def _on_stop_watch(self) -> None:
+        # The watch loop takes the remaining complete PNGs, then writes the page tree and trailer
+        self._watch_stop.set()
+        self.btn_stop_watch.configure(state=tk.DISABLED)
+        self.status_var_png.set("Status: Stopping, finishing PDF...")
+
     def _on_start_complete(self) -> None:
         # Validate that required inputs exist on Screenshots tab
         try:
             int(self.var_x1.get()); int(self.var_y1.get()); int(self.var_x2.get()); int(self.var_y2.get())
-            int(self.var_num_pages.get())
+            self._read_page_limit()
+            self._read_split_limits()
         except Exception:
-            self.status_var_complete.set("Status: Invalid inputs (check coordinates and page count)")
+            self.status_var_complete.set("Status: Invalid inputs (check coordinates, page count and split size)")
             return
         # Disable controls and start thread
         self.btn_start_complete.configure(state=tk.DISABLED)
@@ -520,6 +747,8 @@ class PDFScreenshotToolGUI(ttk.Frame):
     # ---------------------- Complete Process ----------------------
     def _do_complete_process(self) -> None:
         start_time = time.time()
+        backend = None
+        manifest = None
         try:
             # Read and validate shared inputs from Screenshots tab
             try:
@@ -527,9 +756,11 @@ class PDFScreenshotToolGUI(ttk.Frame):
                 y1 = int(self.var_y1.get())
                 x2 = int(self.var_x2.get())
                 y2 = int(self.var_y2.get())
-                num_pages = int(self.var_num_pages.get())
+                num_pages = self._read_page_limit()
+                max_pages, max_bytes = self._read_split_limits()
+                fast_web = self.var_fast_web.get()
             except (TypeError, ValueError):
-                self.status_var_complete.set("Status: Invalid inputs (coordinates/pages)")
+                self.status_var_complete.set("Status: Invalid inputs (coordinates/pages/split)")
                 return
 
             output_folder_name = (self.var_output_folder.get() or "PDF_Screenshots").strip()
@@ -540,12 +771,11 @@ class PDFScreenshotToolGUI(ttk.Frame):
             # Compute region
             x = x1; y = y1
             width = x2 - x1; height = y2 - y1
-            if width <= 0 or height <= 0 or num_pages <= 0:
+            if width <= 0 or height <= 0:
                 self.status_var_complete.set("Status: Invalid region or page count")
                 return
 
-            # Phase 1: Screenshots (0-50%)
-            self.status_var_complete.set("Status: Phase 1/2: Taking screenshots...")
+            self.status_var_complete.set("Status: Taking screenshots into PDF...")
             self.master.update_idletasks()
 
             pyautogui.FAILSAFE = True
@@ -560,84 +790,88 @@ class PDFScreenshotToolGUI(ttk.Frame):
                 self.master.update_idletasks()
                 time.sleep(1)
 
-            for page in range(1, num_pages + 1):
-                self.status_var_complete.set(f"Status: Processing page {page}/{num_pages}")
-                self.progress_complete["value"] = ((page - 1) / max(1, num_pages)) * 50.0
+            region = (x, y, width, height)
+            backend = get_backend(self.var_capture_backend.get())
+            scaler = self._frame_scaler(backend, region)
+            of_total = f"/{num_pages}" if num_pages else ""
+            keep_pngs = not self.var_delete_pngs.get()
+            if keep_pngs:
+                # Page index for the PNG copies (read by PNG→PDF later)
+                manifest = CaptureManifest(folder_path)
+                manifest.start_run(region, num_pages=num_pages, backend=backend.name)
+            cropper = self._auto_cropper(manifest)
+
+            def save(frame, n: int) -> None:
+                path = folder_path / f"strana_{n:02d}.png"
+                if manifest is not None:
+                    manifest.page_captured(n, path)
+                sink.submit(frame, path)
+
+            def on_page(page: int) -> None:
+                self.status_var_complete.set(f"Status: Capturing page {page}{of_total} into PDF")
+                if num_pages:
+                    self.progress_complete["value"] = ((page - 1) / num_pages) * 98.0
                 self.master.update_idletasks()
 
-                filename = f"strana_{page:02d}.png"
-                out_path = folder_path / filename
-                shot = pyautogui.screenshot(region=(x, y, width, height))
-                shot.save(str(out_path))
-                pyautogui.press('down')
-                time.sleep(0.5)
-
-            self.status_var_complete.set("Status: Phase 1/2: ✅ Screenshots complete")
-            self.master.update_idletasks()
-            time.sleep(1)
-
-            # Phase 2: PNG → PDF (50-100%)
-            self.status_var_complete.set("Status: Phase 2/2: Converting to PDF...")
-            self.master.update_idletasks()
-
-            png_files = sorted(folder_path.glob("*.png"))
-            if not png_files:
-                self.status_var_complete.set("Status: No PNG files found after screenshots")
-                return
-
-            images = []
-            total = len(png_files)
-            for i, png_file in enumerate(png_files):
-                self.progress_complete["value"] = 50.0 + (i / max(1, total)) * 25.0  # 50 → 75
-                self.status_var_complete.set(f"Status: Loading {png_file.name} ({i+1}/{total})")
-                self.master.update_idletasks()
-                img = Image.open(png_file)
-                if img.mode != 'RGB':
-                    img = img.convert('RGB')
-                images.append(img)
-
+            # Frames go straight into the PDF (no PNG write/read/decode round trip);
+            # PDF encoding ("Encoder threads") and the optional PNG copies run on
+            # background threads
+            encoders = self._safe_int(self.var_complete_encoders)
+            encoders = encoders if encoders > 0 else (os.cpu_count() or 1)
             pdf_name = f"{output_folder_name}.pdf"
             pdf_path = folder_path / pdf_name
-            self.status_var_complete.set(f"Status: Creating PDF: {pdf_name}")
-            self.progress_complete["value"] = 90.0
-            self.master.update_idletasks()
-
-            first_image = images[0]
-            other_images = images[1:] if len(images) > 1 else None
-            if other_images:
-                first_image.save(
-                    pdf_path,
-                    format='PDF',
-                    append_images=other_images,
-                    save_all=True,
-                    quality=95,
-                    optimize=False
-                )
+            split = bool(max_pages or max_bytes)
+            if split:
+                # Numbered parts, each closed and synced to disk as soon as it is full
+                writer = ShardedPDFWriter(pdf_path, max_pages=max_pages, max_bytes=max_bytes,
+                                          linearize=fast_web, resolution=scaler.dpi)
             else:
-                first_image.save(pdf_path, format='PDF', quality=95)
-
-            # Optionally delete PNGs
-            deleted = 0
-            if self.var_delete_pngs.get():
-                for f in png_files:
-                    try:
-                        f.unlink()
-                        deleted += 1
-                    except Exception:
-                        pass
+                writer = StreamingPDFWriter(pdf_path, resolution=scaler.dpi)
+            with writer:
+                with PDFFrameSink(writer, archive_pngs=keep_pngs, encoders=encoders,
+                                  on_saved=manifest.page_saved if manifest is not None else None) as sink:
+                    stats = run_capture(
+                        scaler.wrap(lambda: backend.grab(region)),
+                        pyautogui.press,
+                        save,
+                        num_pages=num_pages,
+                        settle_timeout=self._settle_timeout(),
+                        on_page=on_page,
+                        cropper=cropper,
+                    )
+                    self.status_var_complete.set(f"Status: Finishing PDF: {pdf_name}")
+                    self.master.update_idletasks()
+                if writer.page_count == 0:
+                    raise RuntimeError("no pages captured")
+            if fast_web and not split:
+                self.status_var_complete.set(f"Status: Linearizing {pdf_name} for fast web view")
+                self.master.update_idletasks()
+                linearize_pdf(pdf_path)
 
             # Finish
             self.progress_complete["value"] = 100.0
-            size_mb = pdf_path.stat().st_size / (1024 * 1024)
-            if self.var_delete_pngs.get():
-                self.status_var_complete.set(f"Status: ✅ Complete! PDF created, {deleted} PNG files deleted")
+            if split:
+                size_mb = sum(p.stat().st_size for p in writer.part_paths) / (1024 * 1024)
+                created = f"PDF created in {len(writer.parts)} parts"
+                pdf_path = writer.part_paths[0]
             else:
-                self.status_var_complete.set("Status: Process complete! PDF created.")
+                size_mb = pdf_path.stat().st_size / (1024 * 1024)
+                created = "PDF created"
+            shared = f", {writer.shared_pages} duplicate pages shared" if writer.shared_pages else ""
+            shared += self._crop_note(cropper)
+            if keep_pngs:
+                self.status_var_complete.set(f"Status: ✅ Complete! {created} ({stats.pages} pages, {size_mb:.1f} MB{shared}) + PNG copies")
+            else:
+                self.status_var_complete.set(f"Status: ✅ Complete! {created} ({stats.pages} pages, {size_mb:.1f} MB{shared}), no PNG files kept")
             self._last_pdf_path = str(pdf_path)
             self._complete_last_folder = str(folder_path)
         except Exception as e:
             self.status_var_complete.set(f"Status: Error in complete process: {e}")
         finally:
+            if backend is not None:
+                backend.close()
+            if manifest is not None:
+                manifest.close()
             # Re-enable controls and enable open buttons if available
             try:
                 self.btn_start_complete.configure(state=tk.NORMAL)
@@ -663,77 +897,137 @@ class PDFScreenshotToolGUI(ttk.Frame):
             if not pdf_name:
                 self.status_var_png.set("Status: Output PDF name is required")
                 return
+            if self.var_png_watch.get():
+                self._do_png_watch(Path(png_folder_path), pdf_name)
+                return
 
+            # Page order from the capture manifest, else natural sort (strana_9 < strana_10).
+            # The header index validates the pages up front: unreadable files are skipped
+            # instead of failing the encoder halfway through the document.
             folder_path = Path(png_folder_path)
-            png_files = sorted(folder_path.glob("*.png"))
+            index = {info.path.name: info for info in scan_folder(folder_path, PNG_EXTENSIONS)}
+            ordered = ordered_pages(folder_path)
+            png_files = [path for path in ordered if path.name in index]
             if not png_files:
                 self.status_var_png.set("Status: No PNG files found!")
                 return
 
-            self.status_var_png.set(f"Status: Processing {len(png_files)} images...")
-
-            images = []
-            total = len(png_files)
-            for i, png_file in enumerate(png_files):
-                self.progress_png["value"] = (i / max(1, total)) * 50.0
-                self.status_var_png.set(f"Status: Loading {png_file.name} ({i+1}/{total})")
-                self.master.update_idletasks()
-                img = Image.open(png_file)
-                if img.mode != 'RGB':
-                    img = img.convert('RGB')
-                images.append(img)
+            sizes = {(index[path.name].width, index[path.name].height) for path in png_files}
+            detail = "{}×{}".format(*next(iter(sizes))) if len(sizes) == 1 else f"{len(sizes)} page sizes"
+            skipped = len(ordered) - len(png_files)
+            if skipped:
+                detail += f", skipping {skipped} unreadable files"
+            self.status_var_png.set(f"Status: Processing {len(png_files)} images ({detail})...")
 
             # Prepare output path
             if not pdf_name.lower().endswith('.pdf'):
                 pdf_name = f"{pdf_name}.pdf"
             pdf_path = folder_path / pdf_name
 
-            self.status_var_png.set(f"Status: Creating PDF: {pdf_name}")
-            self.progress_png["value"] = 75.0
-            self.master.update_idletasks()
-
-            first_image = images[0]
-            other_images = images[1:] if len(images) > 1 else None
-            if other_images:
-                first_image.save(
-                    pdf_path,
-                    format='PDF',
-                    append_images=other_images,
-                    save_all=True,
-                    quality=95,
-                    optimize=False
-                )
-            else:
-                first_image.save(pdf_path, format='PDF', quality=95)
+            # Encode pages on a process pool, assemble them in order (bounded memory).
+            # Appending keeps the existing PDF bytes and adds only the pages it doesn't have yet.
+            workers = self._safe_int(self.var_png_workers)
+            append = self.var_png_append.get() and pdf_path.exists() and pdf_path.stat().st_size > 0
+            base_pages = 0
+            if append:
+                with open(pdf_path, 'rb') as fp:
+                    base_pages = read_pdf_tail(fp).page_count
+            new_files = png_files[base_pages:]
+            if not new_files:
+                # Leave the PDF untouched (no empty incremental update)
+                self.progress_png["value"] = 100.0
+                self.status_var_png.set(f"Status: Nothing new to append, {pdf_path.name} already has {base_pages} pages")
+                self._last_pdf_path = str(pdf_path)
+                return
+            # Page size follows the DPI the capture recorded in the PNGs (HiDPI frames)
+            resolution = image_resolution(png_files[0])
+            ocr = self._page_ocr(workers)
+            with StreamingPDFWriter(pdf_path, passthrough=self.var_png_passthrough.get(),
+                                    codec=self.var_png_codec.get(), resolution=resolution,
+                                    append=append, ocr=ocr) as writer:
+                total = len(new_files)
+                for done in writer.add_files(new_files, workers=workers):
+                    self.progress_png["value"] = (done / max(1, total)) * 98.0
+                    self.status_var_png.set(f"Status: Added {new_files[done - 1].name} ({done}/{total})")
+                    self.master.update_idletasks()
+            if self.var_png_fast_web.get():
+                # Rewrites the whole file, so appended pages are folded into the linearized layout
+                self.status_var_png.set(f"Status: Linearizing {pdf_path.name} for fast web view")
+                self.master.update_idletasks()
+                linearize_pdf(pdf_path)
 
             # Done
             self.progress_png["value"] = 100.0
             size_mb = pdf_path.stat().st_size / (1024 * 1024)
-            self.status_var_png.set(f"Status: ✅ PDF created! {pdf_path.name} ({size_mb:.1f} MB, {len(images)} pages)")
+            shared = f", {writer.shared_pages} duplicate pages shared" if writer.shared_pages else ""
+            if ocr is not None:
+                shared += f", {writer.text_pages} with text"
+            if writer.base_page_count:
+                pages = writer.base_page_count + writer.page_count
+                self.status_var_png.set(f"Status: ✅ Appended {writer.page_count} pages to {pdf_path.name} "
+                                        f"({size_mb:.1f} MB, {pages} pages{shared})")
+            else:
+                self.status_var_png.set(f"Status: ✅ PDF created! {pdf_path.name} ({size_mb:.1f} MB, {writer.page_count} pages{shared})")
             self._last_pdf_path = str(pdf_path)
         except Exception as e:
             self.status_var_png.set(f"Status: Error creating PDF: {e}")
         finally:
             try:
-                # Close images to free memory
-                for img in locals().get('images', []):
-                    try:
-                        img.close()
-                    except Exception:
-                        pass
                 self.btn_create_pdf.configure(state=tk.NORMAL)
+                self.btn_stop_watch.configure(state=tk.DISABLED)
                 # Enable open button if we have a PDF
                 if self._last_pdf_path and Path(self._last_pdf_path).exists():
                     self.btn_open_pdf.configure(state=tk.NORMAL)
             except Exception:
                 pass
 
+    def _page_ocr(self, workers: int) -> Optional[PageOCR]:
+        """OCR step for a searchable PDF, or None; raises when no OCR engine is available.
+
+        Whether a page is upscaled for OCR follows the DPI recorded in its PNG.
+        """
+        if not self.var_png_ocr.get():
+            return None
+        workers = workers if workers > 0 else (os.cpu_count() or 1)
+        ocr = PageOCR(language=(self.var_png_ocr_lang.get() or "eng").strip(),
+                      threads=max(1, (os.cpu_count() or 1) // workers), cache=OCRCache())
+        self.status_var_png.set(f"Status: OCR engine: {ocr.check()}")
+        return ocr
+
+    def _do_png_watch(self, folder_path: Path, pdf_name: str) -> None:
+        """Watch mode: pages are encoded while the folder fills up; Stop writes the page tree."""
+        if not pdf_name.lower().endswith('.pdf'):
+            pdf_name = f"{pdf_name}.pdf"
+        pdf_path = folder_path / pdf_name
+
+        def on_page(count: int, path: Path) -> None:
+            self.status_var_png.set(f"Status: Watching {folder_path.name}: added {path.name} ({count} pages)")
+            self.master.update_idletasks()
+
+        workers = self._safe_int(self.var_png_workers)
+        ocr = self._page_ocr(workers)
+        self.status_var_png.set(f"Status: Watching {folder_path.name} for PNG files (Stop to finish)")
+        writer = watch_to_pdf(folder_path, pdf_path, self._watch_stop.is_set,
+                              workers=workers, on_page=on_page, ocr=ocr,
+                              passthrough=self.var_png_passthrough.get(), codec=self.var_png_codec.get())
+        if self.var_png_fast_web.get():
+            self.status_var_png.set(f"Status: Linearizing {pdf_path.name} for fast web view")
+            self.master.update_idletasks()
+            linearize_pdf(pdf_path)
+        self.progress_png["value"] = 100.0
+        size_mb = pdf_path.stat().st_size / (1024 * 1024)
+        shared = f", {writer.shared_pages} duplicate pages shared" if writer.shared_pages else ""
+        self.status_var_png.set(f"Status: ✅ PDF created! {pdf_path.name} ({size_mb:.1f} MB, {writer.page_count} pages{shared})")
+        self._last_pdf_path = str(pdf_path)
+
     def _on_open_pdf(self) -> None:
         if self._last_pdf_path and Path(self._last_pdf_path).exists():
             os.system(f'open "{self._last_pdf_path}"')
 
     # ---------------------- Screenshots Processing ----------------------
     def _do_screenshot_pdf(self) -> None:
+        backend = None
+        manifest = None
         try:
             # Safety settings
             pyautogui.FAILSAFE = True
@@ -750,7 +1044,7 @@ class PDFScreenshotToolGUI(ttk.Frame):
                 return
 
             try:
-                num_pages = int(self.var_num_pages.get())
+                num_pages = self._read_page_limit()
             except (TypeError, ValueError):
                 self._update_status("Status: Invalid number of pages")
                 return
@@ -766,7 +1060,7 @@ class PDFScreenshotToolGUI(ttk.Frame):
             width = x2 - x1
             height = y2 - y1
 
-            if width <= 0 or height <= 0 or num_pages <= 0:
+            if width <= 0 or height <= 0:
                 self._update_status("Status: Invalid inputs (check coordinates and page count)")
                 return
 
@@ -775,42 +1069,74 @@ class PDFScreenshotToolGUI(ttk.Frame):
             folder_path = desktop_path / output_folder_name
             folder_path.mkdir(exist_ok=True)
 
+            # Resume: continue after the last page the manifest records as saved
+            region = (x, y, width, height)
+            manifest = CaptureManifest(folder_path)
+            done_pages = manifest.last_good_page() if self.var_resume.get() else 0
+            if done_pages:
+                region = manifest.region or region  # keep the page size of the earlier run
+                if num_pages and done_pages >= num_pages:
+                    self._update_progress(100.0)
+                    self._update_status(f"Status: All {num_pages} pages already saved in {output_folder_name}")
+                    return
+
             # Countdown
             for i in range(5, 0, -1):
                 if self._cancel_requested:
                     self._update_status("Status: Cancelled before start")
                     self._update_progress(0)
                     return
-                self._update_status(f"Starting in {i}...")
+                resuming = f" (resuming after page {done_pages})" if done_pages else ""
+                self._update_status(f"Starting in {i}...{resuming}")
                 time.sleep(1)
 
-            # Main loop
-            for page in range(1, num_pages + 1):
-                if self._cancel_requested:
-                    self._update_status("Status: Cancelled")
-                    break
-
-                self._update_status(f"Processing page {page}/{num_pages}")
-                progress_value = (page - 1) / max(1, num_pages) * 100.0
-                self._update_progress(progress_value)
-
-                filename = f"strana_{page:02d}.png"
-                out_path = folder_path / filename
-
-                # Take screenshot
-                shot = pyautogui.screenshot(region=(x, y, width, height))
-                shot.save(str(out_path))
-
-                # Next page
-                pyautogui.press('down')
-                time.sleep(0.5)
+            # Main loop: capture here, PNG encoding on background threads
+            backend = get_backend(self.var_capture_backend.get())
+            manifest.start_run(region, num_pages=num_pages, resume_from=done_pages, backend=backend.name)
+            scaler = self._frame_scaler(backend, region)
+            cropper = self._auto_cropper(manifest, resume=done_pages > 0)
+            of_total = f"/{num_pages}" if num_pages else ""
+
+            def on_page(page: int) -> None:
+                self._update_status(f"Processing page {page}{of_total}")
+                if num_pages:
+                    self._update_progress((page - 1) / num_pages * 100.0)
+
+            def save(frame, n: int) -> None:
+                path = folder_path / f"strana_{n:02d}.png"
+                manifest.page_captured(n, path)
+                frames.submit(frame, path)
+
+            with FrameWriter(on_saved=manifest.page_saved) as frames:
+                stats = run_capture(
+                    scaler.wrap(lambda: backend.grab(region)),
+                    pyautogui.press,
+                    save,
+                    num_pages=num_pages - done_pages if num_pages else 0,
+                    settle_timeout=self._settle_timeout(),
+                    on_page=on_page,
+                    should_stop=lambda: self._cancel_requested,
+                    first_page=done_pages + 1,
+                    resume_hash=manifest.page_hash(done_pages),
+                    cropper=cropper,
+                )
 
-            if not self._cancel_requested:
+            total = done_pages + stats.pages
+            if stats.cancelled:
+                self._update_status(f"Status: Cancelled after page {total} (tick Resume to continue)")
+            else:
                 self._update_progress(100.0)
-                self._update_status(f"✅ Done! {num_pages} screenshots saved to {output_folder_name}")
+                end = " (end of document detected)" if stats.end_detected else ""
+                slow = f" ({stats.settle_timeouts} pages hit the max wait)" if stats.settle_timeouts else ""
+                self._update_status(f"✅ Done! {total} screenshots saved to {output_folder_name}{end}{slow}"
+                                    f"{self._crop_note(cropper)}")
         except Exception as e:
             self._update_status(f"Status: Error during screenshots: {e}")
         finally:
+            if backend is not None:
+                backend.close()
+            if manifest is not None:
+                manifest.close()
             # Re-enable controls
             try:
                 self.btn_start.configure(state=tk.NORMAL)
@@ -833,6 +1159,8 @@ def main() -> None:
 
 
 if __name__ == "__main__":
+    # Needed for the encoder process pool in frozen (.app) builds
+    multiprocessing.freeze_support()
     main()
 
 
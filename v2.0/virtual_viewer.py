@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Virtual document viewer
+
+Simulates a PDF viewer for headless capture runs: a folder of page images
+is the "screen", and pressing "down" moves to the next page. After a page
+turn the new page takes `render_latency` seconds to appear. With tearing
+enabled it renders progressively from the top, so an early grab returns
+the new page's top over the old page's bottom, like a real viewer halfway
+through drawing.
+
+VirtualViewer is a capture backend (grab/grab_raw) with a press() method,
+so it plugs into capture.run_capture in place of the screen and pyautogui.
+"""
+
+import random
+import time
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+from PIL import Image
+
+from capture_backends import CaptureBackend, RawFrame, Region
+
+
+BACKGROUND = (128, 128, 128)  # viewer chrome around the page
+
+
+class VirtualViewer(CaptureBackend):
+    name = "virtual"
+
+    def __init__(self, pages: Sequence, origin: Tuple[int, int] = (0, 0),
+                 render_latency: float = 0.15, latency_jitter: float = 0.0,
+                 tearing: bool = True, seed: Optional[int] = None):
+        self.pages: List[Path] = [Path(p) for p in pages]
+        if not self.pages:
+            raise ValueError("virtual viewer needs at least one page")
+        self.origin = origin
+        self.render_latency = render_latency
+        self.latency_jitter = latency_jitter
+        self.tearing = tearing
+        self._rng = random.Random(seed)
+        self.index = 0
+        self.key_presses = 0
+        self._previous: Optional[Image.Image] = None
+        self._current = self._load(0)
+        self._turned_at = float("-inf")
+        self._latency = 0.0
+
+    @classmethod
+    def from_folder(cls, folder, **kwargs) -> "VirtualViewer":
+        return cls(sorted(Path(folder).glob("*.png")), **kwargs)
+
+    def _load(self, index: int) -> Image.Image:
+        with Image.open(self.pages[index]) as img:
+            return img.convert('RGB')
+
+    # ---------------------- Keyboard ----------------------
+    def press(self, key: str) -> None:
+        self.key_presses += 1
+        if key != 'down' or self.index + 1 >= len(self.pages):
+            return  # last page: the viewer does not move
+        self.index += 1
+        self._previous = self._current
+        self._current = self._load(self.index)
+        self._turned_at = time.monotonic()
+        self._latency = max(0.0, self.render_latency + self._rng.uniform(-1, 1) * self.latency_jitter)
+
+    # ---------------------- Screen ----------------------
+    def _screen_page(self) -> Image.Image:
+        """What the viewer shows right now (may be half-rendered)."""
+        elapsed = time.monotonic() - self._turned_at
+        if elapsed >= self._latency or self._previous is None:
+            return self._current
+        if not self.tearing:
+            return self._previous
+        # Progressive render: top rows already show the new page
+        done_rows = int(self._current.height * elapsed / self._latency)
+        frame = self._previous.copy()
+        if done_rows > 0:
+            frame.paste(self._current.crop((0, 0, self._current.width, done_rows)), (0, 0))
+        return frame
+
+    def _render(self, page: Image.Image, region: Region) -> Image.Image:
+        x, y, width, height = region
+        screen = Image.new('RGB', (width, height), BACKGROUND)
+        screen.paste(page, (self.origin[0] - x, self.origin[1] - y))
+        return screen
+
+    def grab(self, region: Region) -> Image.Image:
+        return self._render(self._screen_page(), region)
+
+    def grab_raw(self, region: Region) -> RawFrame:
+        shot = self.grab(region)
+        data = shot.tobytes("raw", "BGRX")
+        return RawFrame(memoryview(data), shot.width, shot.height, shot.width * 4)
+
+    def clean_frame(self, index: int, region: Region) -> Image.Image:
+        """Fully rendered grab of page `index` (ground truth for torn-frame checks)."""
+        return self._render(self._load(index), region)